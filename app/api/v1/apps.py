@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends
 from app.services.app_service import AppService
+from app.services.account_router import account_router
+from app.services.ui_executor import PRIORITY_BULK
 from app.models.request.apps import *
 from app.models.response import APIResponse
 
@@ -16,9 +18,12 @@ async def api_accept_new_friend(
     service: AppService = Depends()
 ):
     """接受新好友"""
-    return service.accept_new_friend(
+    return await account_router.run(
+        request.wxname,
+        service.accept_new_friend,
         wxname=request.wxname,
         keywords=request.keywords,
         remark=request.remark,
-        tags=request.tags
+        tags=request.tags,
+        priority=PRIORITY_BULK
     )
\ No newline at end of file
@@ -1,5 +1,10 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
 from app.services.chat_service import ChatService
+from app.services.account_router import account_router
+from app.services.idempotency import idempotency_store
+from app.services.rate_limiter import rate_limiter
+from app.services.ui_executor import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
 from app.models.request.chat import *
 from app.models.response import APIResponse
 
@@ -12,14 +17,29 @@ router = APIRouter()
 )
 async def send_message(
     request: SendMessageRequest, 
-    service: ChatService = Depends()
+    service: ChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """微信子窗口发送消息"""
-    return service.send_message(
-        msg=request.msg,
-        who=request.who,
-        clear=request.clear,
-        at=request.at
+    """微信子窗口发送消息，没有子窗口时通过主窗口发送"""
+    return await idempotency_store.run(
+        idempotency_key,
+        "chat/send",
+        request,
+        lambda: rate_limiter.run(
+            request.wxname,
+            request.who,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_message,
+                msg=request.msg,
+                who=request.who,
+                clear=request.clear,
+                at=request.at,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE,
+                chat_key=request.who
+            )
+        )
     )
 
 @router.post(
@@ -32,9 +52,7 @@ async def get_all_message(
     service: ChatService = Depends()
 ):
     """获取微信子窗口所有消息"""
-    ser_get_all = service.get_all_message
-    print(ser_get_all)
-    return ser_get_all(who=request.who)
+    return await account_router.run(request.wxname, service.get_all_message, who=request.who, since=request.since, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/getnewmessage", 
@@ -46,7 +64,7 @@ async def get_new_message(
     service: ChatService = Depends()
 ):
     """获取微信子窗口新消息"""
-    return service.get_new_message(who=request.who)
+    return await account_router.run(request.wxname, service.get_new_message, who=request.who, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/msg/quote", 
@@ -55,14 +73,28 @@ async def get_new_message(
 )
 async def send_quote_by_id(
     request: SendQuoteByIdRequest,
-    service: ChatService = Depends()
+    service: ChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """根据id发送引用消息"""
-    return service.send_quote_by_id(
-        msg_id=request.msg_id,
-        content=request.content,
-        who=request.who,
-        wxname=request.wxname
+    return await idempotency_store.run(
+        idempotency_key,
+        "chat/msg/quote",
+        request,
+        lambda: rate_limiter.run(
+            request.wxname,
+            request.who,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_quote_by_id,
+                msg_id=request.msg_id,
+                content=request.content,
+                who=request.who,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE,
+                chat_key=request.who
+            )
+        )
     )
 
 @router.post(
@@ -75,4 +107,4 @@ async def close_sub_window(
     service: ChatService = Depends()
 ):
     """关闭子窗口"""
-    return service.close_sub_window(who=request.who, wxname=request.wxname)
\ No newline at end of file
+    return await account_router.run(request.wxname, service.close_sub_window, who=request.who, wxname=request.wxname, priority=PRIORITY_NORMAL)
\ No newline at end of file
@@ -1,8 +1,11 @@
 from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Header, Query, Request
 from fastapi.responses import FileResponse
-from app.models.file import FileInfo, FileUploadResponse
+from app.models.file import FileInfo, FileUploadResponse, UploadSessionInfo
+from app.models.request.files import CreateUploadSessionRequest
 from app.services.file_service import FileService
+from app.services.upload_session import upload_sessions
+from app.utils.config import settings
 from app.utils.auth import get_current_token
 from app.models.base import QueryParams
 from urllib.parse import quote
@@ -34,6 +37,122 @@ async def upload_file(
     """
     return await file_service.upload_file(file, description, uploader)
 
+@router.post(
+    "/uploads",
+    response_model=UploadSessionInfo,
+    summary="创建分块上传会话"
+)
+async def create_upload_session(
+    request: CreateUploadSessionRequest,
+    token: str = Depends(get_current_token)
+) -> UploadSessionInfo:
+    """创建分块上传会话
+    
+    Args:
+        request: 文件名、文件大小、分块大小等
+        token: 认证令牌
+        
+    Returns:
+        UploadSessionInfo: 会话信息
+    """
+    return await file_service.run_io(upload_sessions.create, request)
+
+@router.put(
+    "/uploads/{session_id}",
+    response_model=UploadSessionInfo,
+    summary="上传分块"
+)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分块偏移量（按分块大小对齐）"),
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256"),
+    token: str = Depends(get_current_token)
+) -> UploadSessionInfo:
+    """上传一个分块，请求体为分块的原始内容，分块可以并行、乱序上传
+    
+    Args:
+        session_id: 会话ID
+        request: 请求对象
+        offset: 分块偏移量
+        chunk_sha256: 分块的SHA256（X-Chunk-SHA256 请求头），提供时校验
+        token: 认证令牌
+        
+    Returns:
+        UploadSessionInfo: 会话信息（missing 为尚未接收的范围）
+    """
+    max_chunk_size = settings.upload.resumable.max_chunk_size
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_chunk_size:
+        raise HTTPException(status_code=413, detail="分块大小超过限制")
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > max_chunk_size:
+            raise HTTPException(status_code=413, detail="分块大小超过限制")
+    return await file_service.run_io(upload_sessions.write_chunk, session_id, offset, bytes(data), chunk_sha256)
+
+@router.get(
+    "/uploads/{session_id}",
+    response_model=UploadSessionInfo,
+    summary="获取分块上传会话状态"
+)
+async def get_upload_session(
+    session_id: str,
+    token: str = Depends(get_current_token)
+) -> UploadSessionInfo:
+    """获取分块上传会话状态和尚未接收的范围
+    
+    Args:
+        session_id: 会话ID
+        token: 认证令牌
+        
+    Returns:
+        UploadSessionInfo: 会话信息
+    """
+    return await file_service.run_io(upload_sessions.get, session_id)
+
+@router.post(
+    "/uploads/{session_id}/finalize",
+    response_model=FileUploadResponse,
+    summary="完成分块上传"
+)
+async def finalize_upload_session(
+    session_id: str,
+    token: str = Depends(get_current_token)
+) -> FileUploadResponse:
+    """完成分块上传：校验全部分块已接收和文件哈希后登记文件
+    
+    Args:
+        session_id: 会话ID
+        token: 认证令牌
+        
+    Returns:
+        FileUploadResponse: 文件上传响应
+    """
+    return await file_service.run_io(upload_sessions.finalize, session_id)
+
+@router.delete(
+    "/uploads/{session_id}",
+    summary="取消分块上传"
+)
+async def abort_upload_session(
+    session_id: str,
+    token: str = Depends(get_current_token)
+) -> dict:
+    """取消分块上传并删除已上传的分块
+    
+    Args:
+        session_id: 会话ID
+        token: 认证令牌
+        
+    Returns:
+        dict: 取消结果
+    """
+    if await file_service.run_io(upload_sessions.abort, session_id):
+        return {"message": "上传会话已取消"}
+    raise HTTPException(status_code=404, detail="上传会话不存在")
+
 @router.get(
     "/{file_id}", 
     response_model=FileInfo,
@@ -52,7 +171,7 @@ async def get_file(
     Returns:
         FileInfo: 文件信息
     """
-    file_info = file_service.get_file(file_id)
+    file_info = await file_service.run_io(file_service.get_file, file_id)
     if not file_info:
         raise HTTPException(status_code=404, detail="文件不存在")
     return file_info
@@ -74,7 +193,7 @@ async def delete_file(
     Returns:
         dict: 删除结果
     """
-    if file_service.delete_file(file_id):
+    if await file_service.run_io(file_service.delete_file, file_id):
         return {"message": "文件删除成功"}
     raise HTTPException(status_code=404, detail="文件不存在")
 
@@ -98,7 +217,7 @@ async def list_files(
     Returns:
         List[FileInfo]: 文件列表
     """
-    total, files = file_service.list_files(skip, limit)
+    total, files = await file_service.run_io(file_service.list_files, skip, limit)
     return files 
 
 @router.get(
@@ -2,6 +2,23 @@ from fastapi import APIRouter
 from app.models.response import APIResponse
 from app.utils.wx_package_manager import is_wxautox, get_supported_features
 from app.utils.config import settings
+from app.services.account_router import account_router
+from app.services.window_manager import window_manager
+from app.services.chat_index import subwin_index
+from app.services.active_chat import active_chat
+from app.services.contact_index import contact_index
+from app.services.message_watcher import message_watcher
+from app.services.message_broker import message_broker
+from app.services.webhook_service import webhook_service
+from app.services.media_pipeline import media_pipeline
+from app.services.voice_transcriber import voice_transcriber
+from app.services.message_store import message_store
+from app.services.message_cursor import message_cursors
+from app.services.idempotency import idempotency_store
+from app.services.rate_limiter import rate_limiter
+from app.services.send_coalescer import send_coalescer
+from app.services.upload_session import upload_sessions
+from app.services.outbox import outbox
 
 router = APIRouter()
 
@@ -65,11 +82,46 @@ async def get_service_status():
         "database": {
             "type": settings.database.type
         },
-        "features": get_supported_features()
+        "features": get_supported_features(),
+        "accounts": account_router.stats()
     }
     
     return APIResponse(
         success=True,
         message="获取服务状态成功",
         data=status_info
-    ) 
\ No newline at end of file
+    )
+
+@router.get(
+    "/stats", 
+    operation_id="获取运行统计", 
+    response_model=APIResponse,
+    summary="获取UI执行与窗口状态等运行统计信息"
+)
+async def get_runtime_stats():
+    """获取运行统计信息"""
+    stats_info = {
+        "accounts": account_router.stats(),
+        "window": window_manager.stats(),
+        "subwindows": subwin_index.stats(),
+        "active_chat": active_chat.stats(),
+        "contacts": contact_index.stats(),
+        "watcher": message_watcher.stats(),
+        "stream": message_broker.stats(),
+        "media": media_pipeline.stats(),
+        "voice": voice_transcriber.stats(),
+        "message_store": message_store.stats(),
+        "cursors": message_cursors.stats(),
+        "idempotency": idempotency_store.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "coalesce": send_coalescer.stats(),
+        "outbox": outbox.stats(),
+        "webhook": webhook_service.stats(),
+        "uploads": upload_sessions.stats()
+    }
+    
+    return APIResponse(
+        success=True,
+        message="获取运行统计成功",
+        data=stats_info
+    )
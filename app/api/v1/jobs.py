@@ -0,0 +1,50 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from app.services.outbox import outbox, CancelError, JOB_FILE
+from app.models.request.jobs import *
+from app.models.response import APIResponse
+
+router = APIRouter()
+
+@router.post(
+    "/send",
+    operation_id="[jobs]提交发送任务",
+    response_model=APIResponse,
+    summary="提交发送任务（文字或文件），立即返回任务ID，由后台按顺序发送"
+)
+async def api_submit_send_job(request: SendJobRequest):
+    """提交发送任务"""
+    if request.type == JOB_FILE and not request.file_id:
+        raise HTTPException(status_code=400, detail="发送文件任务需要 file_id")
+    payload = request.model_dump(exclude={"wxname", "type"})
+    job = await asyncio.to_thread(outbox.submit, request.type, payload, request.wxname)
+    return APIResponse(success=True, message="任务已提交", data=job)
+
+@router.get(
+    "/{job_id}",
+    operation_id="[jobs]获取任务状态",
+    response_model=APIResponse,
+    summary="获取发送任务状态和结果"
+)
+async def api_get_job(job_id: str):
+    """获取任务状态"""
+    job = await asyncio.to_thread(outbox.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return APIResponse(success=True, message="获取任务状态成功", data=job)
+
+@router.post(
+    "/{job_id}/cancel",
+    operation_id="[jobs]取消任务",
+    response_model=APIResponse,
+    summary="取消排队中的发送任务"
+)
+async def api_cancel_job(job_id: str):
+    """取消任务"""
+    try:
+        job = await asyncio.to_thread(outbox.cancel, job_id)
+    except CancelError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return APIResponse(success=True, message="任务已取消", data=job)
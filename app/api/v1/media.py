@@ -0,0 +1,59 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from app.services.media_pipeline import media_pipeline
+from app.services.voice_transcriber import voice_transcriber
+from app.models.response import APIResponse
+from app.utils.config import settings
+
+router = APIRouter()
+
+@router.get(
+    "/voice/{voice_id}",
+    operation_id="[media]获取语音转文字结果",
+    response_model=APIResponse,
+    summary="获取新消息中语音的转文字结果，可等待转换完成"
+)
+async def api_get_voice_text(
+    voice_id: str,
+    wait_seconds: float = Query(0, ge=0, description="转换未完成时最长等待时间(秒)")
+):
+    """获取语音转文字结果"""
+    voice = await voice_transcriber.wait(voice_id, min(wait_seconds, settings.media.max_wait_seconds))
+    if voice is None:
+        raise HTTPException(status_code=404, detail="语音不存在")
+    return APIResponse(success=True, message="获取语音转文字结果成功", data=voice)
+
+@router.get(
+    "/{media_id}",
+    operation_id="[media]获取媒体下载状态",
+    response_model=APIResponse,
+    summary="获取新消息中图片、视频、文件的下载状态，可等待下载完成"
+)
+async def api_get_media(
+    media_id: str,
+    wait_seconds: float = Query(0, ge=0, description="下载未完成时最长等待时间(秒)")
+):
+    """获取媒体下载状态"""
+    if wait_seconds > 0:
+        # 等待结果时，等待空闲的媒体提前下载
+        await asyncio.to_thread(media_pipeline.request, media_id, False)
+    media = await media_pipeline.wait(media_id, min(wait_seconds, settings.media.max_wait_seconds))
+    if media is None:
+        raise HTTPException(status_code=404, detail="媒体不存在")
+    return APIResponse(success=True, message="获取媒体下载状态成功", data=media)
+
+@router.post(
+    "/{media_id}/download",
+    operation_id="[media]下载媒体",
+    response_model=APIResponse,
+    summary="下载按需下载的媒体，或重试下载失败的媒体"
+)
+async def api_download_media(
+    media_id: str,
+    wait_seconds: float = Query(0, ge=0, description="最长等待时间(秒)")
+):
+    """下载媒体"""
+    if await asyncio.to_thread(media_pipeline.request, media_id) is None:
+        raise HTTPException(status_code=404, detail="媒体不存在")
+    media = await media_pipeline.wait(media_id, min(wait_seconds, settings.media.max_wait_seconds))
+    return APIResponse(success=True, message="已加入下载队列", data=media)
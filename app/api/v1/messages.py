@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Query
+from app.services.message_store import message_store
+from app.models.response import APIResponse
+
+router = APIRouter()
+
+@router.get(
+    "",
+    operation_id="[messages]查询历史消息",
+    response_model=APIResponse,
+    summary="从本地消息库查询历史消息（支持全文检索，按 cursor 翻页）"
+)
+async def api_query_messages(
+    wxname: Optional[str] = Query(None, description="账号名称"),
+    chat: Optional[str] = Query(None, description="聊天名称"),
+    sender: Optional[str] = Query(None, description="发送者"),
+    msg_type: Optional[str] = Query(None, alias="type", description="消息类型"),
+    q: Optional[str] = Query(None, description="内容关键词"),
+    since: Optional[datetime] = Query(None, description="起始时间"),
+    until: Optional[datetime] = Query(None, description="结束时间"),
+    cursor: Optional[int] = Query(None, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """查询历史消息"""
+    items, next_cursor = await asyncio.to_thread(
+        message_store.query,
+        account=wxname,
+        chat_name=chat,
+        sender=sender,
+        msg_type=msg_type,
+        keyword=q,
+        since=since,
+        until=until,
+        before_id=cursor,
+        limit=limit
+    )
+    return APIResponse(
+        success=True,
+        message="查询历史消息成功",
+        data={"items": items, "next_cursor": next_cursor}
+    )
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.webhook_service import webhook_service
+from app.models.response import APIResponse
+
+router = APIRouter()
+
+@router.get(
+    "/deadletters",
+    operation_id="[webhook]获取死信列表",
+    response_model=APIResponse,
+    summary="获取超过最大重试次数仍投递失败的消息"
+)
+async def api_list_dead_letters(
+    target: Optional[str] = Query(None, description="Webhook 地址，为空表示全部"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """获取死信列表"""
+    rows = await asyncio.to_thread(webhook_service.list_dead_letters, target, skip, limit)
+    return APIResponse(success=True, message="获取死信列表成功", data=rows)
+
+@router.post(
+    "/deadletters/{delivery_id}/retry",
+    operation_id="[webhook]重新投递死信",
+    response_model=APIResponse,
+    summary="将死信重新放回投递队列"
+)
+async def api_retry_dead_letter(delivery_id: int):
+    """重新投递死信"""
+    if not await asyncio.to_thread(webhook_service.retry_dead_letter, delivery_id):
+        raise HTTPException(status_code=404, detail="死信不存在")
+    return APIResponse(success=True, message="已重新加入投递队列")
+
+@router.delete(
+    "/deadletters/{delivery_id}",
+    operation_id="[webhook]删除死信",
+    response_model=APIResponse,
+    summary="删除死信"
+)
+async def api_delete_dead_letter(delivery_id: int):
+    """删除死信"""
+    if not await asyncio.to_thread(webhook_service.delete_dead_letter, delivery_id):
+        raise HTTPException(status_code=404, detail="死信不存在")
+    return APIResponse(success=True, message="死信删除成功")
+
+@router.get(
+    "/stats",
+    operation_id="[webhook]获取投递统计",
+    response_model=APIResponse,
+    summary="获取各目标的投递队列与统计信息"
+)
+async def api_webhook_stats():
+    """获取投递统计"""
+    data = await asyncio.to_thread(webhook_service.stats)
+    return APIResponse(success=True, message="获取投递统计成功", data=data)
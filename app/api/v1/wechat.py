@@ -1,5 +1,14 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, Query, Header
+from fastapi.responses import StreamingResponse
 from app.services.wechat_service import WeChatService
+from app.services.account_router import account_router
+from app.services.message_watcher import message_watcher
+from app.services.message_broker import message_broker
+from app.services.idempotency import idempotency_store
+from app.services.rate_limiter import rate_limiter
+from app.services.send_coalescer import send_coalescer
+from app.utils.config import settings
+from app.services.ui_executor import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
 from app.models.request.wechat import *
 from app.models.response import APIResponse
 from app.utils.route_condition import (
@@ -13,8 +22,9 @@ from app.utils.route_condition import (
     has_friend_management_feature, 
     has_page_switch_feature
 )
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import asyncio
+import json
 
 router = APIRouter()
 
@@ -26,16 +36,68 @@ router = APIRouter()
 )
 async def send_message(
     request: SendMessageRequest, 
-    service: WeChatService = Depends()
+    service: WeChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """微信主窗口发送消息"""
-    return service.send_message(
-        msg=request.msg,
-        who=request.who,
-        clear=request.clear,
-        at=request.at,
-        exact=request.exact,
-        wxname=request.wxname
+    def send(msg: str):
+        return rate_limiter.run(
+            request.wxname,
+            request.who,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_message,
+                msg=msg,
+                who=request.who,
+                clear=request.clear,
+                at=request.at,
+                exact=request.exact,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE,
+                chat_key=request.who
+            )
+        )
+
+    # @消息不合并
+    coalesce_key = None if request.at else (
+        account_router.resolve_name(request.wxname), request.who, request.exact, request.clear
+    )
+    return await idempotency_store.run(
+        idempotency_key,
+        "wechat/send",
+        request,
+        lambda: send_coalescer.run(coalesce_key, request.msg, send)
+    )
+
+@router.post(
+    "/send/batch", 
+    operation_id="[wx]批量发送消息", 
+    response_model=APIResponse,
+    summary="批量发送文字消息（按聊天对象分组，每个对象只切换一次）"
+)
+async def send_batch(
+    request: SendBatchRequest,
+    service: WeChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """微信主窗口批量发送消息"""
+    return await idempotency_store.run(
+        idempotency_key,
+        "wechat/send/batch",
+        request,
+        lambda: rate_limiter.run_batch(
+            request.wxname,
+            [item.model_dump() for item in request.items],
+            lambda items, who: account_router.run(
+                request.wxname,
+                service.send_batch,
+                items=items,
+                clear=request.clear,
+                wxname=request.wxname,
+                priority=PRIORITY_BULK,
+                chat_key=who
+            )
+        )
     )
 
 @router.post(
@@ -46,14 +108,28 @@ async def send_message(
 )
 async def send_file(
     request: SendFileRequest,
-    service: WeChatService = Depends()
+    service: WeChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """微信主窗口发送文件"""
-    return service.send_file(
-        file_id=request.file_id,
-        who=request.who,
-        exact=request.exact,
-        wxname=request.wxname
+    return await idempotency_store.run(
+        idempotency_key,
+        "wechat/sendfile",
+        request,
+        lambda: rate_limiter.run(
+            request.wxname,
+            request.who,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_file,
+                file_id=request.file_id,
+                who=request.who,
+                exact=request.exact,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE,
+                chat_key=request.who
+            )
+        )
     )
 
 @router.post(
@@ -67,10 +143,14 @@ async def chat_with(
     service: WeChatService = Depends()
 ):
     """微信主窗口切换聊天窗口"""
-    result = service.chat_with(
+    result = await account_router.run(
+        request.wxname,
+        service.chat_with,
         who=request.who,
         exact=request.exact,
-        wxname=request.wxname
+        wxname=request.wxname,
+        priority=PRIORITY_NORMAL,
+        chat_key=request.who
     )
     return result
 
@@ -85,7 +165,7 @@ async def get_all_sub_window(
     service: WeChatService = Depends()
 ):
     """获取微信所有子窗口信息"""
-    return service.get_all_sub_window(wxname=request.wxname)
+    return await account_router.run(request.wxname, service.get_all_sub_window, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/getallmessage", 
@@ -98,8 +178,7 @@ async def get_all_message(
     service: WeChatService = Depends()
 ):
     """获取当前窗口加载的消息"""
-    print('xxxxxxxxxxxxxxxxxxxx')
-    return service.get_all_message(who=request.who, wxname=request.wxname)
+    return await account_router.run(request.wxname, service.get_all_message, who=request.who, since=request.since, wxname=request.wxname, priority=PRIORITY_NORMAL, chat_key=request.who)
 
 @router.post(
     "/sendurlcard", 
@@ -110,14 +189,27 @@ async def get_all_message(
 @conditional_route(has_url_card_feature)
 async def send_url_card(
     request: SendUrlCardRequest,
-    service: WeChatService = Depends()
+    service: WeChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """微信发送url卡片（wxautox特有）"""
-    return service.send_url_card(
-        url=request.url,
-        friends=request.friends,
-        timeout=request.timeout,
-        wxname=request.wxname
+    return await idempotency_store.run(
+        idempotency_key,
+        "wechat/sendurlcard",
+        request,
+        lambda: rate_limiter.run(
+            request.wxname,
+            request.friends,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_url_card,
+                url=request.url,
+                friends=request.friends,
+                timeout=request.timeout,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE
+            )
+        )
     )
 
 @router.post(
@@ -131,9 +223,12 @@ async def add_listen_chat(
     service: WeChatService = Depends()
 ):
     """添加微信子窗口监听"""
-    return service.add_listen_chat(
+    return await account_router.run(
+        request.wxname,
+        service.add_listen_chat,
         who=request.who,
-        wxname=request.wxname
+        wxname=request.wxname,
+        priority=PRIORITY_NORMAL
     )
 
 @router.post(
@@ -143,13 +238,51 @@ async def add_listen_chat(
     summary="获取一个未读消息窗口的新消息"
 )
 async def get_next_new_message(
-    request: GetNextNewMessageRequest,
-    service: WeChatService = Depends()
+    request: GetNextNewMessageRequest
 ):
-    """获取微信下一个新消息"""
-    return service.get_next_new_message(
-        filter_mute=request.filter_mute, 
-        wxname=request.wxname
+    """获取微信下一个新消息（从新消息监听器的队列中取出，支持长轮询）"""
+    wait_seconds = min(request.wait_seconds, settings.watcher.max_wait_seconds)
+    result = await message_watcher.get(wxname=request.wxname, wait_seconds=wait_seconds)
+    return APIResponse(success=True, message='', data=result)
+
+@router.get(
+    "/stream", 
+    operation_id="[wx]订阅新消息", 
+    summary="通过SSE实时推送新消息（可按聊天、消息类型、账号过滤）"
+)
+async def stream_messages(
+    request: Request,
+    chat: Optional[List[str]] = Query(None, description="聊天名称"),
+    msg_type: Optional[List[str]] = Query(None, alias="type", description="消息类型"),
+    wxname: Optional[List[str]] = Query(None, description="微信客户端名称"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID", description="断线前最后收到的事件ID")
+):
+    """订阅新消息（Server-Sent Events），断线重连时补发 Last-Event-ID 之后的消息"""
+    subscription = message_broker.subscribe(
+        chat_names=chat,
+        msg_types=msg_type,
+        accounts=wxname,
+        last_event_id=int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    )
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), settings.stream.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                data = json.dumps(item, ensure_ascii=False, default=str)
+                # 语音转文字等结果作为原消息的更新推送（event: update）
+                yield f"id: {item['seq']}\nevent: {item.get('event', 'message')}\ndata: {data}\n\n"
+        finally:
+            message_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.post(
@@ -161,13 +294,27 @@ async def get_next_new_message(
 # @conditional_route(has_quote_message_feature)
 async def send_quote_by_id(
     request: SendQuoteByIdRequest,
-    service: WeChatService = Depends()
+    service: WeChatService = Depends(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """根据id发送引用消息"""
-    return service.send_quote_by_id(
-        msg_id=request.msg_id,
-        content=request.content,
-        wxname=request.wxname
+    return await idempotency_store.run(
+        idempotency_key,
+        "wechat/msg/quote",
+        request,
+        # 引用消息的接收者由消息ID决定，只按全局和账号限速
+        lambda: rate_limiter.run(
+            request.wxname,
+            None,
+            lambda: account_router.run(
+                request.wxname,
+                service.send_quote_by_id,
+                msg_id=request.msg_id,
+                content=request.content,
+                wxname=request.wxname,
+                priority=PRIORITY_INTERACTIVE
+            )
+        )
     )
 
 @router.post(
@@ -182,9 +329,12 @@ async def get_new_friends(
     service: WeChatService = Depends()
 ):
     """获取微信新朋友（wxautox特有）"""
-    return service.get_new_friends(
+    return await account_router.run(
+        request.wxname,
+        service.get_new_friends,
         acceptable=request.acceptable,
-        wxname=request.wxname
+        wxname=request.wxname,
+        priority=PRIORITY_NORMAL
     )
 
 @router.post(
@@ -203,11 +353,14 @@ async def accept_new_friend(
         tags = [request.tags]
     else:
         tags = request.tags
-    return service.accept_new_friend(
+    return await account_router.run(
+        request.wxname,
+        service.accept_new_friend,
         new_friend_id=request.new_friend_id, 
         remark=request.remark, 
         tags=tags, 
-        wxname=request.wxname
+        wxname=request.wxname,
+        priority=PRIORITY_NORMAL
     )
 
 @router.post(
@@ -221,7 +374,7 @@ async def switch_to_chat_page(
     service: WeChatService = Depends()
 ):
     """切换到聊天页面（wxautox特有）"""
-    return service.switch_to_chat_page(wxname=request.wxname)
+    return await account_router.run(request.wxname, service.switch_to_chat_page, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/isonline", 
@@ -234,7 +387,7 @@ async def is_online(
     service: WeChatService = Depends()
 ):
     """微信是否在线（wxautox特有）"""
-    return service.is_online(wxname=request.wxname)
+    return await account_router.run(request.wxname, service.is_online, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/login", 
@@ -246,7 +399,7 @@ async def login(
     request: LoginRequest,
     service: WeChatService = Depends()
 ):
-    return service.login(wxname=request.wxname)
+    return await account_router.run_login(service.login, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 @router.post(
     "/qrcode", 
@@ -258,7 +411,7 @@ async def qrcode(
     request: QRCodeRequest,
     service: WeChatService = Depends()
 ):
-    return service.qrcode(wxname=request.wxname)
+    return await account_router.run_login(service.qrcode, wxname=request.wxname, priority=PRIORITY_NORMAL)
 
 # @router.post("/switch/contact", operation_id="[wx]切换到联系人页面", response_model=APIResponse)
 # @conditional_route(has_page_switch_feature)
@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import threading
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Type, TypeVar, Tuple, Union
 from app.models.base import BaseDBModel, BaseDatabase, QueryParams, QueryResult
@@ -20,6 +21,8 @@ class SQLiteDatabase(BaseDatabase):
             os.makedirs(self.db_dir)
         # 更新配置中的路径为绝对路径
         settings.database.sqlite.path = self.db_path
+        # 连接会被UI线程和事件循环线程共同使用，所有操作需要加锁
+        self._lock = threading.RLock()
         # 调用父类初始化
         super().__init__(settings.database.sqlite)
     
@@ -34,7 +37,7 @@ class SQLiteDatabase(BaseDatabase):
                 # 创建一个空的数据库文件
                 with open(self.db_path, 'w') as f:
                     pass
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self.conn.row_factory = sqlite3.Row
         except sqlite3.Error as e:
             raise Exception(f"无法连接到数据库: {str(e)}")
@@ -53,13 +56,52 @@ class SQLiteDatabase(BaseDatabase):
             table_name: 表名
             fields: 字段定义，格式为 {字段名: 字段类型}
         """
-        try:
-            fields_str = ', '.join([f"{k} {v}" for k, v in fields.items()])
-            sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({fields_str})"
-            self.conn.execute(sql)
-            self.conn.commit()
-        except sqlite3.Error as e:
-            raise Exception(f"创建表失败: {str(e)}")
+        with self._lock:
+            try:
+                fields_str = ', '.join([f"{k} {v}" for k, v in fields.items()])
+                sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({fields_str})"
+                self.conn.execute(sql)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                raise Exception(f"创建表失败: {str(e)}")
+    
+    def execute(self, sql: str, params: Union[List[Any], Tuple[Any, ...], Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+        """执行SQL语句
+        
+        Args:
+            sql: SQL语句
+            params: 参数
+            
+        Returns:
+            List[Dict[str, Any]]: 查询结果（非查询语句返回空列表）
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.execute(sql, params)
+                rows = cursor.fetchall()
+                self.conn.commit()
+                return [dict(row) for row in rows]
+            except sqlite3.Error as e:
+                raise Exception(f"执行SQL失败: {str(e)}")
+    
+    def executemany(self, sql: str, seq_of_params: List[Any]) -> int:
+        """批量执行SQL语句（在同一个事务中）
+        
+        Args:
+            sql: SQL语句
+            seq_of_params: 参数列表
+            
+        Returns:
+            int: 影响的行数
+        """
+        with self._lock:
+            try:
+                cursor = self.conn.executemany(sql, seq_of_params)
+                self.conn.commit()
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise Exception(f"批量执行SQL失败: {str(e)}")
     
     def insert(self, table_name: str, data: Dict[str, Any]) -> str:
         """插入数据
@@ -71,15 +113,16 @@ class SQLiteDatabase(BaseDatabase):
         Returns:
             str: 插入记录的ID
         """
-        try:
-            fields = list(data.keys())
-            placeholders = ','.join(['?' for _ in fields])
-            sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
-            cursor = self.conn.execute(sql, [data[field] for field in fields])
-            self.conn.commit()
-            return str(cursor.lastrowid)
-        except sqlite3.Error as e:
-            raise Exception(f"插入数据失败: {str(e)}")
+        with self._lock:
+            try:
+                fields = list(data.keys())
+                placeholders = ','.join(['?' for _ in fields])
+                sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
+                cursor = self.conn.execute(sql, [data[field] for field in fields])
+                self.conn.commit()
+                return str(cursor.lastrowid)
+            except sqlite3.Error as e:
+                raise Exception(f"插入数据失败: {str(e)}")
     
     def update(self, table_name: str, id: str, data: Dict[str, Any]) -> bool:
         """更新数据
@@ -92,15 +135,16 @@ class SQLiteDatabase(BaseDatabase):
         Returns:
             bool: 是否更新成功
         """
-        try:
-            fields = list(data.keys())
-            set_clause = ','.join([f"{field}=?" for field in fields])
-            sql = f"UPDATE {table_name} SET {set_clause} WHERE id=?"
-            cursor = self.conn.execute(sql, [data[field] for field in fields] + [id])
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            raise Exception(f"更新数据失败: {str(e)}")
+        with self._lock:
+            try:
+                fields = list(data.keys())
+                set_clause = ','.join([f"{field}=?" for field in fields])
+                sql = f"UPDATE {table_name} SET {set_clause} WHERE id=?"
+                cursor = self.conn.execute(sql, [data[field] for field in fields] + [id])
+                self.conn.commit()
+                return cursor.rowcount > 0
+            except sqlite3.Error as e:
+                raise Exception(f"更新数据失败: {str(e)}")
     
     def delete(self, table_name: str, id: str) -> bool:
         """删除数据
@@ -112,13 +156,14 @@ class SQLiteDatabase(BaseDatabase):
         Returns:
             bool: 是否删除成功
         """
-        try:
-            sql = f"DELETE FROM {table_name} WHERE id=?"
-            cursor = self.conn.execute(sql, [id])
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            raise Exception(f"删除数据失败: {str(e)}")
+        with self._lock:
+            try:
+                sql = f"DELETE FROM {table_name} WHERE id=?"
+                cursor = self.conn.execute(sql, [id])
+                self.conn.commit()
+                return cursor.rowcount > 0
+            except sqlite3.Error as e:
+                raise Exception(f"删除数据失败: {str(e)}")
     
     def get_by_id(self, table_name: str, id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取数据
@@ -130,13 +175,14 @@ class SQLiteDatabase(BaseDatabase):
         Returns:
             Optional[Dict[str, Any]]: 记录数据，不存在则返回None
         """
-        try:
-            sql = f"SELECT * FROM {table_name} WHERE id=?"
-            cursor = self.conn.execute(sql, [id])
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        except sqlite3.Error as e:
-            raise Exception(f"获取数据失败: {str(e)}")
+        with self._lock:
+            try:
+                sql = f"SELECT * FROM {table_name} WHERE id=?"
+                cursor = self.conn.execute(sql, [id])
+                row = cursor.fetchone()
+                return dict(row) if row else None
+            except sqlite3.Error as e:
+                raise Exception(f"获取数据失败: {str(e)}")
     
     def query(self, table_name: str, params: QueryParams) -> QueryResult:
         """查询数据，并返回符合 Pydantic 模型的结构化数据
@@ -149,41 +195,42 @@ class SQLiteDatabase(BaseDatabase):
         Returns:
             QueryResult[T]: 查询结果
         """
-        try:
-            conditions = []
-            values = []
+        with self._lock:
+            try:
+                conditions = []
+                values = []
 
-            if params.filters:
-                for field, value in params.filters.items():
-                    conditions.append(f"{field}=?")
-                    values.append(value)
+                if params.filters:
+                    for field, value in params.filters.items():
+                        conditions.append(f"{field}=?")
+                        values.append(value)
 
-            where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
-            order_clause = f" ORDER BY {params.sort_by} {params.sort_order}" if params.sort_by else ""
-            limit_clause = f" LIMIT {params.limit} OFFSET {params.skip}"
+                where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+                order_clause = f" ORDER BY {params.sort_by} {params.sort_order}" if params.sort_by else ""
+                limit_clause = f" LIMIT {params.limit} OFFSET {params.skip}"
 
-            # 获取总数
-            count_sql = f"SELECT COUNT(*) FROM {table_name}{where_clause}"
-            total = self.conn.execute(count_sql, values).fetchone()[0]
+                # 获取总数
+                count_sql = f"SELECT COUNT(*) FROM {table_name}{where_clause}"
+                total = self.conn.execute(count_sql, values).fetchone()[0]
 
-            # 获取数据
-            sql = f"SELECT * FROM {table_name}{where_clause}{order_clause}{limit_clause}"
-            cursor = self.conn.execute(sql, values)
-            rows = cursor.fetchall()
+                # 获取数据
+                sql = f"SELECT * FROM {table_name}{where_clause}{order_clause}{limit_clause}"
+                cursor = self.conn.execute(sql, values)
+                rows = cursor.fetchall()
 
-            # 将 sqlite3.Row 转换为 Pydantic 模型实例
-            items = [dict(row) for row in rows]
+                # 将 sqlite3.Row 转换为 Pydantic 模型实例
+                items = [dict(row) for row in rows]
 
-            page = params.skip // params.limit + 1 if params.limit else 1
-            has_more = params.skip + params.limit < total
+                page = params.skip // params.limit + 1 if params.limit else 1
+                has_more = params.skip + params.limit < total
 
-            return QueryResult(
-                total=total,
-                items=items,
-                page=page,
-                size=len(items),
-                has_more=has_more
-            )
+                return QueryResult(
+                    total=total,
+                    items=items,
+                    page=page,
+                    size=len(items),
+                    has_more=has_more
+                )
 
-        except sqlite3.Error as e:
-            raise Exception(f"查询数据失败: {str(e)}")
\ No newline at end of file
+            except sqlite3.Error as e:
+                raise Exception(f"查询数据失败: {str(e)}")
\ No newline at end of file
@@ -2,21 +2,63 @@ from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.api.v1 import wechat, chat, apps, files, info
+from app.api.v1 import wechat, chat, apps, files, info, webhooks, media, messages, jobs
 from app.utils.auth import get_current_token
 from app.models.response import APIResponse
 from app.utils.config import settings
+from app.utils.upload_limit import UploadSizeLimitMiddleware
 from app.utils.wx_package_manager import is_wxautox, get_supported_features
+from app.services.account_router import account_router
+from app.services.contact_index import ChatNotFoundError
+from app.services.message_watcher import message_watcher
+from app.services.message_broker import message_broker
+from app.services.webhook_service import webhook_service
+from app.services.media_pipeline import media_pipeline
+from app.services.voice_transcriber import voice_transcriber
+from app.services.message_store import message_store
+from app.services.outbox import outbox
+from app.services.upload_session import upload_sessions
+from contextlib import asynccontextmanager
+import asyncio
 from typing import Any, Dict
 from fastapi.responses import HTMLResponse
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动/停止后台工作线程"""
+    loop = asyncio.get_running_loop()
+    account_router.start()
+    media_pipeline.start(loop)
+    voice_transcriber.start(loop)
+    message_store.start()
+    message_broker.start(loop)
+    webhook_service.start(loop)
+    message_watcher.add_listener(message_broker.publish)
+    message_watcher.add_listener(message_store.add)
+    message_watcher.add_listener(webhook_service.enqueue)
+    voice_transcriber.add_listener(message_broker.publish)
+    voice_transcriber.add_listener(message_store.add)
+    voice_transcriber.add_listener(webhook_service.enqueue)
+    message_watcher.start(loop)
+    outbox.start(loop)
+    upload_sessions.start(loop)
+    yield
+    await upload_sessions.stop()
+    await outbox.stop()
+    message_watcher.stop(timeout=settings.performance.timeout)
+    await webhook_service.stop()
+    account_router.stop(timeout=settings.performance.timeout)
+    media_pipeline.stop()
+    message_store.stop(timeout=settings.performance.timeout)
+
 app = FastAPI(
     title="WXAuto API",
     description="微信自动化API服务，✨标识为plus版本特有接口",
     version="1.0.0",
     docs_url=None,  # 禁用默认文档，使用自定义
     redoc_url=None,  # 禁用默认ReDoc，使用自定义
-    openapi_url=settings.api.openapi_url
+    openapi_url=settings.api.openapi_url,
+    lifespan=lifespan
 )
 
 def custom_openapi():
@@ -47,6 +89,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 限制上传请求体大小（纯 ASGI 中间件，不影响 SSE 等流式响应）
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/api/v1/files/upload"])
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """统一处理HTTP异常
@@ -67,6 +112,18 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         ).model_dump()
     )
 
+@app.exception_handler(ChatNotFoundError)
+async def chat_not_found_handler(request: Request, exc: ChatNotFoundError):
+    """聊天对象无法解析时返回候选名称（409有候选/404无候选）"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=APIResponse(
+            success=False,
+            message=exc.detail,
+            data={"suggestions": exc.suggestions}
+        ).model_dump()
+    )
+
 @app.get("/")
 async def root():
     """根路径
@@ -91,6 +148,10 @@ app.include_router(chat.router, prefix=f"{settings.api.prefix}/chat", tags=["Cha
 app.include_router(apps.router, prefix=f"{settings.api.prefix}/apps", tags=["Apps"], dependencies=[Depends(get_current_token)])
 app.include_router(files.router, prefix="/api/v1/files", tags=["files"])
 app.include_router(info.router, prefix=f"{settings.api.prefix}/info", tags=["Info"])
+app.include_router(jobs.router, prefix=f"{settings.api.prefix}/jobs", tags=["Jobs"], dependencies=[Depends(get_current_token)])
+app.include_router(messages.router, prefix=f"{settings.api.prefix}/messages", tags=["Messages"], dependencies=[Depends(get_current_token)])
+app.include_router(media.router, prefix=f"{settings.api.prefix}/media", tags=["Media"], dependencies=[Depends(get_current_token)])
+app.include_router(webhooks.router, prefix=f"{settings.api.prefix}/webhooks", tags=["Webhooks"], dependencies=[Depends(get_current_token)])
 
 # 自定义Swagger UI路由
 @app.get(settings.api.docs_url, include_in_schema=False)
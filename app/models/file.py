@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from app.models.base import BaseDBModel
 
@@ -25,4 +25,16 @@ class FileUploadResponse(BaseModel):
     file_hash: str = Field(..., description="文件哈希值")
     file_path: str = Field(..., description="文件路径")
     upload_time: datetime = Field(..., description="上传时间")
-    is_new: bool = Field(..., description="是否为新上传的文件") 
\ No newline at end of file
+    is_new: bool = Field(..., description="是否为新上传的文件") 
+
+class UploadSessionInfo(BaseModel):
+    """分块上传会话信息模型"""
+    session_id: str = Field(..., description="上传会话ID")
+    filename: str = Field(..., description="文件名")
+    file_size: int = Field(..., description="文件总大小")
+    chunk_size: int = Field(..., description="分块大小（除最后一块外每块必须为该大小，偏移量必须按分块大小对齐）")
+    received_bytes: int = Field(..., description="已接收字节数")
+    missing: List[List[int]] = Field(..., description="尚未接收的字节范围 [start, end)")
+    status: str = Field(..., description="会话状态（open/finalized）")
+    expires_at: datetime = Field(..., description="会话过期时间（每次上传分块后顺延）")
+    file_id: Optional[str] = Field(None, description="完成上传后的文件ID")
@@ -14,7 +14,7 @@ class SendMessageRequest(BaseRequest):
 
 # 获取所有消息请求
 class GetAllMessageRequest(BaseRequest):
-    pass
+    since: Optional[str] = None  # 上次返回的 cursor，传入时只返回之后的新消息
 
 # 获取新消息请求
 class GetNewMessageRequest(BaseRequest):
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+# 创建分块上传会话请求
+class CreateUploadSessionRequest(BaseModel):
+    filename: str
+    file_size: int = Field(..., ge=0)         # 文件总大小（字节）
+    chunk_size: Optional[int] = None          # 分块大小，默认使用 upload.resumable.chunk_size
+    file_type: Optional[str] = None           # 文件类型，默认按文件名推断
+    description: Optional[str] = None
+    uploader: Optional[str] = None
+    sha256: Optional[str] = None              # 整个文件的SHA256，提供时完成上传时校验
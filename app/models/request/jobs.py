@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional, List, Union, Literal
+
+# 基础请求
+class BaseRequest(BaseModel):
+    wxname: Union[None, str] = ''
+
+# 发送任务请求
+class SendJobRequest(BaseRequest):
+    type: Literal['text', 'file'] = 'text'  # 文字消息或文件
+    who: str = '文件传输助手'
+    exact: bool = False
+    msg: str = ''              # type=text 时的消息内容
+    clear: bool = True
+    at: Union[str, List[str]] = ''
+    file_id: Optional[str] = None  # type=file 时的文件ID
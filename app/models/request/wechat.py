@@ -16,6 +16,18 @@ class SendMessageRequest(BaseChatRelevantRequest):
     clear: bool = True
     at: Union[str, List[str]] = ''
 
+# 批量发送消息条目
+class SendBatchItem(BaseModel):
+    who: str = '文件传输助手'
+    msg: str
+    at: Union[str, List[str]] = ''
+    exact: bool = False
+
+# 批量发送消息请求
+class SendBatchRequest(BaseRequest):
+    items: List[SendBatchItem]
+    clear: bool = True
+
 # 切换聊天窗口
 class ChatWithRequest(BaseChatRelevantRequest):
     pass
@@ -40,11 +52,13 @@ class AddListenChatRequest(BaseRequest):
 
 # 获取下一个新消息请求
 class GetNextNewMessageRequest(BaseRequest):
-    filter_mute: bool = False
+    filter_mute: bool = False  # 已由 watcher.filter_mute 配置决定，保留以兼容旧请求
+    wait_seconds: float = 0    # 队列为空时最长等待时间(秒)
 
 # 获取所有消息请求
 class GetAllMessageRequest(BaseRequest):
     who: str = '文件传输助手'
+    since: Optional[str] = None  # 上次返回的 cursor，传入时只返回之后的新消息
 
 # 根据id发送引用消息
 class SendQuoteByIdRequest(BaseRequest):
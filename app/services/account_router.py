@@ -0,0 +1,285 @@
+"""
+多账号路由
+每个已登录的微信账号拥有独立的UI执行器（执行通道），
+不同账号的操作互不等待
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Set
+import win32gui
+from fastapi import HTTPException
+from .init import WeChat, WxClient, load_wx_clients, get_wx_clients
+from .ui_executor import UIExecutor, PRIORITY_NORMAL
+
+# 未登录任何账号时使用的默认通道名称
+DEFAULT_ACCOUNT = "default"
+# 请求未知账号时重新发现已登录账号的最小间隔(秒)
+DISCOVERY_INTERVAL = 10
+
+
+class AccountRouter:
+    """多账号路由器
+
+    以微信昵称为键，维护 WxClient 注册表中每个账号对应的UI执行器，
+    并负责按账号重新获取失效的微信窗口实例
+    """
+
+    def __init__(self) -> None:
+        """初始化路由器"""
+        self._lanes: Dict[str, UIExecutor] = {}
+        # 启动后新登录、由重新发现得到的账号
+        self._discovered: Set[str] = set()
+        self._last_discovery = 0.0
+        # 登录、获取二维码的执行通道（不属于任何已登录账号）
+        self._login_lane: Optional[UIExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """发现已登录的微信账号，并为每个账号启动执行通道"""
+        # 账号发现同样涉及UI自动化，需要在COM线程中进行
+        discovery = UIExecutor(name="wechat-discovery")
+        try:
+            discovery.submit(load_wx_clients).result()
+        finally:
+            discovery.stop()
+        for name in list(WxClient.keys()) or [DEFAULT_ACCOUNT]:
+            self.get_lane(name)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止所有执行通道
+
+        Args:
+            timeout: 每个通道等待退出的超时时间(秒)
+        """
+        with self._lock:
+            lanes = list(self._lanes.values())
+            self._lanes.clear()
+            if self._login_lane is not None:
+                lanes.append(self._login_lane)
+                self._login_lane = None
+        for lane in lanes:
+            lane.stop(timeout)
+
+    def resolve_name(self, wxname: Optional[str]) -> str:
+        """解析账号名称，未指定时使用第一个已登录账号
+
+        Args:
+            wxname: 微信客户端名称
+
+        Returns:
+            str: 账号名称
+        """
+        if wxname:
+            return wxname
+        if WxClient:
+            return next(iter(WxClient))
+        return DEFAULT_ACCOUNT
+
+    def is_known(self, wxname: Optional[str]) -> bool:
+        """账号是否已登录（已发现或已有执行通道）
+
+        Args:
+            wxname: 微信客户端名称
+
+        Returns:
+            bool: 是否为已知账号
+        """
+        name = self.resolve_name(wxname)
+        if name in WxClient:
+            return True
+        if name == DEFAULT_ACCOUNT and not WxClient:
+            return True
+        with self._lock:
+            return name in self._lanes or name in self._discovered
+
+    async def discover(self) -> None:
+        """重新发现已登录的账号（用于服务启动后登录的账号）
+
+        发现过程涉及UI自动化，在临时的COM线程中进行，
+        两次发现之间至少间隔 DISCOVERY_INTERVAL 秒，避免未知账号名称的请求反复扫描
+        """
+        with self._lock:
+            if time.monotonic() - self._last_discovery < DISCOVERY_INTERVAL:
+                return
+            self._last_discovery = time.monotonic()
+        discovery = UIExecutor(name="wechat-discovery")
+        try:
+            clients = await asyncio.wrap_future(discovery.submit(get_wx_clients))
+            names = {client.nickname for client in clients}
+        except Exception as e:
+            print(f"警告：无法获取微信客户端: {e}")
+            return
+        finally:
+            discovery.stop(0)
+        with self._lock:
+            self._discovered |= names - set(WxClient)
+
+    def get_lane(self, wxname: Optional[str]) -> UIExecutor:
+        """获取账号对应的执行通道，不存在则创建
+
+        Args:
+            wxname: 微信客户端名称
+
+        Returns:
+            UIExecutor: 执行通道
+
+        Raises:
+            HTTPException: 账号未登录
+        """
+        name = self.resolve_name(wxname)
+        if not self.is_known(name):
+            raise HTTPException(status_code=404, detail=f"微信账号未登录: {name}")
+        with self._lock:
+            lane = self._lanes.get(name)
+            if lane is None:
+                # 每个通道在自己的COM线程中重新获取该账号的微信实例
+                lane = UIExecutor(
+                    name=f"wechat-ui-{name}",
+                    initializer=lambda: self._bind_account(name)
+                )
+                self._lanes[name] = lane
+        lane.start()
+        return lane
+
+    def submit(
+        self,
+        account: Optional[str],
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_NORMAL,
+        chat_key: Optional[str] = None,
+        **kwargs: Any
+    ) -> Future:
+        """提交操作到账号对应的执行通道
+
+        Args:
+            account: 微信客户端名称（路由用，服务方法需要的 wxname 放在 kwargs 中传递）
+            func: 要执行的函数
+            priority: 操作优先级
+            chat_key: 操作的目标聊天
+            *args, **kwargs: 函数参数
+
+        Returns:
+            Future: 操作结果
+        """
+        return self.get_lane(account).submit(func, *args, priority=priority, chat_key=chat_key, **kwargs)
+
+    async def run(
+        self,
+        account: Optional[str],
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_NORMAL,
+        chat_key: Optional[str] = None,
+        **kwargs: Any
+    ) -> Any:
+        """在账号对应的执行通道中执行操作并等待结果
+
+        Args:
+            account: 微信客户端名称（路由用，服务方法需要的 wxname 放在 kwargs 中传递）
+            func: 要执行的函数
+            priority: 操作优先级
+            chat_key: 操作的目标聊天
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        if not self.is_known(account):
+            await self.discover()
+        return await self.get_lane(account).run(func, *args, priority=priority, chat_key=chat_key, **kwargs)
+
+    async def run_login(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在登录通道中执行登录相关操作并等待结果
+
+        登录、获取二维码时账号尚未登录，没有对应的执行通道，
+        这些操作在独立的登录通道中执行，结束后下一次请求未知账号时立即重新发现
+
+        Args:
+            func: 要执行的函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        with self._lock:
+            if self._login_lane is None:
+                self._login_lane = UIExecutor(name="wechat-login")
+            lane = self._login_lane
+        try:
+            return await lane.run(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._last_discovery = 0.0
+
+    def get_wechat(self, wxname: Optional[str]) -> WeChat:
+        """获取账号对应的微信实例，窗口失效时仅重建该账号的实例
+
+        Args:
+            wxname: 微信客户端名称
+
+        Returns:
+            WeChat实例
+        """
+        name = self.resolve_name(wxname)
+        wx = WxClient.get(name)
+        if wx is not None and win32gui.IsWindow(wx.core.HWND):
+            return wx
+
+        print(f"微信窗口实例已不存在，重建实例: {name}")
+        return self._create_wechat(name)
+
+    def idle_seconds(self, wxname: Optional[str]) -> float:
+        """获取账号执行通道已空闲的时间（秒），通道不存在或有操作排队时返回0（不创建通道）
+
+        Args:
+            wxname: 微信客户端名称
+
+        Returns:
+            float: 空闲时间
+        """
+        with self._lock:
+            lane = self._lanes.get(self.resolve_name(wxname))
+        return 0.0 if lane is None else lane.idle_seconds()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各执行通道的统计信息"""
+        with self._lock:
+            lanes = dict(self._lanes)
+        return {name: lane.stats() for name, lane in lanes.items()}
+
+    def _create_wechat(self, name: str) -> WeChat:
+        """创建账号的微信实例并写入注册表"""
+        try:
+            wx = WeChat() if name == DEFAULT_ACCOUNT else WeChat(nickname=name)
+        except Exception as e:
+            print(f"创建微信窗口实例失败，窗口不存在，需要登录: {e}")
+            raise
+
+        if not win32gui.IsWindow(wx.core.HWND):
+            print(f"微信窗口异常，窗口不存在")
+            raise Exception("微信窗口异常，微信窗口不存在")
+
+        WxClient[name] = wx
+        return wx
+
+    def _bind_account(self, name: str) -> None:
+        """在执行通道线程中重新获取账号实例，失败时移除该通道"""
+        try:
+            self._create_wechat(name)
+        except Exception as e:
+            print(f"警告：无法获取微信客户端 {name}: {e}")
+            if name in WxClient:
+                # 已发现的账号（如窗口暂时不可用）保留通道，后续操作时重建实例
+                return
+            with self._lock:
+                lane = self._lanes.pop(name, None)
+                self._discovered.discard(name)
+            if lane is not None:
+                # 已入队的操作执行完（获取实例失败）后线程退出
+                lane.stop()
+
+account_router = AccountRouter()
@@ -0,0 +1,94 @@
+"""
+主窗口当前聊天跟踪
+记录每个账号主窗口当前打开的聊天，目标聊天已打开时跳过搜索切换，
+仅通过 ChatInfo() 做一次廉价校验
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class ActiveChatTracker:
+    """主窗口当前聊天跟踪器"""
+
+    def __init__(self) -> None:
+        """初始化跟踪器"""
+        # 账号 -> (请求的聊天对象, 实际聊天名称)
+        self._active: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "verify_failures": 0,
+        }
+
+    def ensure(self, wx: Any, account: str, who: str, exact: bool = False) -> Optional[str]:
+        """确保主窗口当前聊天为目标聊天，必要时调用 ChatWith 切换
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+            exact: 是否精确匹配
+
+        Returns:
+            Optional[str]: 当前聊天名称，切换失败返回None
+        """
+        with self._lock:
+            active = self._active.get(account)
+        if active is not None and who in active:
+            chatname = active[1]
+            try:
+                verified = wx.ChatInfo().get('chat_name') == chatname
+            except Exception:
+                verified = False
+            with self._lock:
+                if verified:
+                    self._stats["hits"] += 1
+                    return chatname
+                self._stats["verify_failures"] += 1
+
+        with self._lock:
+            self._stats["misses"] += 1
+        try:
+            result = wx.ChatWith(who=who, exact=exact)
+        except Exception:
+            self.invalidate(account)
+            raise
+        if result:
+            chatname = result if isinstance(result, str) else who
+            self.mark(account, who, chatname)
+            return chatname
+        self.invalidate(account)
+        return None
+
+    def mark(self, account: str, who: str, chatname: Optional[str] = None) -> None:
+        """记录主窗口已切换到的聊天
+
+        Args:
+            account: 账号名称
+            who: 请求的聊天对象
+            chatname: 实际聊天名称，默认与who相同
+        """
+        with self._lock:
+            self._active[account] = (who, chatname or who)
+
+    def invalidate(self, account: str) -> None:
+        """主窗口状态未知（如切换了页面）时清除记录
+
+        Args:
+            account: 账号名称
+        """
+        with self._lock:
+            self._active.pop(account, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中率统计"""
+        with self._lock:
+            data = dict(self._stats)
+        total = data["hits"] + data["misses"]
+        data["hit_rate"] = round(data["hits"] / total, 4) if total else 0.0
+        return data
+
+
+active_chat = ActiveChatTracker()
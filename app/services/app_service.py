@@ -1,6 +1,8 @@
 from .applications import *
 from app.models.response import APIResponse
 from app.services.wechat_service import get_wechat
+from app.services.account_router import account_router
+from app.services.active_chat import active_chat
 
 class AppService:
     _instance = None
@@ -18,6 +20,7 @@ class AppService:
         tags: str = ''
     ) -> APIResponse:
         wx = get_wechat(wxname)
+        active_chat.invalidate(account_router.resolve_name(wxname))
         return accept_new_friend(
             wx=wx,
             keywords=keywords,
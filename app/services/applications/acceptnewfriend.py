@@ -1,12 +1,8 @@
 from app.utils.wx_package_manager import get_wx_class, has_feature, is_wxautox
-from pythoncom import CoInitialize
 from typing import Optional, List
 from app.models.response import APIResponse
 import time
 
-# 初始化COM
-CoInitialize()
-
 def accept_single_friend(new, keywords, remark, tags):
 
     if isinstance(keywords, str):
@@ -0,0 +1,190 @@
+"""
+子窗口索引
+按账号缓存 who -> Chat 子窗口对象，命中时仅通过 IsWindow 校验句柄，
+未命中、索引过期或子窗口数量变化时才重新枚举所有子窗口
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import win32gui
+from app.utils.config import settings
+
+# 微信聊天子窗口的窗口类名
+CHAT_WINDOW_CLASS = "ChatWnd"
+
+
+def get_window_handle(chat: Any) -> Optional[int]:
+    """获取子窗口对象的窗口句柄
+
+    Args:
+        chat: Chat子窗口对象
+
+    Returns:
+        Optional[int]: 窗口句柄，获取失败返回None
+    """
+    core = getattr(chat, 'core', None)
+    hwnd = getattr(core, 'HWND', None)
+    if hwnd:
+        return hwnd
+    control = getattr(core, 'control', None)
+    return getattr(control, 'NativeWindowHandle', None)
+
+
+def count_chat_windows() -> int:
+    """统计顶层聊天子窗口的数量（只枚举窗口句柄，不涉及UI自动化）"""
+    hwnds: List[int] = []
+
+    def callback(hwnd: int, _: Any) -> bool:
+        if win32gui.GetClassName(hwnd) == CHAT_WINDOW_CLASS:
+            hwnds.append(hwnd)
+        return True
+
+    win32gui.EnumWindows(callback, None)
+    return len(hwnds)
+
+
+def is_chat_alive(chat: Any) -> bool:
+    """子窗口是否仍然存在"""
+    hwnd = get_window_handle(chat)
+    return bool(hwnd) and bool(win32gui.IsWindow(hwnd))
+
+
+class SubWindowIndex:
+    """子窗口索引"""
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        """初始化子窗口索引
+
+        Args:
+            ttl: 索引有效期(秒)，超过后下次访问时重新枚举
+        """
+        self.ttl = settings.wechat.subwindow_index_ttl if ttl is None else ttl
+        self._index: Dict[str, Dict[str, Any]] = {}
+        # 账号 -> (枚举时间, 枚举时的顶层聊天子窗口数量)
+        self._scans: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "rescans": 0,
+        }
+
+    def get(self, wx: Any, account: str, who: str) -> Optional[Any]:
+        """获取聊天对象的子窗口
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+
+        Returns:
+            Chat实例或None
+        """
+        with self._lock:
+            chat = self._index.get(account, {}).get(who)
+            if chat is not None and is_chat_alive(chat):
+                self._stats["hits"] += 1
+                return chat
+            self._stats["misses"] += 1
+            return self.rescan(wx, account).get(who)
+
+    def find(self, wx: Any, account: str, who: str) -> Optional[Any]:
+        """查找已打开的子窗口，未命中时不重新枚举（仅在账号没有索引、索引过期或子窗口数量变化时枚举）
+
+        用于发送前判断能否走子窗口，避免每次未命中都枚举所有子窗口
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+
+        Returns:
+            Chat实例或None
+        """
+        with self._lock:
+            chats = self._index.get(account)
+            if chats is None or (who not in chats and self._is_stale(account)):
+                chats = self.rescan(wx, account)
+            chat = chats.get(who)
+            if chat is not None and is_chat_alive(chat):
+                self._stats["hits"] += 1
+                return chat
+            if chat is not None:
+                chats.pop(who, None)
+            self._stats["misses"] += 1
+            return None
+
+    def all(self, wx: Any, account: str) -> List[Any]:
+        """获取账号的所有子窗口，缓存中的窗口都有效、索引未过期且子窗口数量未变化时不重新枚举
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+
+        Returns:
+            List[Chat]: 子窗口列表
+        """
+        with self._lock:
+            chats = self._index.get(account)
+            if (
+                chats is not None
+                and not self._is_stale(account)
+                and all(is_chat_alive(chat) for chat in chats.values())
+            ):
+                self._stats["hits"] += 1
+                return list(chats.values())
+            self._stats["misses"] += 1
+            return list(self.rescan(wx, account).values())
+
+    def rescan(self, wx: Any, account: str) -> Dict[str, Any]:
+        """重新枚举账号的所有子窗口
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+
+        Returns:
+            Dict[str, Chat]: who -> Chat
+        """
+        with self._lock:
+            count = count_chat_windows()
+            chats = {chat.who: chat for chat in wx.GetAllSubWindow()}
+            self._index[account] = chats
+            self._scans[account] = (time.monotonic(), count)
+            self._stats["rescans"] += 1
+            return chats
+
+    def invalidate(self, account: str, who: Optional[str] = None) -> None:
+        """使索引失效，下次访问时重新枚举
+
+        Args:
+            account: 账号名称
+            who: 聊天对象，为空时使该账号的全部索引失效（如新打开了子窗口）
+        """
+        with self._lock:
+            if who is None:
+                self._index.pop(account, None)
+                self._scans.pop(account, None)
+            else:
+                self._index.get(account, {}).pop(who, None)
+
+    def _is_stale(self, account: str) -> bool:
+        """索引是否过期，或在服务之外打开/关闭了子窗口（顶层聊天子窗口数量变化）"""
+        scan = self._scans.get(account)
+        if scan is None:
+            return True
+        scanned_at, count = scan
+        if self.ttl > 0 and time.monotonic() - scanned_at > self.ttl:
+            return True
+        return count_chat_windows() != count
+
+    def stats(self) -> Dict[str, int]:
+        """获取索引统计"""
+        with self._lock:
+            data = dict(self._stats)
+            data["cached"] = sum(len(chats) for chats in self._index.values())
+            return data
+
+
+subwin_index = SubWindowIndex()
@@ -0,0 +1,106 @@
+"""
+按聊天重排的操作队列
+同优先级的排队操作中，优先执行与当前聊天相同的操作，减少 ChatWith 切换；
+同一聊天内保持先进先出，并限制连续插队的次数，保证其他聊天不会饿死
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class ChatScheduler:
+    """按聊天分组的优先级队列（线程安全）"""
+
+    def __init__(self, max_streak: int = 5) -> None:
+        """初始化队列
+
+        Args:
+            max_streak: 同一聊天最多连续插队执行的次数（公平性上限）
+        """
+        self.max_streak = max(max_streak, 0)
+        # (优先级, 序号, 聊天, 操作)，按提交顺序保存
+        self._items: List[Tuple[float, int, Optional[str], Any]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._current: Optional[str] = None
+        self._streak = 0
+        self._saved: Deque[float] = deque()
+        self._stats = {
+            "reordered": 0,
+            "switches_saved": 0,
+        }
+
+    def put(self, priority: float, chat: Optional[str], item: Any) -> None:
+        """放入一个操作
+
+        Args:
+            priority: 优先级（数值越小越优先）
+            chat: 操作的目标聊天，为空（None 或空字符串，如未指定 who 的当前聊天）表示与聊天无关
+            item: 操作
+        """
+        # 空的聊天名称表示当前聊天，不参与分组
+        chat = chat or None
+        with self._cond:
+            self._items.append((priority, next(self._counter), chat, item))
+            self._cond.notify()
+
+    def get(self) -> Any:
+        """取出下一个要执行的操作（队列为空时阻塞）
+
+        Returns:
+            Any: 操作
+        """
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            index = self._select()
+            _, _, chat, item = self._items.pop(index)
+            # 与聊天无关的操作不影响分组
+            if chat is not None:
+                if chat == self._current:
+                    self._streak += 1
+                else:
+                    self._current, self._streak = chat, 0
+            return item
+
+    def qsize(self) -> int:
+        """排队中的操作数量"""
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取重排统计"""
+        with self._cond:
+            data = dict(self._stats)
+            self._trim_saved(time.monotonic())
+            data["switches_saved_per_minute"] = len(self._saved)
+        return data
+
+    def _select(self) -> int:
+        """选择下一个操作的下标（需持有锁）"""
+        top = min(priority for priority, _, _, _ in self._items)
+        candidates = [i for i, entry in enumerate(self._items) if entry[0] == top]
+        head = min(candidates, key=lambda i: self._items[i][1])
+        head_chat = self._items[head][2]
+        if self._current is None or head_chat == self._current or self._streak >= self.max_streak:
+            return head
+
+        # 同优先级中是否有当前聊天的操作可以先执行（取最早的，保持聊天内顺序）
+        same = [i for i in candidates if self._items[i][2] == self._current]
+        if not same:
+            return head
+        index = min(same, key=lambda i: self._items[i][1])
+        self._stats["reordered"] += 1
+        self._stats["switches_saved"] += 1
+        now = time.monotonic()
+        self._saved.append(now)
+        self._trim_saved(now)
+        return index
+
+    def _trim_saved(self, now: float) -> None:
+        """只保留最近一分钟内节省切换的记录"""
+        while self._saved and now - self._saved[0] > 60:
+            self._saved.popleft()
@@ -1,17 +1,11 @@
 from typing import Optional, Union
 from app.models.response import APIResponse
-from .wechat_service import get_wechat_subwin
-from .init import WeChat, WxClient
-
-def get_wechat(wxname: str) -> 'WeChat':
-    """获取微信实例"""
-    if (not wxname) and WxClient:
-        wx = list(WxClient.values())[0]
-    elif wxname in WxClient:
-        wx = WxClient[wxname]
-    else:
-        wx = WeChat(nickname=wxname)
-    return wx
+from .wechat_service import WeChatService, get_wechat_subwin
+from .account_router import account_router
+from .chat_index import subwin_index
+from .message_broker import message_broker
+from .message_store import message_store
+from .message_cursor import message_cursors
 
 class ChatService:
     _instance = None
@@ -32,22 +26,26 @@ class ChatService:
         at: Optional[Union[str, list]] = None,
         wxname: Optional[str] = None
     ) -> APIResponse:
-        subwin = get_wechat_subwin(wxname, who)
-        if subwin:
-            result = subwin.SendMsg(msg=msg, clear=clear, at=at)
-            return APIResponse(success=bool(result), message=result['message'], data=result['data'])
-        else:
-            return APIResponse(success=False, message='找不到该聊天窗口')
+        # 有子窗口时在子窗口发送，否则回退到主窗口
+        return WeChatService().send_message(msg=msg, who=who, clear=clear, at=at, exact=True, wxname=wxname)
         
     def get_all_message(
             self,
             who: str,
+            since: Optional[str] = None,
             wxname: Optional[str] = None
         ) -> APIResponse:
         subwin = get_wechat_subwin(wxname, who)
         if subwin:
+            account = account_router.resolve_name(wxname)
             result = subwin.ChatInfo()
-            result['msg'] = [msg.info for msg in subwin.GetAllMessage()]
+            msgs, cursor, reset = message_cursors.slice(
+                account, result.get('chat_name') or who, subwin.GetAllMessage(), since
+            )
+            result['msg'] = [msg.info for msg in msgs]
+            result['cursor'] = cursor
+            result['cursor_reset'] = reset
+            message_store.add(account, result)
             return APIResponse(success=True, message='', data=result)
         else:
             return APIResponse(success=False, message='找不到该聊天窗口')
@@ -61,6 +59,9 @@ class ChatService:
         if subwin:
             result = subwin.ChatInfo()
             result['msg'] = [msg.info for msg in subwin.GetNewMessage()]
+            account = account_router.resolve_name(wxname)
+            message_broker.publish(account, result)
+            message_store.add(account, result)
             return APIResponse(success=True, message='', data=result)
         else:
             return APIResponse(success=False, message='找不到该聊天窗口')
@@ -107,6 +108,7 @@ class ChatService:
             if subwin is None:
                 return APIResponse(success=False, message=f'窗口不存在：{who}')
             subwin.Close()
+            subwin_index.invalidate(account_router.resolve_name(wxname), who)
             return APIResponse(success=True, message='')
 
         except Exception as e:
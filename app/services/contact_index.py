@@ -0,0 +1,184 @@
+"""
+聊天对象名称索引
+在本地维护已知的聊天名称（来自子窗口、会话列表和成功切换过的聊天），
+在操作界面前将 who 解析为准确名称。只有（规范化后）完全相同的名称才会解析，
+前缀和模糊匹配的结果只作为候选名称返回，不会被当作目标聊天，避免发给名字相近的人
+"""
+
+import difflib
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from app.utils.config import settings
+from .chat_index import subwin_index
+
+
+def normalize_name(name: str) -> str:
+    """规范化聊天名称（全角/半角、大小写和首尾空白不同视为同一名称）
+
+    Args:
+        name: 聊天名称
+
+    Returns:
+        str: 规范化后的名称
+    """
+    return unicodedata.normalize("NFKC", name).strip().casefold()
+
+
+class ChatNotFoundError(HTTPException):
+    """无法解析聊天对象名称（有候选名称时为409，没有时为404）"""
+
+    def __init__(self, who: str, suggestions: Optional[List[str]] = None) -> None:
+        self.who = who
+        self.suggestions = suggestions or []
+        message = f'找不到聊天对象：{who}'
+        if self.suggestions:
+            message += f'，您是否要找：{"、".join(self.suggestions)}'
+        super().__init__(status_code=409 if self.suggestions else 404, detail=message)
+
+
+class ContactIndex:
+    """聊天对象名称索引"""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        miss_refresh_interval: Optional[float] = None,
+        max_suggestions: int = 5
+    ) -> None:
+        """初始化名称索引
+
+        Args:
+            ttl: 会话列表刷新间隔(秒)
+            miss_refresh_interval: 未命中时刷新索引的最小间隔(秒)
+            max_suggestions: 解析失败时最多返回的候选名称数
+        """
+        self.ttl = settings.wechat.contact_index_ttl if ttl is None else ttl
+        self.miss_refresh_interval = (
+            settings.wechat.contact_miss_refresh_interval if miss_refresh_interval is None else miss_refresh_interval
+        )
+        self.max_suggestions = max_suggestions
+        self._names: Dict[str, Set[str]] = {}
+        self._refreshed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "exact": 0,
+            "suggested": 0,
+            "unresolved": 0,
+            "refreshes": 0,
+            "miss_refreshes_skipped": 0,
+        }
+
+    def add(self, account: str, name: str) -> None:
+        """记录一个已知的聊天名称
+
+        Args:
+            account: 账号名称
+            name: 聊天名称
+        """
+        if not name:
+            return
+        with self._lock:
+            self._names.setdefault(account, set()).add(name)
+
+    def refresh(self, wx: Any, account: str) -> None:
+        """从子窗口和会话列表刷新名称索引
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+        """
+        names = set()
+        try:
+            names.update(chat.who for chat in subwin_index.all(wx, account))
+        except Exception as e:
+            print(f"刷新名称索引时获取子窗口失败: {e}")
+        try:
+            names.update(session.name for session in wx.GetSession())
+        except Exception as e:
+            print(f"刷新名称索引时获取会话列表失败: {e}")
+        with self._lock:
+            self._names.setdefault(account, set()).update(names)
+            self._refreshed[account] = time.monotonic()
+            self._stats["refreshes"] += 1
+
+    def lookup(self, account: str, who: str) -> Tuple[Optional[str], List[str]]:
+        """在索引中查找聊天名称（不操作界面）
+
+        只有规范化后完全相同且唯一的名称才会解析，前缀、相似和包含的名称只作为候选
+
+        Args:
+            account: 账号名称
+            who: 聊天对象
+
+        Returns:
+            Tuple[Optional[str], List[str]]: (解析出的名称, 候选名称列表)
+        """
+        with self._lock:
+            names = set(self._names.get(account, ()))
+
+        if who in names:
+            self._count("exact")
+            return who, []
+
+        key = normalize_name(who)
+        normalized = {name: normalize_name(name) for name in names}
+        same = sorted(name for name, value in normalized.items() if value == key)
+        if len(same) == 1:
+            self._count("exact")
+            return same[0], []
+
+        prefixed = sorted((name for name, value in normalized.items() if value.startswith(key)), key=len)
+        close = difflib.get_close_matches(who, names, n=self.max_suggestions, cutoff=0.6)
+        contains = sorted((name for name, value in normalized.items() if key in value), key=len)
+        candidates = list(dict.fromkeys(same + prefixed + close + contains))
+        if candidates:
+            self._count("suggested")
+        return None, candidates[:self.max_suggestions]
+
+    def resolve(self, wx: Any, account: str, who: str) -> Tuple[Optional[str], List[str]]:
+        """解析聊天名称，索引过期或未命中时刷新一次
+
+        未命中时的刷新距上次刷新至少间隔 miss_refresh_interval 秒，
+        避免反复请求不存在的名称时每次都重新读取会话列表
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+
+        Returns:
+            Tuple[Optional[str], List[str]]: (解析出的名称, 候选名称列表)
+        """
+        with self._lock:
+            refreshed = self._refreshed.get(account)
+        stale = refreshed is None or time.monotonic() - refreshed > self.ttl
+        if stale:
+            self.refresh(wx, account)
+
+        name, suggestions = self.lookup(account, who)
+        if name is None and not stale:
+            if time.monotonic() - refreshed >= self.miss_refresh_interval:
+                self.refresh(wx, account)
+                name, suggestions = self.lookup(account, who)
+            else:
+                self._count("miss_refreshes_skipped")
+        if name is None:
+            self._count("unresolved")
+        return name, suggestions
+
+    def stats(self) -> Dict[str, int]:
+        """获取解析统计"""
+        with self._lock:
+            data = dict(self._stats)
+            data["names"] = sum(len(names) for names in self._names.values())
+            return data
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+
+contact_index = ContactIndex()
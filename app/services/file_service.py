@@ -1,14 +1,33 @@
 import os
+import asyncio
+import functools
 import hashlib
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Tuple, List
+from typing import Any, BinaryIO, Callable, Optional, Tuple, List, TypeVar
 from fastapi import UploadFile, HTTPException
 from app.models.file import FileInfo, FileUploadResponse
-from app.models.base import QueryParams
 from app.database.factory import DatabaseFactory
 from app.utils.config import settings
 import shutil
 
+T = TypeVar('T')
+
+# 文件读写和数据库操作使用独立的有界线程池，不占用事件循环和默认线程池
+_io_pool = ThreadPoolExecutor(max_workers=settings.upload.io_workers, thread_name_prefix="file-io")
+# 文件登记锁（检查内容是否已存在到写入记录之间）
+_store_lock = threading.Lock()
+# 别名与文件内容的联合查询，字段与 FileInfo 对应
+_ALIAS_SELECT = (
+    "SELECT a.id, a.filename, a.file_type, a.description, a.uploader, a.upload_time, a.download_count, "
+    "f.file_size, f.file_hash, f.file_path FROM file_aliases AS a JOIN files AS f ON f.id=a.file_hash"
+)
+# 同时进行的上传数量上限
+_upload_semaphore = asyncio.Semaphore(settings.upload.max_concurrent_uploads)
+
 class FileService:
     """文件服务"""
     
@@ -20,9 +39,12 @@ class FileService:
         self.allowed_types = settings.upload.allowed_types
         self.chunk_size = settings.upload.chunk_size
         
+        # 上传过程中的临时文件目录
+        self.temp_dir = os.path.join(self.base_dir, ".tmp")
+        
         # 确保上传目录存在
-        if not os.path.exists(self.base_dir):
-            os.makedirs(self.base_dir)
+        if not os.path.exists(self.temp_dir):
+            os.makedirs(self.temp_dir)
             
         # 创建文件表
         self.db.create_table("files", {
@@ -36,24 +58,45 @@ class FileService:
             "description": "TEXT",
             "uploader": "TEXT",
             "download_count": "INTEGER DEFAULT 0",
-            "is_deleted": "INTEGER DEFAULT 0"
+            "is_deleted": "INTEGER DEFAULT 0",
+            "ref_count": "INTEGER DEFAULT 0"
         })
-        
-    def _calculate_hash(self, file: UploadFile) -> str:
-        """计算文件哈希值
-        
-        Args:
-            file: 上传的文件
-            
-        Returns:
-            str: 文件哈希值
-        """
-        sha256 = hashlib.sha256()
-        while chunk := file.file.read(self.chunk_size):
-            sha256.update(chunk)
-        file.file.seek(0)  # 重置文件指针
-        return sha256.hexdigest()
 
+        # 创建文件别名表（多个文件名、上传者、描述记录共用一份文件内容）
+        self.db.create_table("file_aliases", {
+            "id": "TEXT PRIMARY KEY",
+            "file_hash": "TEXT NOT NULL",
+            "filename": "TEXT NOT NULL",
+            "file_type": "TEXT NOT NULL",
+            "description": "TEXT",
+            "uploader": "TEXT",
+            "upload_time": "TIMESTAMP NOT NULL",
+            "download_count": "INTEGER DEFAULT 0"
+        })
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_file_aliases_hash ON file_aliases (file_hash)")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """旧版文件表升级：每条未删除的文件记录生成一个别名，别名ID沿用原文件ID，旧的 file_id 继续有效，
+        已软删除的记录连同文件内容一起删除"""
+        with _store_lock:
+            columns = {row["name"] for row in self.db.execute("PRAGMA table_info(files)")}
+            if "ref_count" in columns:
+                return
+            self.db.execute("ALTER TABLE files ADD COLUMN ref_count INTEGER DEFAULT 0")
+            self.db.execute(
+                "INSERT OR IGNORE INTO file_aliases "
+                "(id, file_hash, filename, file_type, description, uploader, upload_time, download_count) "
+                "SELECT id, file_hash, filename, file_type, description, uploader, upload_time, download_count "
+                "FROM files WHERE is_deleted=0"
+            )
+            self.db.execute(
+                "UPDATE files SET ref_count=(SELECT COUNT(*) FROM file_aliases WHERE file_hash=files.id)"
+            )
+            # 升级前已软删除的记录没有别名，删除其文件内容，否则不会再有删除操作清理它们
+            for row in self.db.execute("SELECT id, file_path FROM files WHERE ref_count<=0"):
+                self._remove_blob(row["id"], row["file_path"])
+        
     def _calculate_hash_by_path(self, file_path: str) -> str:
         """计算本地文件的哈希值
         
@@ -69,46 +112,29 @@ class FileService:
                 sha256_hash.update(chunk)
         return sha256_hash.hexdigest()
         
-    def _get_file_path(self, file_hash: str, filename: str) -> str:
-        """获取文件存储路径
+    def _get_temp_path(self) -> str:
+        """获取临时文件路径（与存储目录在同一文件系统，入库时可以建立硬链接）
+
+        Returns:
+            str: 临时文件路径
+        """
+        return os.path.join(self.temp_dir, uuid.uuid4().hex)
+
+    def _get_blob_path(self, file_hash: str) -> str:
+        """获取文件内容的存储路径（按哈希前两位分目录，文件名只用哈希值）
         
         Args:
             file_hash: 文件哈希值
-            filename: 原始文件名
             
         Returns:
             str: 文件存储路径
         """
-        # 使用哈希值作为子目录
-        sub_dir = os.path.join(self.base_dir, file_hash)
-        if not os.path.exists(sub_dir):
-            os.makedirs(sub_dir)
-            
-        # 获取文件扩展名
-        _, ext = os.path.splitext(filename)
-        return os.path.join(sub_dir, filename)
-        
-    def _validate_file(self, file: UploadFile) -> None:
-        """验证文件
-        
-        Args:
-            file: 上传的文件
-            
-        Raises:
-            HTTPException: 文件验证失败
-        """
-        # 检查文件大小
-        file_size = 0
-        while chunk := file.file.read(self.chunk_size):
-            file_size += len(chunk)
-            if file_size > self.max_size:
-                raise HTTPException(status_code=400, detail="文件大小超过限制")
-        file.file.seek(0)
-        
-        # 检查文件类型
-        if self.allowed_types and file.content_type not in self.allowed_types:
-            raise HTTPException(status_code=400, detail="不支持的文件类型")
+        return os.path.join(self.base_dir, "blobs", file_hash[:2], file_hash)
 
+    def _get_named_dir(self, file_id: str) -> str:
+        """获取别名的文件名链接所在目录"""
+        return os.path.join(self.base_dir, "names", file_id)
+        
     def _validate_file_by_path(self, file_path: str) -> str:
         """验证文件
         
@@ -142,6 +168,19 @@ class FileService:
             
         return file_type or "application/octet-stream"
             
+    async def run_io(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """在文件I/O线程池中执行磁盘和数据库操作，不阻塞事件循环
+
+        Args:
+            func: 要执行的函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_io_pool, functools.partial(func, *args, **kwargs))
+
     async def upload_file(
         self,
         file: UploadFile,
@@ -149,6 +188,9 @@ class FileService:
         uploader: Optional[str] = None
     ) -> FileUploadResponse:
         """上传文件
+
+        同时进行的上传数量受 upload.max_concurrent_uploads 限制，超出的上传排队等待，
+        读取、写入和数据库操作都在文件I/O线程池中执行
         
         Args:
             file: 上传的文件
@@ -158,91 +200,240 @@ class FileService:
         Returns:
             FileUploadResponse: 文件上传响应
         """
-        # 验证文件
-        self._validate_file(file)
-        
-        # 计算文件哈希值
-        file_hash = self._calculate_hash(file)
-        
-        # 获取文件存储路径
-        file_path = self._get_file_path(file_hash, file.filename)
-        
-        # 检查文件是否已存在
-        existing_file = self.db.get_by_id("files", file_hash)
-        if existing_file:
-            #清除is_deleted
-            self.db.update("files", file_hash, {"is_deleted": 0})
-            # 文件已存在，返回现有文件信息
-            return FileUploadResponse(
-                file_id=existing_file["id"],
-                filename=existing_file["filename"],
-                file_type=existing_file["file_type"],
-                file_size=existing_file["file_size"],
-                file_hash=existing_file["file_hash"],
-                file_path=existing_file["file_path"],
-                upload_time=existing_file["upload_time"],
-                is_new=False
+        # 检查文件类型
+        if self.allowed_types and file.content_type not in self.allowed_types:
+            raise HTTPException(status_code=400, detail="不支持的文件类型")
+
+        async with _upload_semaphore:
+            return await self.run_io(
+                self._store_upload, file.file, file.filename, file.content_type, description, uploader
             )
-            
-        # 保存文件
-        with open(file_path, "wb") as f:
-            while chunk := file.file.read(self.chunk_size):
-                f.write(chunk)
-                
-        file_type = file.content_type or "application/octet-stream"
-
-        # 记录文件信息
-        file_info = {
-            "id": file_hash,
-            "filename": file.filename,
-            "file_type": file_type,
-            "file_size": os.path.getsize(file_path),
+
+    def _store_upload(
+        self,
+        fileobj: BinaryIO,
+        filename: str,
+        content_type: Optional[str],
+        description: Optional[str] = None,
+        uploader: Optional[str] = None
+    ) -> FileUploadResponse:
+        """保存上传的文件（在文件I/O线程池中执行）
+
+        只读取一遍上传内容：边读边检查大小、计算哈希并写入同一文件系统上的临时文件，
+        得到哈希后原子重命名到存储位置，内容已存在时直接丢弃临时文件
+
+        Args:
+            fileobj: 上传内容
+            filename: 原始文件名
+            content_type: 文件类型
+            description: 文件描述
+            uploader: 上传者
+
+        Returns:
+            FileUploadResponse: 文件上传响应
+        """
+        temp_path = self._get_temp_path()
+        try:
+            sha256 = hashlib.sha256()
+            file_size = 0
+            with open(temp_path, "wb") as f:
+                while chunk := fileobj.read(self.chunk_size):
+                    file_size += len(chunk)
+                    if file_size > self.max_size:
+                        raise HTTPException(status_code=400, detail="文件大小超过限制")
+                    sha256.update(chunk)
+                    f.write(chunk)
+            file_hash = sha256.hexdigest()
+
+            result = self.register_file(
+                file_hash, file_size, temp_path, True, filename,
+                content_type or "application/octet-stream", description, uploader
+            )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return FileUploadResponse(**result)
+
+    def register_file(
+        self,
+        file_hash: str,
+        file_size: int,
+        source_path: str,
+        move: bool,
+        filename: str,
+        file_type: str,
+        description: Optional[str],
+        uploader: Optional[str]
+    ) -> dict:
+        """登记文件内容和别名
+
+        内容不存在时把源文件放到存储位置，已存在时不写入任何数据；
+        每次登记都新建一个别名并增加内容的引用计数（即使文件名、上传者、描述都相同），
+        这样每个调用方删除自己的别名时不会影响其他调用方
+
+        Args:
+            file_hash: 文件哈希值
+            file_size: 文件大小
+            source_path: 源文件路径
+            move: 是否在登记成功后删除源文件（登记失败时源文件始终保留）
+            filename: 文件名
+            file_type: 文件类型
+            description: 文件描述
+            uploader: 上传者
+
+        Returns:
+            dict: 文件信息（file_id 为别名ID，is_new 表示文件内容是否为新上传）
+        """
+        filename = os.path.basename(filename)
+        # 检查、存放和登记之间加锁，避免相同内容的并发上传重复登记
+        with _store_lock:
+            blob = self.db.get_by_id("files", file_hash)
+            is_new = blob is None
+            placed = False
+            try:
+                if is_new:
+                    file_path = self._get_blob_path(file_hash)
+                    self._place(source_path, file_path)
+                    placed = True
+                    now = datetime.now().isoformat()
+                    self.db.insert("files", {
+                        "id": file_hash,
+                        "filename": filename,
+                        "file_type": file_type,
+                        "file_size": file_size,
+                        "file_hash": file_hash,
+                        "file_path": file_path,
+                        "upload_time": now,
+                        "download_count": 0,
+                        "is_deleted": 0,
+                        "ref_count": 0
+                    })
+                else:
+                    file_path = blob["file_path"]
+                    # 存储文件丢失时用本次的内容补回
+                    if not os.path.exists(file_path):
+                        self._place(source_path, file_path)
+
+                alias = {
+                    "id": uuid.uuid4().hex,
+                    "file_hash": file_hash,
+                    "filename": filename,
+                    "file_type": file_type,
+                    "description": description,
+                    "uploader": uploader,
+                    "upload_time": datetime.now().isoformat(),
+                    "download_count": 0
+                }
+                self.db.insert("file_aliases", alias)
+                self.db.execute(
+                    "UPDATE files SET ref_count=ref_count+1, is_deleted=0 WHERE id=?", [file_hash]
+                )
+            except Exception:
+                # 登记失败时撤销本次存放的内容，源文件保持不动，调用方可以重试
+                if placed:
+                    self._remove_blob(file_hash, file_path)
+                raise
+
+            # 登记成功后才删除源文件（移动模式）
+            if move and os.path.exists(source_path):
+                os.remove(source_path)
+
+        return {
+            "file_id": alias["id"],
+            "filename": alias["filename"],
+            "file_type": alias["file_type"],
+            "file_size": file_size,
             "file_hash": file_hash,
             "file_path": file_path,
-            "upload_time": datetime.now().isoformat(),
-            "description": description,
-            "uploader": uploader,
-            "download_count": 0,
-            "is_deleted": 0
+            "upload_time": alias["upload_time"],
+            "description": alias["description"],
+            "uploader": alias["uploader"],
+            "is_new": is_new
         }
-        
-        self.db.insert("files", file_info)
-        
-        return FileUploadResponse(
-            file_id=file_info["id"],
-            filename=file_info["filename"],
-            file_type=file_info["file_type"],
-            file_size=file_info["file_size"],
-            file_hash=file_info["file_hash"],
-            file_path=file_info["file_path"],
-            upload_time=file_info["upload_time"],
-            is_new=True
-        )
+
+    def _place(self, source_path: str, file_path: str) -> None:
+        """把源文件放到存储位置（同一文件系统上建立硬链接，不复制数据；源文件由调用方删除）"""
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        try:
+            os.link(source_path, file_path)
+        except OSError:
+            shutil.copy2(source_path, file_path)
         
     def get_file(self, file_id: str) -> Optional[FileInfo]:
         """获取文件信息
         
         Args:
-            file_id: 文件ID
+            file_id: 文件ID（别名ID）
             
         Returns:
             Optional[FileInfo]: 文件信息
         """
-        file_info = self.db.get_by_id("files", file_id)
-        if not file_info or file_info["is_deleted"]:
+        rows = self.db.execute(_ALIAS_SELECT + " WHERE a.id=?", [file_id])
+        return FileInfo(**rows[0]) if rows else None
+
+    def get_send_path(self, file_id: str) -> Optional[str]:
+        """获取以别名文件名发送时使用的文件路径
+
+        存储文件以哈希值命名，发送前在别名目录中建立一个以别名文件名命名的硬链接，不复制数据
+        （文件系统不支持硬链接时才复制），链接保留到别名删除
+
+        Args:
+            file_id: 文件ID（别名ID）
+
+        Returns:
+            Optional[str]: 文件路径，文件不存在返回None
+        """
+        file_info = self.get_file(file_id)
+        if file_info is None or not os.path.exists(file_info.file_path):
             return None
-        return FileInfo(**file_info)
+        if os.path.basename(file_info.file_path) == file_info.filename:
+            return file_info.file_path
+
+        named_path = os.path.join(self._get_named_dir(file_id), file_info.filename)
+        if not os.path.exists(named_path):
+            os.makedirs(os.path.dirname(named_path), exist_ok=True)
+            try:
+                os.link(file_info.file_path, named_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(file_info.file_path, named_path)
+        return named_path
         
     def delete_file(self, file_id: str) -> bool:
-        """删除文件
+        """删除文件（别名），文件内容在最后一个别名删除后才删除
         
         Args:
-            file_id: 文件ID
+            file_id: 文件ID（别名ID）
             
         Returns:
             bool: 是否删除成功
         """
-        return self.db.update("files", file_id, {"is_deleted": 1})
+        with _store_lock:
+            alias = self.db.get_by_id("file_aliases", file_id)
+            if alias is None:
+                return False
+            self.db.delete("file_aliases", file_id)
+            shutil.rmtree(self._get_named_dir(file_id), ignore_errors=True)
+
+            rows = self.db.execute(
+                "UPDATE files SET ref_count=ref_count-1 WHERE id=? RETURNING ref_count, file_path",
+                [alias["file_hash"]]
+            )
+            if rows and rows[0]["ref_count"] <= 0:
+                self._remove_blob(alias["file_hash"], rows[0]["file_path"])
+        return True
+
+    def _remove_blob(self, file_hash: str, file_path: str) -> None:
+        """删除没有别名引用的文件内容和记录（调用方持有 _store_lock）"""
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        # 旧版按哈希值建立的子目录
+        parent = os.path.dirname(file_path)
+        if os.path.basename(parent) == file_hash:
+            shutil.rmtree(parent, ignore_errors=True)
+        self.db.delete("files", file_hash)
         
     def list_files(self, skip: int = 0, limit: int = 100) -> Tuple[int, List[FileInfo]]:
         """列出文件
@@ -254,15 +445,11 @@ class FileService:
         Returns:
             Tuple[int, List[FileInfo]]: 总数和文件列表
         """
-        params = QueryParams(
-            skip = skip,
-            limit = limit,
-            filters = {"is_deleted": 0},
-            sort_by = "upload_time",
-            sort_order = "DESC"
+        total = self.db.execute("SELECT COUNT(*) AS total FROM file_aliases")[0]["total"]
+        rows = self.db.execute(
+            _ALIAS_SELECT + " ORDER BY a.upload_time DESC LIMIT ? OFFSET ?", [limit, skip]
         )
-        result = self.db.query("files", params)
-        return result.total, [FileInfo(**item) for item in result.items] 
+        return total, [FileInfo(**item) for item in rows]
     
     async def download_file(self, file_id: str) -> Tuple[str, str, str]:
         """下载文件
@@ -276,33 +463,46 @@ class FileService:
         Raises:
             HTTPException: 文件不存在或已被删除
         """
+        return await self.run_io(self._prepare_download, file_id)
+
+    def _prepare_download(self, file_id: str) -> Tuple[str, str, str]:
+        """检查文件并更新下载次数（在文件I/O线程池中执行）"""
         # 获取文件信息
-        file_info = self.db.get_by_id("files", file_id)
+        file_info = self.get_file(file_id)
         
-        if not file_info or file_info["is_deleted"]:
+        if not file_info:
             raise HTTPException(status_code=404, detail="文件不存在或已被删除")
         
         # 检查文件是否实际存在
-        file_path = file_info["file_path"]
+        file_path = file_info.file_path
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="文件不存在")
         
         # 更新下载次数
-        self.db.update("files", file_id, {
-            "download_count": file_info["download_count"] + 1
-        })
+        self.db.execute(
+            "UPDATE file_aliases SET download_count=download_count+1 WHERE id=?", [file_id]
+        )
         
         return (
             file_path, 
-            file_info["filename"], 
-            file_info["file_type"]
+            file_info.filename, 
+            file_info.file_type
         )
 
+    def make_staging_dir(self) -> str:
+        """创建暂存目录（位于上传目录所在的文件系统，文件入库时可以直接重命名）
+
+        Returns:
+            str: 暂存目录路径，使用后由调用方删除
+        """
+        return tempfile.mkdtemp(dir=self.temp_dir)
+
     def upload_file_by_path(
         self,
         file_path: str,
         description: Optional[str] = None,
-        uploader: Optional[str] = None
+        uploader: Optional[str] = None,
+        move: bool = False
     ) -> dict:
         """通过文件路径上传文件
         
@@ -310,6 +510,8 @@ class FileService:
             file_path: 本地文件路径
             description: 文件描述
             uploader: 上传者
+            move: 是否移动源文件（源文件为暂存文件时使用）：同一文件系统上以硬链接入库，
+                不复制数据；源文件只在登记成功后删除，失败时保留
             
         Returns:
             dict: 文件信息字典
@@ -328,57 +530,6 @@ class FileService:
         # 计算文件哈希值
         file_hash = self._calculate_hash_by_path(file_path)
         
-        # 获取文件存储路径（复制到指定位置）
-        target_path = self._get_file_path(file_hash, filename)
-        
-        # 检查文件是否已存在
-        existing_file = self.db.get_by_id("files", file_hash)
-        if existing_file:
-            #清除is_deleted
-            self.db.update("files", file_hash, {"is_deleted": 0})
-            # 文件已存在，返回现有文件信息
-            return {
-                "file_id": existing_file["id"],
-                "filename": existing_file["filename"],
-                "file_type": existing_file["file_type"],
-                "file_size": existing_file["file_size"],
-                "file_hash": existing_file["file_hash"],
-                "file_path": existing_file["file_path"],
-                "upload_time": existing_file["upload_time"],
-                "description": existing_file.get("description"),
-                "uploader": existing_file.get("uploader"),
-                "is_new": False
-            }
-        
-        # 复制文件到目标位置
-        shutil.copy2(file_path, target_path)
-                
-        # 记录文件信息
-        file_info = {
-            "id": file_hash,
-            "filename": filename,
-            "file_type": file_type,
-            "file_size": os.path.getsize(target_path),
-            "file_hash": file_hash,
-            "file_path": target_path,
-            "upload_time": datetime.now().isoformat(),
-            "description": description,
-            "uploader": uploader,
-            "download_count": 0,
-            "is_deleted": 0
-        }
-        
-        self.db.insert("files", file_info)
-        
-        return {
-            "file_id": file_info["id"],
-            "filename": file_info["filename"],
-            "file_type": file_info["file_type"],
-            "file_size": file_info["file_size"],
-            "file_hash": file_info["file_hash"],
-            "file_path": file_info["file_path"],
-            "upload_time": file_info["upload_time"],
-            "description": file_info["description"],
-            "uploader": file_info["uploader"],
-            "is_new": True
-        }
\ No newline at end of file
+        return self.register_file(
+            file_hash, os.path.getsize(file_path), file_path, move, filename, file_type, description, uploader
+        )
@@ -0,0 +1,189 @@
+"""
+持有消息对象的后台任务
+媒体下载、语音转文字等需要在登记消息后，稍后在账号执行通道中操作原消息对象。
+这里提供共同的部分：按消息生成稳定ID、在内存中保留最近的消息对象、
+在执行通道中切换到消息所在聊天并取回消息对象，以及等待任务结果
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.database.factory import DatabaseFactory
+from .account_router import account_router
+from .active_chat import active_chat
+from .window_manager import window_manager
+
+
+def message_key(account: str, msg: Any, msg_info: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+    """生成消息的稳定ID
+
+    Args:
+        account: 账号名称
+        msg: 消息对象
+        msg_info: 消息信息
+
+    Returns:
+        Tuple[str, str, Optional[str]]: (ID, 消息ID, 聊天名称)
+    """
+    msg_id = str(getattr(msg, 'hash', None) or msg_info.get('id') or getattr(msg, 'id', ''))
+    chat_name = msg_info.get('chat_name')
+    key = hashlib.sha1(f"{account}|{chat_name}|{msg_id}".encode('utf-8')).hexdigest()[:20]
+    return key, msg_id, chat_name
+
+
+class HeldMessageService:
+    """持有消息对象的后台任务基类
+
+    子类指定任务表 table 和仍在进行中的状态 active_statuses，
+    任务记录需要包含 account、chat_name、msg_id 和 status 字段
+    """
+
+    table: str = ""
+    active_statuses: Tuple[str, ...] = ()
+
+    def __init__(self, max_held_messages: int) -> None:
+        """初始化
+
+        Args:
+            max_held_messages: 内存中保留的消息对象上限
+        """
+        self.db = DatabaseFactory.get_database()
+        self.max_held_messages = max_held_messages
+        # 任务ID -> 消息对象（任务执行时需要消息对象，只保留最近的一部分）
+        self._messages: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._notify_event: Optional[asyncio.Event] = None
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定等待任务结果的请求所在的事件循环
+
+        Args:
+            loop: 事件循环
+        """
+        self._loop = loop
+        self._notify_event = asyncio.Event()
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """注册消息更新回调，任务完成后把结果作为原消息的更新通知出去
+
+        回调参数与新消息回调相同：(账号名称, {chat_name, msg: [更新]})，
+        每条更新的 event 为 "update"，id 与原消息的 hash（未启用时为 id）相同
+
+        Args:
+            callback: 回调函数
+        """
+        self._listeners.append(callback)
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务记录
+
+        Args:
+            item_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务记录，不存在返回None
+        """
+        return self.db.get_by_id(self.table, item_id)
+
+    async def wait(self, item_id: str, wait_seconds: float = 0) -> Optional[Dict[str, Any]]:
+        """获取任务记录，未完成时最多等待 wait_seconds 秒
+
+        Args:
+            item_id: 任务ID
+            wait_seconds: 等待时间(秒)
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务记录，不存在返回None
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(wait_seconds, 0)
+        while True:
+            # 先取出当前的通知事件，避免查询和等待之间错过通知
+            event = self._notify_event
+            row = await asyncio.to_thread(self.get, item_id)
+            if row is None or row["status"] not in self.active_statuses:
+                return row
+            remaining = deadline - loop.time()
+            if remaining <= 0 or event is None:
+                return row
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _remember(self, item_id: str, msg: Any) -> None:
+        """保存消息对象，超出上限时丢弃最旧的"""
+        with self._lock:
+            self._messages[item_id] = msg
+            self._messages.move_to_end(item_id)
+            while len(self._messages) > self.max_held_messages:
+                self._messages.popitem(last=False)
+
+    def _forget(self, item_id: str) -> None:
+        """任务完成后释放消息对象"""
+        with self._lock:
+            self._messages.pop(item_id, None)
+
+    def _publish_update(self, row: Dict[str, Any], fields: Dict[str, Any]) -> None:
+        """把任务结果作为原消息的更新通知各回调
+
+        Args:
+            row: 任务记录
+            fields: 要更新到原消息上的字段
+        """
+        update = {"event": "update", "id": row["msg_id"], **fields}
+        result = {"chat_name": row["chat_name"], "msg": [update]}
+        for callback in list(self._listeners):
+            try:
+                callback(row["account"], result)
+            except Exception as e:
+                print(f"消息更新回调执行失败: {e}")
+
+    def _notify(self) -> None:
+        """通知等待中的请求（可在任意线程中调用）"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        """唤醒所有等待中的请求"""
+        event, self._notify_event = self._notify_event, asyncio.Event()
+        if event is not None:
+            event.set()
+
+    def _with_message(
+        self,
+        item_id: str,
+        row: Dict[str, Any],
+        action: Callable[[Any], Any],
+        missing_error: str
+    ) -> Any:
+        """在账号执行通道中切换到消息所在聊天，取回消息对象后执行操作
+
+        Args:
+            item_id: 任务ID
+            row: 任务记录
+            action: 对消息对象执行的操作
+            missing_error: 消息对象已失效时的错误信息
+
+        Returns:
+            操作的返回值
+
+        Raises:
+            RuntimeError: 消息对象已失效
+        """
+        wx = account_router.get_wechat(row["account"])
+        with window_manager.session(wx.core.HWND):
+            # 消息对象只在其所在聊天打开时有效
+            if row["chat_name"]:
+                active_chat.ensure(wx, row["account"], row["chat_name"], exact=True)
+            with self._lock:
+                msg = self._messages.get(item_id)
+            if msg is None and hasattr(wx, 'GetMessageById'):
+                msg = wx.GetMessageById(row["msg_id"])
+            if msg is None:
+                raise RuntimeError(missing_error)
+            return action(msg)
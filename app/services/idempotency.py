@@ -0,0 +1,176 @@
+"""
+幂等键
+发送类接口可携带 Idempotency-Key 请求头，操作结果按键保存到 SQLite（有过期时间和数量上限），
+同一个键的重试请求会等待正在执行的操作或直接返回已保存的结果，不会重复发送
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel
+from app.database.factory import DatabaseFactory
+from app.models.response import APIResponse
+from app.utils.config import settings
+
+STATUS_INFLIGHT = "inflight"
+STATUS_DONE = "done"
+
+
+class IdempotencyStore:
+    """幂等键存储"""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None) -> None:
+        """初始化幂等键存储
+
+        Args:
+            ttl: 结果保存时间(秒)
+            max_entries: 最多保存的键数量
+        """
+        self.db = DatabaseFactory.get_database()
+        self.ttl = settings.idempotency.ttl if ttl is None else ttl
+        self.max_entries = settings.idempotency.max_entries if max_entries is None else max_entries
+        # 正在执行的操作（仅当前进程）
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {
+            "executed": 0,
+            "replayed": 0,
+            "joined": 0,
+            "conflicts": 0,
+        }
+
+        # 创建幂等键表
+        self.db.create_table("idempotency_keys", {
+            "id": "TEXT PRIMARY KEY",
+            "fingerprint": "TEXT NOT NULL",
+            "status": "TEXT NOT NULL",
+            "response": "TEXT",
+            "created_at": "REAL NOT NULL",
+            "expires_at": "REAL NOT NULL"
+        })
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at)")
+
+    async def run(
+        self,
+        key: Optional[str],
+        scope: str,
+        request: BaseModel,
+        operation: Callable[[], Awaitable[APIResponse]]
+    ) -> APIResponse:
+        """按幂等键执行操作
+
+        Args:
+            key: Idempotency-Key 请求头，为空时直接执行
+            scope: 接口标识，不同接口的同名键互不影响
+            request: 请求体，用于校验重试请求与原请求一致
+            operation: 执行操作的函数
+
+        Returns:
+            APIResponse: 操作结果（重试时为首次执行的结果）
+
+        Raises:
+            HTTPException: 同一个键用于不同的请求，或上次执行结果未知
+        """
+        if not key:
+            return await operation()
+
+        record_id = f"{scope}:{key}"
+        fingerprint = hashlib.sha256(request.model_dump_json().encode('utf-8')).hexdigest()
+
+        task = self._inflight.get(record_id)
+        if task is not None:
+            self._count("joined")
+            return APIResponse(**(await asyncio.shield(task)))
+
+        record = await asyncio.to_thread(self.db.get_by_id, "idempotency_keys", record_id)
+        if record is not None and record["expires_at"] > time.time():
+            if record["fingerprint"] != fingerprint:
+                self._count("conflicts")
+                raise HTTPException(status_code=422, detail="Idempotency-Key 已用于其他请求")
+            if record["status"] == STATUS_DONE:
+                self._count("replayed")
+                return APIResponse(**json.loads(record["response"]))
+            # 上次执行出错或被中断（如服务重启）而未记录结果，无法确认是否已发送
+            self._count("conflicts")
+            raise HTTPException(status_code=409, detail="该 Idempotency-Key 的上次请求结果未知，请使用新的键重试")
+
+        # 事件循环中检查和登记之间没有 await，不会有两个请求同时执行
+        task = self._inflight.get(record_id)
+        if task is not None:
+            self._count("joined")
+            return APIResponse(**(await asyncio.shield(task)))
+        # 操作在独立的任务中执行，请求被取消（如客户端断开）时操作继续执行并保存结果
+        task = asyncio.ensure_future(self._execute(record_id, fingerprint, operation))
+        self._inflight[record_id] = task
+        task.add_done_callback(lambda done: self._finish(record_id, done))
+        return APIResponse(**(await asyncio.shield(task)))
+
+    def stats(self) -> Dict[str, Any]:
+        """获取幂等键统计"""
+        with self._lock:
+            data = dict(self._stats)
+        data["inflight"] = len(self._inflight)
+        return data
+
+    async def _execute(
+        self,
+        record_id: str,
+        fingerprint: str,
+        operation: Callable[[], Awaitable[APIResponse]]
+    ) -> Dict[str, Any]:
+        """登记幂等键、执行操作并保存结果"""
+        now = time.time()
+        await asyncio.to_thread(
+            self.db.execute,
+            "INSERT OR REPLACE INTO idempotency_keys (id, fingerprint, status, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [record_id, fingerprint, STATUS_INFLIGHT, now, now + self.ttl]
+        )
+        try:
+            response = await operation()
+        except HTTPException:
+            # 限速、参数校验等在操作开始前被拒绝，没有发送，允许使用同一个键重试
+            await asyncio.to_thread(self.db.delete, "idempotency_keys", record_id)
+            raise
+        # 其他异常（包括任务被取消）无法确认是否已发送，保留执行中状态，重试时返回409
+        self._count("executed")
+        data = response.model_dump()
+        await asyncio.to_thread(self._save, record_id, data)
+        return data
+
+    def _finish(self, record_id: str, task: asyncio.Future) -> None:
+        """操作任务结束后移除执行中的登记"""
+        if self._inflight.get(record_id) is task:
+            del self._inflight[record_id]
+        if not task.cancelled():
+            # 请求已取消、没有调用方等待时避免 "Task exception was never retrieved" 警告
+            task.exception()
+
+    def _save(self, record_id: str, data: Dict[str, Any]) -> None:
+        """保存操作结果，并定期清理过期和超出数量上限的键"""
+        self.db.update("idempotency_keys", record_id, {
+            "status": STATUS_DONE,
+            "response": json.dumps(data, ensure_ascii=False, default=str)
+        })
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % 100 == 0
+        if purge:
+            self.db.execute("DELETE FROM idempotency_keys WHERE expires_at<=?", [time.time()])
+            self.db.execute(
+                "DELETE FROM idempotency_keys WHERE id IN ("
+                "SELECT id FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                [self.max_entries]
+            )
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+
+idempotency_store = IdempotencyStore()
@@ -5,7 +5,6 @@ from app.utils.wx_package_manager import (
     has_feature, 
     is_wxautox
 )
-from pythoncom import CoInitialize
 
 
 # 动态导入wx包
@@ -19,9 +18,6 @@ except:
     def get_wx_clients():
         return [WeChat()]
 
-# 初始化COM
-CoInitialize()
-
 # 如果是wxautox版本，导入额外模块
 if is_wxautox():
     try:
@@ -29,12 +25,18 @@ if is_wxautox():
     except Exception as e:
         print(f"警告：无法导入WxResponse: {e}")
 
-# 获取微信客户端
-try:
-    WxClient = {}
-    for client in get_wx_clients():
-        WxClient[client.nickname] = client
-        client.StopListening()
-except Exception as e:
-    print(f"警告：无法获取微信客户端: {e}")
-    WxClient = {}
\ No newline at end of file
+# 微信客户端（在UI线程中初始化）
+WxClient = {}
+
+def load_wx_clients() -> None:
+    """获取微信客户端
+
+    需要在已初始化COM的UI线程中调用
+    """
+    try:
+        for client in get_wx_clients():
+            WxClient[client.nickname] = client
+            client.StopListening()
+    except Exception as e:
+        print(f"警告：无法获取微信客户端: {e}")
+        WxClient.clear()
\ No newline at end of file
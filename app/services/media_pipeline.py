@@ -0,0 +1,368 @@
+"""
+新消息媒体下载流水线
+新消息接口只登记图片、视频、文件并返回媒体ID（状态 pending），
+下载在账号执行通道中排队进行，上传入库在有界线程池中完成，文字消息不再被附件拖慢；
+lazy 策略的媒体先登记为 deferred，执行通道空闲一段时间后或被请求时才开始下载
+"""
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from app.services.file_service import FileService
+from app.utils.config import settings
+from .account_router import account_router
+from .held_message import HeldMessageService, message_key
+from .ui_executor import PRIORITY_NORMAL, PRIORITY_BULK
+
+# 下载策略
+POLICY_EAGER = "eager"          # 收到消息后立即下载
+POLICY_LAZY = "lazy"            # 执行通道空闲时（或被请求时）下载
+POLICY_ON_DEMAND = "on_demand"  # 仅在请求时下载
+
+# 下载状态
+STATUS_PENDING = "pending"
+STATUS_DOWNLOADING = "downloading"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_ON_DEMAND = "on_demand"
+STATUS_DEFERRED = "deferred"
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+
+
+def get_media_type(msg: Any) -> Optional[str]:
+    """获取消息的媒体类型
+
+    Args:
+        msg: 消息对象
+
+    Returns:
+        Optional[str]: image/video/file，非媒体消息返回None
+    """
+    if not hasattr(msg, 'download'):
+        return None
+    msg_class_name = msg.__class__.__name__
+    if 'Image' in msg_class_name:
+        return "image"
+    if 'Video' in msg_class_name:
+        return "video"
+    if 'File' in msg_class_name:
+        return "file"
+    return None
+
+
+def parse_size(value: Any) -> Optional[int]:
+    """解析微信显示的文件大小（如 "1.2M"、"356K"）
+
+    Args:
+        value: 文件大小
+
+    Returns:
+        Optional[int]: 字节数，无法解析返回None
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    match = re.match(r'^\s*([\d.]+)\s*([KMG]?B?)\s*$', value.upper())
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+    except ValueError:
+        return None
+
+
+class MediaPipeline(HeldMessageService):
+    """媒体下载流水线"""
+
+    table = "media_downloads"
+    active_statuses = (STATUS_PENDING, STATUS_DOWNLOADING)
+
+    def __init__(self) -> None:
+        """初始化流水线"""
+        super().__init__(settings.media.max_held_messages)
+        self.config = settings.media
+        self._pool = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="media-upload")
+        self._lazy_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "registered": 0,
+            "downloaded": 0,
+            "failed": 0,
+            "download_seconds": 0.0,
+        }
+
+        # 创建媒体下载表
+        self.db.create_table("media_downloads", {
+            "id": "TEXT PRIMARY KEY",
+            "account": "TEXT NOT NULL",
+            "chat_name": "TEXT",
+            "msg_id": "TEXT",
+            "media_type": "TEXT NOT NULL",
+            "policy": "TEXT NOT NULL",
+            "status": "TEXT NOT NULL",
+            "size": "INTEGER",
+            "file_id": "TEXT",
+            "file_info": "TEXT",
+            "error": "TEXT",
+            "created_at": "TIMESTAMP NOT NULL",
+            "staged_path": "TEXT",
+            "staged_dir": "TEXT",
+            "created_at": "TIMESTAMP NOT NULL",
+            "updated_at": "TIMESTAMP NOT NULL"
+        })
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """旧版媒体下载表升级：增加上传失败时保留的暂存文件字段"""
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(media_downloads)")}
+        for column in ("staged_path", "staged_dir"):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE media_downloads ADD COLUMN {column} TEXT")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环，启动空闲下载任务，上次未完成的下载改为按需下载（消息对象已失效）
+
+        Args:
+            loop: 等待下载结果的请求所在的事件循环
+        """
+        self.bind(loop)
+        self.db.execute(
+            "UPDATE media_downloads SET status=?, updated_at=? WHERE status IN (?, ?, ?)",
+            [STATUS_ON_DEMAND, datetime.now().isoformat(), STATUS_PENDING, STATUS_DOWNLOADING, STATUS_DEFERRED]
+        )
+        self._lazy_task = loop.create_task(self._run_lazy())
+
+    def stop(self) -> None:
+        """停止空闲下载任务和上传线程池"""
+        if self._lazy_task is not None:
+            self._lazy_task.cancel()
+            self._lazy_task = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def register(self, account: str, msg: Any, msg_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """登记一条媒体消息，按策略安排下载（在账号执行通道中调用）
+
+        Args:
+            account: 账号名称
+            msg: 消息对象
+            msg_info: 消息信息
+
+        Returns:
+            Optional[Dict[str, Any]]: 媒体信息 {id, type, status, policy}，非媒体消息返回None
+        """
+        media_type = get_media_type(msg)
+        if media_type is None:
+            return None
+
+        media_id, msg_id, chat_name = message_key(account, msg, msg_info)
+        size = parse_size(getattr(msg, 'filesize', None))
+        policy = self._get_policy(media_type, size)
+        status = {POLICY_ON_DEMAND: STATUS_ON_DEMAND, POLICY_LAZY: STATUS_DEFERRED}.get(policy, STATUS_PENDING)
+
+        existing = self.db.get_by_id("media_downloads", media_id)
+        if existing is None:
+            now = datetime.now().isoformat()
+            self.db.insert("media_downloads", {
+                "id": media_id,
+                "account": account,
+                "chat_name": chat_name,
+                "msg_id": msg_id,
+                "media_type": media_type,
+                "policy": policy,
+                "status": status,
+                "size": size,
+                "created_at": now,
+                "updated_at": now
+            })
+            with self._lock:
+                self._stats["registered"] += 1
+        else:
+            status = existing["status"]
+
+        self._remember(media_id, msg)
+        if existing is None and status == STATUS_PENDING:
+            account_router.submit(account, self._download, media_id, priority=PRIORITY_NORMAL, chat_key=chat_name)
+
+        return {"id": media_id, "type": media_type, "status": status, "policy": policy}
+
+    def request(self, media_id: str, retry: bool = True) -> Optional[Dict[str, Any]]:
+        """请求下载（按需下载、提前下载等待空闲的媒体或重试失败的下载）
+
+        上传入库失败时下载的文件保留在暂存目录中，重试时直接重新上传，不再重新下载
+
+        Args:
+            media_id: 媒体ID
+            retry: 是否重试失败的下载（否则只提前下载等待空闲的媒体）
+
+        Returns:
+            Optional[Dict[str, Any]]: 媒体状态，不存在返回None
+        """
+        row = self.db.get_by_id("media_downloads", media_id)
+        if row is None:
+            return None
+        statuses = (STATUS_ON_DEMAND, STATUS_DEFERRED, STATUS_FAILED) if retry else (STATUS_DEFERRED,)
+        if self._claim(media_id, statuses):
+            staged_path = row.get("staged_path")
+            if row["status"] == STATUS_FAILED and staged_path and os.path.exists(staged_path):
+                self._pool.submit(self._upload, media_id, row, staged_path, row["staged_dir"])
+            else:
+                if row.get("staged_dir"):
+                    # 暂存文件已丢失，清理后重新下载
+                    shutil.rmtree(row["staged_dir"], ignore_errors=True)
+                    self.db.update("media_downloads", media_id, {"staged_path": None, "staged_dir": None})
+                account_router.submit(
+                    row["account"], self._download, media_id, priority=PRIORITY_NORMAL, chat_key=row["chat_name"]
+                )
+        return self.get(media_id)
+
+    def get(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """获取媒体状态
+
+        Args:
+            media_id: 媒体ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 媒体状态，不存在返回None
+        """
+        row = super().get(media_id)
+        if row is None:
+            return None
+        if row.get("file_info"):
+            row["file_info"] = json.loads(row["file_info"])
+        # 暂存文件只在内部重试时使用
+        row.pop("staged_path", None)
+        row.pop("staged_dir", None)
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        """获取下载统计"""
+        rows = self.db.execute("SELECT status, COUNT(*) AS count FROM media_downloads GROUP BY status")
+        with self._lock:
+            data = dict(self._stats)
+            data["held_messages"] = len(self._messages)
+        data["download_seconds"] = round(data["download_seconds"], 3)
+        data["statuses"] = {row["status"]: row["count"] for row in rows}
+        return data
+
+    def _get_policy(self, media_type: str, size: Optional[int]) -> str:
+        """根据类型和大小确定下载策略"""
+        policy = self.config.policies.get(media_type)
+        if policy is None:
+            return POLICY_EAGER
+        if policy.max_size is not None and size is not None and size > policy.max_size:
+            return POLICY_ON_DEMAND
+        return policy.mode
+
+    async def _run_lazy(self) -> None:
+        """定期检查各账号执行通道，空闲足够久时下载该账号最早登记的一个等待空闲的媒体"""
+        while True:
+            await asyncio.sleep(self.config.lazy_check_interval)
+            try:
+                await asyncio.to_thread(self._schedule_lazy)
+            except Exception as e:
+                print(f"安排空闲下载失败: {e}")
+
+    def _schedule_lazy(self) -> None:
+        """每个空闲的账号提交一个等待空闲的媒体，下载期间通道不空闲，下一个等下载完成后再提交"""
+        # SQLite 中 MIN() 聚合时其他列取自最小值所在的行，即每个账号最早登记的一条
+        rows = self.db.execute(
+            "SELECT id, account, chat_name, MIN(created_at) AS created_at FROM media_downloads "
+            "WHERE status=? GROUP BY account",
+            [STATUS_DEFERRED]
+        )
+        for row in rows:
+            if account_router.idle_seconds(row["account"]) < self.config.lazy_idle_seconds:
+                continue
+            if self._claim(row["id"], (STATUS_DEFERRED,)):
+                account_router.submit(
+                    row["account"], self._download, row["id"], priority=PRIORITY_BULK, chat_key=row["chat_name"]
+                )
+
+    def _claim(self, media_id: str, statuses: Tuple[str, ...]) -> bool:
+        """把处于指定状态的媒体改为 pending，返回是否修改成功（并发请求时只有一个会提交下载）"""
+        placeholders = ", ".join("?" * len(statuses))
+        rows = self.db.execute(
+            f"UPDATE media_downloads SET status=?, error=NULL, updated_at=? "
+            f"WHERE id=? AND status IN ({placeholders}) RETURNING id",
+            [STATUS_PENDING, datetime.now().isoformat(), media_id, *statuses]
+        )
+        if rows:
+            self._notify()
+        return bool(rows)
+
+    def _set_status(self, media_id: str, status: str, **fields: Any) -> None:
+        """更新下载状态并通知等待中的请求"""
+        fields.update({"status": status, "updated_at": datetime.now().isoformat()})
+        self.db.update("media_downloads", media_id, fields)
+        self._notify()
+
+    def _download(self, media_id: str) -> None:
+        """在账号执行通道中下载媒体文件，上传入库交给线程池"""
+        row = self.db.get_by_id("media_downloads", media_id)
+        if row is None or row["status"] != STATUS_PENDING:
+            return
+        self._set_status(media_id, STATUS_DOWNLOADING)
+
+        # 下载到上传目录所在文件系统的暂存目录，入库时直接重命名，不再复制一遍
+        temp_dir = FileService().make_staging_dir()
+        start = time.perf_counter()
+        def download(msg: Any) -> Any:
+            if row["media_type"] == "file":
+                return msg.download(dir_path=temp_dir, force_click=False, timeout=self.config.download_timeout)
+            return msg.download(dir_path=temp_dir, timeout=self.config.download_timeout)
+
+        try:
+            file_path = self._with_message(media_id, row, download, "消息已失效，无法下载")
+        except Exception as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            self._fail(media_id, e)
+            return
+        finally:
+            with self._lock:
+                self._stats["download_seconds"] += time.perf_counter() - start
+
+        self._pool.submit(self._upload, media_id, row, str(file_path), temp_dir)
+
+    def _upload(self, media_id: str, row: Dict[str, Any], file_path: str, temp_dir: str) -> None:
+        """将下载的文件上传入库（在线程池中执行），上传成功后才删除暂存文件"""
+        try:
+            upload_result = FileService().upload_file_by_path(
+                file_path=file_path,
+                description=f"WeChat file from {row.get('chat_name') or 'unknown'}",
+                uploader="wechat_bot",
+                move=True
+            )
+        except Exception as e:
+            # 保留下载好的文件，重试时直接重新上传
+            self._fail(media_id, e, staged_path=file_path, staged_dir=temp_dir)
+            return
+
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        self._set_status(
+            media_id,
+            STATUS_DONE,
+            file_id=upload_result["file_id"],
+            file_info=json.dumps(upload_result, ensure_ascii=False),
+            error=None,
+            staged_path=None,
+            staged_dir=None
+        )
+        self._forget(media_id)
+        with self._lock:
+            self._stats["downloaded"] += 1
+
+    def _fail(self, media_id: str, error: Exception, **fields: Any) -> None:
+        """记录下载失败"""
+        self._set_status(media_id, STATUS_FAILED, error=str(error), **fields)
+        with self._lock:
+            self._stats["failed"] += 1
+
+
+media_pipeline = MediaPipeline()
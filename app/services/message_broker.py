@@ -0,0 +1,190 @@
+"""
+新消息广播
+将获取到的每条新消息推送给所有订阅者（SSE），
+每个订阅者有独立的有界缓冲区和过滤条件，慢消费者不会阻塞消息获取；
+每条消息按顺序编号（SSE 的事件ID），最近的消息保留在回放缓冲区中，
+断线重连时带上最后收到的编号即可补发断线期间的消息
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+from app.utils.config import settings
+
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+
+
+def flatten_messages(account: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """将一批新消息展开为单条消息，附带账号和聊天信息
+
+    Args:
+        account: 账号名称
+        result: 新消息，格式与 get_next_new_message 返回的 data 相同
+
+    Returns:
+        List[Dict[str, Any]]: 消息列表
+    """
+    items = []
+    for msg_info in (result or {}).get('msg') or []:
+        item = dict(msg_info)
+        item.setdefault('chat_name', result.get('chat_name'))
+        item.setdefault('chat_type', result.get('chat_type'))
+        item['account'] = account
+        items.append(item)
+    return items
+
+
+class Subscription:
+    """订阅者"""
+
+    def __init__(
+        self,
+        chat_names: Optional[Iterable[str]] = None,
+        msg_types: Optional[Iterable[str]] = None,
+        accounts: Optional[Iterable[str]] = None,
+        buffer_size: int = 100,
+        drop_policy: str = DROP_OLDEST
+    ) -> None:
+        """初始化订阅者
+
+        Args:
+            chat_names: 只接收这些聊天的消息，为空表示不限
+            msg_types: 只接收这些类型的消息，为空表示不限
+            accounts: 只接收这些账号的消息，为空表示不限
+            buffer_size: 缓冲区大小
+            drop_policy: 缓冲区满时的丢弃策略（oldest/newest）
+        """
+        self.chat_names: Set[str] = set(chat_names or ())
+        self.msg_types: Set[str] = set(msg_types or ())
+        self.accounts: Set[str] = set(accounts or ())
+        self.drop_policy = drop_policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def matches(self, item: Dict[str, Any]) -> bool:
+        """消息是否符合过滤条件"""
+        if self.accounts and item.get('account') not in self.accounts:
+            return False
+        if self.chat_names and item.get('chat_name') not in self.chat_names:
+            return False
+        if self.msg_types and item.get('type') not in self.msg_types:
+            return False
+        return True
+
+    def offer(self, item: Dict[str, Any]) -> None:
+        """放入一条消息，缓冲区满时按策略丢弃（需在事件循环线程中调用）"""
+        if self.queue.full():
+            self.dropped += 1
+            if self.drop_policy == DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(item)
+
+
+class MessageBroker:
+    """新消息广播器"""
+
+    def __init__(self) -> None:
+        """初始化广播器"""
+        self._subscribers: List[Subscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._published = 0
+        self._replayed = 0
+        # 消息编号，以及最近消息的回放缓冲区
+        self._seq = 0
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=settings.stream.replay_size)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环
+
+        Args:
+            loop: 订阅者所在的事件循环
+        """
+        self._loop = loop
+
+    def subscribe(
+        self,
+        chat_names: Optional[Iterable[str]] = None,
+        msg_types: Optional[Iterable[str]] = None,
+        accounts: Optional[Iterable[str]] = None,
+        last_event_id: Optional[int] = None
+    ) -> Subscription:
+        """添加订阅者（需在事件循环线程中调用）
+
+        Args:
+            chat_names: 聊天名称过滤
+            msg_types: 消息类型过滤
+            accounts: 账号过滤
+            last_event_id: 断线前最后收到的消息编号，回放缓冲区中之后的消息会先放入缓冲区
+
+        Returns:
+            Subscription: 订阅者
+        """
+        subscription = Subscription(
+            chat_names=chat_names,
+            msg_types=msg_types,
+            accounts=accounts,
+            buffer_size=settings.stream.buffer_size,
+            drop_policy=settings.stream.drop_policy
+        )
+        with self._lock:
+            self._subscribers.append(subscription)
+            history = list(self._history) if last_event_id is not None else []
+        replayed = 0
+        for item in history:
+            if item['seq'] > last_event_id and subscription.matches(item):
+                subscription.offer(item)
+                replayed += 1
+        if replayed:
+            with self._lock:
+                self._replayed += replayed
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """移除订阅者"""
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, account: str, result: Dict[str, Any]) -> None:
+        """广播一批新消息（可在任意线程中调用）
+
+        Args:
+            account: 账号名称
+            result: 新消息，格式与 get_next_new_message 返回的 data 相同
+        """
+        if self._loop is None:
+            return
+        items = flatten_messages(account, result)
+        if items:
+            self._loop.call_soon_threadsafe(self._dispatch, items)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取广播统计"""
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self._published,
+                "replayed": self._replayed,
+                "dropped": sum(i.dropped for i in self._subscribers),
+            }
+
+    def _dispatch(self, items: List[Dict[str, Any]]) -> None:
+        """在事件循环线程中为消息编号并分发"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._published += len(items)
+            for item in items:
+                self._seq += 1
+                item['seq'] = self._seq
+                self._history.append(item)
+        for item in items:
+            for subscription in subscribers:
+                if subscription.matches(item):
+                    subscription.offer(item)
+
+
+message_broker = MessageBroker()
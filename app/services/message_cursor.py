@@ -0,0 +1,87 @@
+"""
+消息游标
+getallmessage 返回最后一条消息的ID作为游标，传入上次返回的游标时只返回之后的新消息，
+避免轮询时重复序列化已加载的全部消息。游标只依赖调用方传入的值，不在服务端保存状态，
+多个调用方互不影响
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def get_message_key(msg: Any) -> str:
+    """获取消息标识（启用消息哈希时优先使用哈希值）
+
+    Args:
+        msg: 消息对象
+
+    Returns:
+        str: 消息标识
+    """
+    return str(getattr(msg, 'hash', None) or getattr(msg, 'id', ''))
+
+
+class MessageCursors:
+    """消息游标"""
+
+    def __init__(self) -> None:
+        """初始化游标统计"""
+        self._lock = threading.Lock()
+        self._stats = {
+            "full": 0,
+            "delta": 0,
+            "resets": 0,
+            "returned": 0,
+            "skipped": 0,
+        }
+
+    def slice(
+        self,
+        account: str,
+        chat_name: str,
+        msgs: List[Any],
+        since: Optional[str] = None
+    ) -> Tuple[List[Any], Optional[str], bool]:
+        """根据游标截取新消息
+
+        Args:
+            account: 账号名称
+            chat_name: 聊天名称
+            msgs: 当前加载的全部消息对象（按时间顺序）
+            since: 上次返回的游标，为空时返回全部消息
+
+        Returns:
+            Tuple[List[Any], Optional[str], bool]: (新消息, 新游标, 游标是否失效而返回了全部消息)
+        """
+        keys = [get_message_key(msg) for msg in msgs]
+        reset = False
+        if not since:
+            start = 0
+        elif since in keys:
+            # 游标仍在已加载的消息中，直接返回它之后的消息
+            start = len(keys) - keys[::-1].index(since)
+        else:
+            # 游标已不在当前加载的消息中（如窗口重新加载），返回全部消息，由调用方按消息ID去重
+            start = 0
+            reset = True
+
+        delta = msgs[start:]
+        with self._lock:
+            self._stats["delta" if since else "full"] += 1
+            self._stats["resets"] += int(reset)
+            self._stats["returned"] += len(delta)
+            self._stats["skipped"] += len(msgs) - len(delta)
+
+        cursor = keys[-1] if keys else since
+        return delta, cursor, reset
+
+    def stats(self) -> Dict[str, Any]:
+        """获取游标统计"""
+        with self._lock:
+            data = dict(self._stats)
+        total = data["returned"] + data["skipped"]
+        data["skip_rate"] = round(data["skipped"] / total, 4) if total else 0.0
+        return data
+
+
+message_cursors = MessageCursors()
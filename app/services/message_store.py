@@ -0,0 +1,300 @@
+"""
+消息存储
+将读取到的每条消息写入 SQLite 消息表（按账号、聊天、时间、消息ID建索引，内容建 FTS5 全文索引），
+历史查询直接走数据库，无需再操作微信界面。写入由后台线程批量完成，不拖慢读取消息的接口；
+event 为 "update" 的消息（如语音转文字结果）合并到已保存的原消息上
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from app.database.factory import DatabaseFactory
+from app.utils.config import settings
+from .message_broker import flatten_messages
+
+_STOP = object()
+# 原消息尚未写入时，更新保留重试的时间(秒)
+UPDATE_RETRY_SECONDS = 60
+
+
+class MessageStore:
+    """消息存储"""
+
+    def __init__(self) -> None:
+        """初始化消息存储"""
+        self.db = DatabaseFactory.get_database()
+        self.config = settings.message_store
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.config.queue_size)
+        self._thread: Optional[threading.Thread] = None
+        # 原消息尚未写入的更新：(过期时间, 更新)，只在写入线程中访问
+        self._pending_updates: List[Tuple[float, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "updated": 0,
+            "updates_expired": 0,
+            "duplicates": 0,
+            "dropped": 0,
+            "batches": 0,
+        }
+
+        # 创建消息表
+        self.db.create_table("messages", {
+            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "account": "TEXT NOT NULL",
+            "chat_name": "TEXT NOT NULL",
+            "chat_type": "TEXT",
+            "msg_id": "TEXT NOT NULL",
+            "msg_type": "TEXT",
+            "attr": "TEXT",
+            "sender": "TEXT",
+            "content": "TEXT",
+            "received_at": "REAL NOT NULL",
+            "raw": "TEXT"
+        })
+        for sql in (
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_unique ON messages (account, chat_name, msg_id)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (account, chat_name, id)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_time ON messages (received_at)",
+            "CREATE INDEX IF NOT EXISTS idx_messages_msg_id ON messages (msg_id)",
+        ):
+            self.db.execute(sql)
+        self.fts = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        """创建内容全文索引，SQLite 不支持 FTS5 时退化为 LIKE 查询"""
+        try:
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                "content, content='messages', content_rowid='id', tokenize='trigram')"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+                "INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content); END"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+                "INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+            )
+            return True
+        except Exception as e:
+            print(f"消息全文索引不可用，将使用 LIKE 查询: {e}")
+            return False
+
+    def start(self) -> None:
+        """启动写入线程"""
+        if not self.config.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name="message-store-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止写入线程，已入队的消息写完后退出
+
+        Args:
+            timeout: 等待线程退出的超时时间(秒)
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def add(self, account: str, result: Dict[str, Any]) -> None:
+        """将一批消息加入写入队列（可在任意线程中调用，不阻塞）
+
+        Args:
+            account: 账号名称
+            result: 消息，格式为 {chat_name, chat_type, msg: [...]}，event 为 "update" 的消息更新已保存的原消息
+        """
+        if not self.config.enabled:
+            return
+        now = time.time()
+        for item in flatten_messages(account, result):
+            try:
+                self._queue.put_nowait((now, item))
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped"] += 1
+            else:
+                with self._lock:
+                    self._stats["queued"] += 1
+
+    def query(
+        self,
+        account: Optional[str] = None,
+        chat_name: Optional[str] = None,
+        sender: Optional[str] = None,
+        msg_type: Optional[str] = None,
+        keyword: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """查询历史消息（按ID倒序，键集分页）
+
+        Args:
+            account: 账号名称
+            chat_name: 聊天名称
+            sender: 发送者
+            msg_type: 消息类型
+            keyword: 内容关键词（全文检索）
+            since: 起始时间
+            until: 结束时间
+            before_id: 只返回ID小于该值的消息（上一页返回的 next_cursor）
+            limit: 返回数量
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[int]]: (消息列表, 下一页游标)
+        """
+        conditions = []
+        params: List[Any] = []
+        for column, value in (
+            ("account", account),
+            ("chat_name", chat_name),
+            ("sender", sender),
+            ("msg_type", msg_type),
+        ):
+            if value:
+                conditions.append(f"m.{column}=?")
+                params.append(value)
+        if since is not None:
+            conditions.append("m.received_at>=?")
+            params.append(since.timestamp())
+        if until is not None:
+            conditions.append("m.received_at<?")
+            params.append(until.timestamp())
+        if before_id is not None:
+            conditions.append("m.id<?")
+            params.append(before_id)
+
+        sql = "SELECT m.* FROM messages m"
+        if keyword:
+            # trigram 分词要求关键词至少 3 个字符，更短的关键词使用 LIKE
+            if self.fts and len(keyword) >= 3:
+                sql += " JOIN messages_fts f ON f.rowid = m.id"
+                conditions.append("messages_fts MATCH ?")
+                params.append('"' + keyword.replace('"', '""') + '"')
+            else:
+                conditions.append("m.content LIKE ?")
+                params.append(f"%{keyword}%")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY m.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self.db.execute(sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+        for row in rows:
+            row["received_at"] = datetime.fromtimestamp(row["received_at"]).isoformat()
+            row["raw"] = json.loads(row["raw"]) if row["raw"] else None
+        return rows, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        with self._lock:
+            data = dict(self._stats)
+        data["pending"] = self._queue.qsize()
+        data["fts"] = self.fts
+        data["running"] = self._thread is not None and self._thread.is_alive()
+        return data
+
+    def _run(self) -> None:
+        """写入线程主循环：攒够一批或到达刷新间隔后一次性写入"""
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.config.flush_interval
+            while len(batch) < self.config.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch or self._pending_updates:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"写入消息失败: {e}")
+
+    def _write(self, batch: List[Tuple[float, Dict[str, Any]]]) -> None:
+        """在一个事务中写入一批消息，重复消息忽略；之后应用消息更新"""
+        updates = [item for _, item in batch if item.get('event') == 'update']
+        batch = [(received_at, item) for received_at, item in batch if item.get('event') != 'update']
+        if batch:
+            self._insert(batch)
+        self._update(updates)
+
+    def _insert(self, batch: List[Tuple[float, Dict[str, Any]]]) -> None:
+        """在一个事务中写入一批消息，重复消息忽略"""
+        rows = [
+            (
+                item.get('account'),
+                item.get('chat_name') or '',
+                str(item.get('hash') or item.get('id') or ''),
+                item.get('chat_type'),
+                item.get('type'),
+                item.get('attr'),
+                item.get('sender'),
+                item.get('content'),
+                received_at,
+                json.dumps(item, ensure_ascii=False, default=str)
+            )
+            for received_at, item in batch
+        ]
+        written = self.db.executemany(
+            "INSERT OR IGNORE INTO messages "
+            "(account, chat_name, msg_id, chat_type, msg_type, attr, sender, content, received_at, raw) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["duplicates"] += len(rows) - written
+            self._stats["batches"] += 1
+
+    def _update(self, updates: List[Dict[str, Any]]) -> None:
+        """把更新合并到原消息的 raw 字段，原消息还未写入的更新留到之后的批次重试"""
+        now = time.monotonic()
+        pending = self._pending_updates + [(now + UPDATE_RETRY_SECONDS, item) for item in updates]
+        self._pending_updates = []
+        updated = expired = 0
+        for deadline, item in pending:
+            fields = {
+                key: value for key, value in item.items()
+                if key not in ('event', 'id', 'account', 'chat_name', 'chat_type')
+            }
+            rows = self.db.execute(
+                "UPDATE messages SET raw=json_patch(COALESCE(raw, '{}'), ?) "
+                "WHERE account=? AND msg_id=? AND (? IS NULL OR chat_name=?) RETURNING id",
+                [
+                    json.dumps(fields, ensure_ascii=False, default=str),
+                    item.get('account'),
+                    str(item.get('id') or ''),
+                    item.get('chat_name'),
+                    item.get('chat_name')
+                ]
+            )
+            if rows:
+                updated += 1
+            elif deadline > now:
+                self._pending_updates.append((deadline, item))
+            else:
+                expired += 1
+        with self._lock:
+            self._stats["updated"] += updated
+            self._stats["updates_expired"] += expired
+
+
+message_store = MessageStore()
@@ -0,0 +1,314 @@
+"""
+新消息监听器
+后台线程持有一个微信新消息事件句柄并阻塞等待，事件触发后在账号执行通道中
+获取新消息，处理后放入内存队列，接口只需从队列中取出（支持长轮询）；
+事件重复触发或窗口重新加载时微信可能再次返回最近的消息，按消息ID去重后再放入队列
+"""
+
+import asyncio
+import ctypes
+import threading
+import time
+from collections import OrderedDict, deque
+from ctypes import wintypes
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from app.models.response import APIResponse
+from app.utils.config import settings
+from .account_router import account_router, DEFAULT_ACCOUNT
+from .init import WxClient
+from .ui_executor import PRIORITY_NORMAL
+from .wechat_service import WeChatService
+
+# 初始化
+kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+
+# 函数声明
+kernel32.OpenEventW.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.LPCWSTR]
+kernel32.OpenEventW.restype = wintypes.HANDLE
+kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+kernel32.WaitForSingleObject.restype = wintypes.DWORD
+kernel32.ResetEvent.argtypes = [wintypes.HANDLE]
+kernel32.ResetEvent.restype = wintypes.BOOL
+kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+kernel32.CloseHandle.restype = wintypes.BOOL
+
+# 常量
+EVENT_ALL_ACCESS = 0x1F0003
+WAIT_OBJECT_0 = 0
+WECHAT_MESSAGE_EVENT = "Global\\TrayMonitor_RecvMessageEvent"
+
+
+class EventSource:
+    """新消息事件源（可替换为测试用的假事件源）"""
+
+    def wait(self, timeout: float) -> bool:
+        """等待新消息事件
+
+        Args:
+            timeout: 超时时间(秒)
+
+        Returns:
+            bool: 超时前事件是否被触发
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """释放事件源"""
+        pass
+
+
+class WindowsEventSource(EventSource):
+    """基于微信托盘新消息 Event 的事件源"""
+
+    def __init__(self, event_name: str = WECHAT_MESSAGE_EVENT) -> None:
+        self.event_name = event_name
+        self._handle = None
+
+    def wait(self, timeout: float) -> bool:
+        if not self._handle:
+            self._handle = kernel32.OpenEventW(EVENT_ALL_ACCESS, False, self.event_name)
+            if not self._handle:
+                # 微信未启动时事件不存在，稍后重试
+                time.sleep(timeout)
+                return False
+
+        result = kernel32.WaitForSingleObject(self._handle, int(timeout * 1000))
+        if result == WAIT_OBJECT_0:
+            kernel32.ResetEvent(self._handle)
+            return True
+        return False
+
+    def close(self) -> None:
+        if self._handle:
+            kernel32.CloseHandle(self._handle)
+            self._handle = None
+
+
+def fetch_next_new_message(wxname: str, filter_mute: bool = False) -> Dict[str, Any]:
+    """在执行通道中获取一个未读聊天的新消息
+
+    Args:
+        wxname: 微信客户端名称
+        filter_mute: 是否过滤免打扰消息
+
+    Returns:
+        Dict[str, Any]: 新消息，没有新消息时为空字典
+    """
+    response: APIResponse = WeChatService().get_next_new_message(filter_mute=filter_mute, wxname=wxname)
+    if not response.success:
+        print(f"获取新消息失败 [{wxname}]: {response.message}")
+        return {}
+    return response.data or {}
+
+
+class MessageWatcher:
+    """新消息监听器"""
+
+    def __init__(
+        self,
+        source_factory: Callable[[], EventSource] = WindowsEventSource,
+        fetch: Callable[..., Dict[str, Any]] = fetch_next_new_message,
+        wait_timeout: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        max_rounds: int = 10,
+        dedup_size: Optional[int] = None
+    ) -> None:
+        """初始化监听器
+
+        Args:
+            source_factory: 事件源工厂
+            fetch: 获取新消息的函数，参数为 (wxname, filter_mute)
+            wait_timeout: 单次等待事件的超时时间(秒)
+            queue_size: 每个账号队列的最大长度，超出时丢弃最旧的消息
+            max_rounds: 每次事件触发后每个账号最多连续获取的次数
+            dedup_size: 每个账号记住的最近消息ID数量，用于去重
+        """
+        self.source_factory = source_factory
+        self.fetch = fetch
+        self.wait_timeout = settings.watcher.wait_timeout if wait_timeout is None else wait_timeout
+        self.queue_size = settings.watcher.queue_size if queue_size is None else queue_size
+        self.max_rounds = max_rounds
+        self.dedup_size = settings.watcher.dedup_size if dedup_size is None else dedup_size
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {}
+        # 账号 -> 最近取到的消息 (聊天名称, 消息ID)
+        self._seen: Dict[str, "OrderedDict[Tuple[Any, str], None]"] = {}
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._notify_event: Optional[asyncio.Event] = None
+        self._stats = {
+            "events": 0,
+            "fetched": 0,
+            "dropped": 0,
+            "duplicates": 0,
+            "errors": 0,
+        }
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """启动监听线程
+
+        Args:
+            loop: 接口所在的事件循环，用于唤醒长轮询请求
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = loop
+        self._notify_event = asyncio.Event()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="wechat-msg-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止监听线程
+
+        Args:
+            timeout: 等待线程退出的超时时间(秒)
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """注册新消息回调，每获取到一批新消息调用一次
+
+        Args:
+            callback: 回调函数，参数为 (账号名称, 新消息)
+        """
+        self._listeners.append(callback)
+
+    def put(self, account: str, result: Dict[str, Any]) -> None:
+        """放入一批新消息并通知等待中的请求（已取到过的消息会被去掉，全部重复时不放入）
+
+        Args:
+            account: 账号名称
+            result: 新消息
+        """
+        result = self._dedupe(account, result)
+        if result is None:
+            return
+        with self._lock:
+            queue = self._queues.setdefault(account, deque())
+            if len(queue) >= self.queue_size:
+                queue.popleft()
+                self._stats["dropped"] += 1
+            queue.append(result)
+            self._stats["fetched"] += 1
+        for callback in list(self._listeners):
+            try:
+                callback(account, result)
+            except Exception as e:
+                print(f"新消息回调执行失败: {e}")
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    async def get(self, wxname: Optional[str] = None, wait_seconds: float = 0) -> Dict[str, Any]:
+        """取出一批新消息，队列为空时最多等待 wait_seconds 秒
+
+        Args:
+            wxname: 微信客户端名称，为空时取任意账号的消息
+            wait_seconds: 长轮询等待时间(秒)
+
+        Returns:
+            Dict[str, Any]: 新消息，没有新消息时为空字典
+        """
+        account = account_router.resolve_name(wxname) if wxname else None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(wait_seconds, 0)
+        while True:
+            result = self._pop(account)
+            if result is not None:
+                return result
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._notify_event is None:
+                return {}
+            try:
+                await asyncio.wait_for(self._notify_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """获取监听统计"""
+        with self._lock:
+            data = dict(self._stats)
+            data["queued"] = {account: len(queue) for account, queue in self._queues.items()}
+        data["running"] = self._thread is not None and self._thread.is_alive()
+        return data
+
+    def _dedupe(self, account: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """去掉最近已取到过的消息（按 hash，未启用时按 id），全部重复时返回None"""
+        msgs = result.get('msg') or []
+        kept = []
+        with self._lock:
+            seen = self._seen.setdefault(account, OrderedDict())
+            for msg_info in msgs:
+                msg_id = msg_info.get('hash') or msg_info.get('id')
+                if msg_id:
+                    key = (msg_info.get('chat_name') or result.get('chat_name'), str(msg_id))
+                    if key in seen:
+                        seen.move_to_end(key)
+                        self._stats["duplicates"] += 1
+                        continue
+                    seen[key] = None
+                    while len(seen) > self.dedup_size:
+                        seen.popitem(last=False)
+                kept.append(msg_info)
+        if not kept:
+            return None
+        if len(kept) == len(msgs):
+            return result
+        return {**result, 'msg': kept}
+
+    def _pop(self, account: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if account is not None:
+                queue = self._queues.get(account)
+                return queue.popleft() if queue else None
+            for queue in self._queues.values():
+                if queue:
+                    return queue.popleft()
+            return None
+
+    def _wake(self) -> None:
+        """唤醒所有等待中的请求"""
+        event, self._notify_event = self._notify_event, asyncio.Event()
+        event.set()
+
+    def _run(self) -> None:
+        """监听线程主循环"""
+        source = self.source_factory()
+        try:
+            while not self._stop.is_set():
+                try:
+                    if source.wait(self.wait_timeout):
+                        with self._lock:
+                            self._stats["events"] += 1
+                        self._drain()
+                except Exception as e:
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    print(f"新消息监听异常: {e}")
+                    time.sleep(self.wait_timeout)
+        finally:
+            source.close()
+
+    def _drain(self) -> None:
+        """事件触发后，在各账号执行通道中取完所有未读消息"""
+        for account in list(WxClient.keys()) or [DEFAULT_ACCOUNT]:
+            for _ in range(self.max_rounds):
+                future = account_router.submit(
+                    account,
+                    self.fetch,
+                    account,
+                    settings.watcher.filter_mute,
+                    priority=PRIORITY_NORMAL
+                )
+                result = future.result()
+                if not result or not result.get('msg'):
+                    break
+                self.put(account, result)
+
+
+message_watcher = MessageWatcher()
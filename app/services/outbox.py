@@ -0,0 +1,327 @@
+"""
+发送任务队列（Outbox）
+发送任务先写入 SQLite，接口立即返回任务ID，由后台工作任务调用 WeChatService 逐个执行。
+服务重启后未完成的任务继续执行，停止时在限定时间内等待正在执行的任务完成
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from app.database.factory import DatabaseFactory
+from app.models.response import APIResponse
+from app.utils.config import settings
+from .account_router import account_router
+from .rate_limiter import rate_limiter
+from .ui_executor import PRIORITY_BULK
+from .wechat_service import WeChatService
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+# 任务类型
+JOB_TEXT = "text"
+JOB_FILE = "file"
+
+
+class CancelError(Exception):
+    """任务无法取消"""
+
+
+class Outbox:
+    """发送任务队列"""
+
+    def __init__(self) -> None:
+        """初始化发送任务队列"""
+        self.db = DatabaseFactory.get_database()
+        self.config = settings.outbox
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        # 有任务在执行的账号，同一账号的任务按提交顺序逐个执行
+        self._busy_accounts: Set[str] = set()
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "cancelled": 0,
+        }
+
+        # 创建发送任务表
+        self.db.create_table("outbox_jobs", {
+            "id": "TEXT PRIMARY KEY",
+            "account": "TEXT NOT NULL",
+            "kind": "TEXT NOT NULL",
+            "payload": "TEXT NOT NULL",
+            "status": "TEXT NOT NULL",
+            "attempts": "INTEGER DEFAULT 0",
+            "next_run_at": "REAL NOT NULL",
+            "result": "TEXT",
+            "error": "TEXT",
+            "created_at": "TIMESTAMP NOT NULL",
+            "updated_at": "TIMESTAMP NOT NULL"
+        })
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_jobs_due ON outbox_jobs (status, account, next_run_at)"
+        )
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """启动调度任务，上次中断的任务重新排队
+
+        Args:
+            loop: 工作任务所在的事件循环
+        """
+        if self._dispatcher is not None:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        resumed = self.db.execute(
+            "UPDATE outbox_jobs SET status=?, updated_at=? WHERE status=? RETURNING id",
+            [STATUS_QUEUED, datetime.now().isoformat(), STATUS_RUNNING]
+        )
+        if resumed:
+            print(f"恢复 {len(resumed)} 个未完成的发送任务")
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """停止调度，在限定时间内等待正在执行的任务完成（未完成的任务下次启动时继续）
+
+        Args:
+            timeout: 最长等待时间(秒)
+        """
+        self._stopping = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        if self._running:
+            timeout = self.config.drain_timeout if timeout is None else timeout
+            _, pending = await asyncio.wait(set(self._running), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"{len(pending)} 个发送任务未在 {timeout} 秒内完成，将在下次启动时继续")
+
+    def submit(self, kind: str, payload: Dict[str, Any], wxname: Optional[str] = None) -> Dict[str, Any]:
+        """提交发送任务
+
+        Args:
+            kind: 任务类型（text/file）
+            payload: 任务参数
+            wxname: 微信客户端名称
+
+        Returns:
+            Dict[str, Any]: 任务信息
+        """
+        now = datetime.now().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "account": account_router.resolve_name(wxname),
+            "kind": kind,
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "status": STATUS_QUEUED,
+            "attempts": 0,
+            "next_run_at": time.time(),
+            "created_at": now,
+            "updated_at": now
+        }
+        self.db.insert("outbox_jobs", job)
+        with self._lock:
+            self._stats["submitted"] += 1
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return self._format(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务信息，不存在返回None
+        """
+        job = self.db.get_by_id("outbox_jobs", job_id)
+        return self._format(job) if job else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消排队中的任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务信息，不存在返回None
+
+        Raises:
+            CancelError: 任务已开始执行或已结束
+        """
+        rows = self.db.execute(
+            "UPDATE outbox_jobs SET status=?, updated_at=? WHERE id=? AND status=? RETURNING id",
+            [STATUS_CANCELLED, datetime.now().isoformat(), job_id, STATUS_QUEUED]
+        )
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not rows:
+            raise CancelError(f"任务状态为 {job['status']}，无法取消")
+        with self._lock:
+            self._stats["cancelled"] += 1
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """获取任务统计"""
+        rows = self.db.execute("SELECT status, COUNT(*) AS count FROM outbox_jobs GROUP BY status")
+        with self._lock:
+            data = dict(self._stats)
+        data["statuses"] = {row["status"]: row["count"] for row in rows}
+        data["running"] = len(self._running)
+        return data
+
+    def _format(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """转换为接口返回的任务信息"""
+        return {
+            "id": job["id"],
+            "account": job["account"],
+            "type": job["kind"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "payload": json.loads(job["payload"]),
+            "result": json.loads(job["result"]) if job.get("result") else None,
+            "error": job.get("error"),
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+
+    def _claim(self, exclude: List[str], limit: int) -> List[Dict[str, Any]]:
+        """领取到期的任务，每个空闲账号最早的一个"""
+        placeholders = ",".join("?" for _ in exclude)
+        exclude_sql = f"AND account NOT IN ({placeholders})" if exclude else ""
+        return self.db.execute(
+            "UPDATE outbox_jobs SET status=?, attempts=attempts+1, updated_at=? WHERE id IN ("
+            "SELECT id FROM outbox_jobs AS j WHERE status=? AND next_run_at<=? " + exclude_sql + " "
+            "AND id = (SELECT id FROM outbox_jobs WHERE account=j.account AND status=? "
+            "ORDER BY created_at, rowid LIMIT 1) LIMIT ?) RETURNING *",
+            [STATUS_RUNNING, datetime.now().isoformat(), STATUS_QUEUED, time.time(), *exclude, STATUS_QUEUED, limit]
+        )
+
+    def _next_due(self) -> Optional[float]:
+        """最早的待执行任务的时间"""
+        rows = self.db.execute(
+            "SELECT MIN(next_run_at) AS due FROM outbox_jobs WHERE status=?", [STATUS_QUEUED]
+        )
+        return rows[0]["due"] if rows else None
+
+    async def _dispatch(self) -> None:
+        """调度主循环：为空闲账号领取任务并执行"""
+        while not self._stopping:
+            # 先清除唤醒标记再查询，查询期间提交的任务会让下面的等待立即返回
+            self._wakeup.clear()
+            free = self.config.workers - len(self._running)
+            jobs = []
+            if free > 0:
+                jobs = await asyncio.to_thread(self._claim, sorted(self._busy_accounts), free)
+            for job in jobs:
+                self._busy_accounts.add(job["account"])
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._on_done)
+            if jobs:
+                continue
+
+            due = await asyncio.to_thread(self._next_due)
+            timeout = self.config.poll_interval
+            if due is not None:
+                timeout = min(max(due - time.time(), 0.05), timeout)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        """执行一个任务"""
+        try:
+            payload = json.loads(job["payload"])
+            try:
+                response = await rate_limiter.run(
+                    job["account"],
+                    payload.get("who"),
+                    lambda: self._run_job(job["account"], job["kind"], payload)
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                response = APIResponse(success=False, message=str(getattr(e, "detail", e)))
+            await asyncio.to_thread(self._finish, job, response)
+        finally:
+            self._busy_accounts.discard(job["account"])
+
+    def _run_job(self, account: str, kind: str, payload: Dict[str, Any]):
+        """在账号执行通道中调用 WeChatService"""
+        service = WeChatService()
+        if kind == JOB_FILE:
+            return account_router.run(
+                account,
+                service.send_file,
+                file_id=payload["file_id"],
+                who=payload.get("who"),
+                exact=payload.get("exact", False),
+                wxname=account,
+                priority=PRIORITY_BULK,
+                chat_key=payload.get("who")
+            )
+        return account_router.run(
+            account,
+            service.send_message,
+            msg=payload["msg"],
+            who=payload.get("who"),
+            clear=payload.get("clear", True),
+            at=payload.get("at"),
+            exact=payload.get("exact", False),
+            wxname=account,
+            priority=PRIORITY_BULK,
+            chat_key=payload.get("who")
+        )
+
+    def _finish(self, job: Dict[str, Any], response: APIResponse) -> None:
+        """记录任务结果，失败且未达最大次数时按退避时间重新排队"""
+        now = datetime.now().isoformat()
+        result = json.dumps(response.model_dump(), ensure_ascii=False, default=str)
+        if response.success:
+            status, stat = STATUS_SUCCEEDED, "succeeded"
+            next_run_at = job["next_run_at"]
+        elif job["attempts"] < self.config.max_attempts:
+            status, stat = STATUS_QUEUED, "retried"
+            next_run_at = time.time() + self.config.retry_delay * (2 ** (job["attempts"] - 1))
+        else:
+            status, stat = STATUS_FAILED, "failed"
+            next_run_at = job["next_run_at"]
+        self.db.update("outbox_jobs", job["id"], {
+            "status": status,
+            "result": result,
+            "error": None if response.success else response.message,
+            "next_run_at": next_run_at,
+            "updated_at": now
+        })
+        with self._lock:
+            self._stats[stat] += 1
+
+
+outbox = Outbox()
@@ -0,0 +1,244 @@
+"""
+发送限速
+按全局、账号、接收者三级令牌桶控制发送频率，超出速率的发送不会被拒绝，
+而是预约后续令牌并排队等待，响应中返回实际等待的时间
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from fastapi import HTTPException
+from app.models.response import APIResponse
+from app.utils.config import settings, RateLimitConfig
+from .account_router import account_router
+
+
+class TokenBucket:
+    """令牌桶（允许预约未来的令牌，令牌数可以为负）"""
+
+    def __init__(self, per_minute: float, burst: int) -> None:
+        """初始化令牌桶
+
+        Args:
+            per_minute: 每分钟生成的令牌数
+            burst: 桶容量
+        """
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """按时间补充令牌"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """取一个令牌需要等待的时间(秒)"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    @property
+    def idle(self) -> bool:
+        """令牌桶是否已满（可以丢弃）"""
+        return self.tokens >= self.burst
+
+
+class RateLimiter:
+    """发送限速器"""
+
+    def __init__(self, config: Optional[RateLimitConfig] = None, max_buckets: int = 1000) -> None:
+        """初始化限速器
+
+        Args:
+            config: 限速配置
+            max_buckets: 令牌桶数量超过该值时清理空闲的桶
+        """
+        self.config = settings.performance.rate_limit if config is None else config
+        self.max_buckets = max_buckets
+        self._buckets: Dict[Tuple[str, ...], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "reserved": 0,
+            "delayed": 0,
+            "rejected": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def reserve(self, account: str, recipients: Iterable[str]) -> float:
+        """为一次发送预约令牌
+
+        Args:
+            account: 账号名称
+            recipients: 接收者列表
+
+        Returns:
+            float: 需要等待的时间(秒)
+
+        Raises:
+            HTTPException: 需要等待的时间超过 max_wait
+        """
+        if not self.config.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._get_buckets(account, recipients)
+            for bucket in buckets:
+                bucket.refill(now)
+            wait = max((bucket.wait_time() for bucket in buckets), default=0.0)
+            if wait > self.config.max_wait:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"发送过于频繁，预计需要等待 {wait:.1f} 秒，超过最长排队时间 {self.config.max_wait} 秒"
+                )
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self._stats["reserved"] += 1
+            if wait > 0:
+                self._stats["delayed"] += 1
+                self._stats["wait_seconds"] += wait
+            if len(self._buckets) > self.max_buckets:
+                self._prune()
+        return wait
+
+    async def run(
+        self,
+        wxname: Optional[str],
+        recipients: Union[str, List[str], None],
+        operation: Callable[[], Awaitable[APIResponse]]
+    ) -> APIResponse:
+        """限速后执行发送操作，并在响应中附带等待时间
+
+        Args:
+            wxname: 微信客户端名称
+            recipients: 接收者
+            operation: 执行发送操作的函数
+
+        Returns:
+            APIResponse: 操作结果
+        """
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        wait = self.reserve(account_router.resolve_name(wxname), recipients or [])
+        if wait > 0:
+            await asyncio.sleep(wait)
+        response = await operation()
+        if wait > 0 and isinstance(response, APIResponse):
+            if response.data is None:
+                response.data = {}
+            if isinstance(response.data, dict):
+                response.data["rate_limit_wait"] = round(wait, 3)
+        return response
+
+    async def run_batch(
+        self,
+        wxname: Optional[str],
+        items: List[Dict[str, Any]],
+        send: Callable[[List[Dict[str, Any]], Optional[str]], Awaitable[APIResponse]]
+    ) -> APIResponse:
+        """限速后执行批量发送
+
+        先按顺序为每条消息预约令牌，不需要等待的消息作为一批立即发送；
+        需要等待的消息在事件循环中等待到预约时间后逐条发送，等待期间不占用执行通道
+
+        Args:
+            wxname: 微信客户端名称
+            items: 消息列表，每项包含 who
+            send: 发送一批消息的函数，参数为 (消息列表, 目标聊天)，
+                返回的 data.results 与消息列表顺序一致
+
+        Returns:
+            APIResponse: 每条消息的发送结果（与items顺序一致）
+        """
+        account = account_router.resolve_name(wxname)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        ready: List[int] = []
+        delayed: List[Tuple[float, int]] = []
+        for index, item in enumerate(items):
+            try:
+                wait = self.reserve(account, [item['who']])
+            except HTTPException as e:
+                results[index] = {'index': index, 'who': item['who'], 'success': False, 'message': e.detail, 'data': None}
+                continue
+            if wait > 0:
+                delayed.append((wait, index))
+            else:
+                ready.append(index)
+
+        async def send_part(indexes: List[int], wait: float = 0) -> None:
+            whos = {items[index]['who'] for index in indexes}
+            response = await send([items[index] for index in indexes], whos.pop() if len(whos) == 1 else None)
+            part_results = (response.data or {}).get('results') if isinstance(response.data, dict) else None
+            for position, index in enumerate(indexes):
+                if part_results:
+                    result = dict(part_results[position], index=index)
+                else:
+                    result = {'index': index, 'who': items[index]['who'], 'success': False,
+                              'message': response.message, 'data': None}
+                if wait > 0:
+                    result['rate_limit_wait'] = round(wait, 3)
+                results[index] = result
+
+        ready_part = asyncio.ensure_future(send_part(ready)) if ready else None
+
+        async def send_later(wait: float, index: int) -> None:
+            await asyncio.sleep(wait)
+            if ready_part is not None:
+                # 同一接收者不需要等待的消息先发送，保持发送顺序
+                await asyncio.wait([ready_part])
+            await send_part([index], wait)
+
+        parts = [ready_part] if ready_part is not None else []
+        parts += [send_later(wait, index) for wait, index in delayed]
+        await asyncio.gather(*parts)
+
+        success_count = sum(1 for result in results if result['success'])
+        return APIResponse(
+            success=success_count == len(items),
+            message=f'批量发送完成：成功{success_count}条，失败{len(items) - success_count}条',
+            data={
+                'total': len(items),
+                'success_count': success_count,
+                'rate_limit_wait': round(max((wait for wait, _ in delayed), default=0.0), 3),
+                'results': results
+            }
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限速统计"""
+        with self._lock:
+            data = dict(self._stats)
+            data["buckets"] = len(self._buckets)
+        data["wait_seconds"] = round(data["wait_seconds"], 3)
+        data["enabled"] = self.config.enabled
+        return data
+
+    def _get_buckets(self, account: str, recipients: Iterable[str]) -> List[TokenBucket]:
+        """获取本次发送涉及的令牌桶（速率为0的级别不限速）"""
+        config = self.config
+        levels = [
+            (("global",), config.global_per_minute, config.global_burst),
+            (("account", account), config.account_per_minute, config.account_burst),
+        ]
+        levels += [
+            (("recipient", account, who), config.recipient_per_minute, config.recipient_burst)
+            for who in recipients
+        ]
+        buckets = []
+        for key, per_minute, burst in levels:
+            if per_minute <= 0:
+                continue
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(per_minute, burst)
+            buckets.append(bucket)
+        return buckets
+
+    def _prune(self) -> None:
+        """清理已满的令牌桶"""
+        for key in [key for key, bucket in self._buckets.items() if bucket.idle]:
+            del self._buckets[key]
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,164 @@
+"""
+发送合并
+同一账号发往同一接收者的文字消息在合并窗口内到达时，用分隔符拼接成一次 SendMsg 发送，
+每个调用方仍各自收到发送结果。默认关闭，需要在配置中启用
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from app.models.response import APIResponse
+from app.utils.config import settings, CoalesceConfig
+
+
+class _Batch:
+    """合并窗口内待发送的消息"""
+
+    def __init__(self, send: Callable[[str], Awaitable[APIResponse]]) -> None:
+        self.send = send
+        self.msgs: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.length = 0
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class SendCoalescer:
+    """发送合并器"""
+
+    def __init__(self, config: Optional[CoalesceConfig] = None) -> None:
+        """初始化发送合并器
+
+        Args:
+            config: 发送合并配置
+        """
+        self.config = settings.performance.coalesce if config is None else config
+        self._batches: Dict[Hashable, _Batch] = {}
+        # 合并键 -> 最后一个发送任务，同一个键的发送按顺序依次进行
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            "messages": 0,
+            "sends": 0,
+            "merged": 0,
+        }
+
+    async def run(
+        self,
+        key: Optional[Hashable],
+        msg: str,
+        send: Callable[[str], Awaitable[APIResponse]]
+    ) -> APIResponse:
+        """发送一条消息，合并窗口内同一个键的消息一起发送
+
+        Args:
+            key: 合并键（账号、接收者等完全相同的发送才能合并），为空时不合并
+            msg: 消息内容
+            send: 发送（合并后的）消息内容的函数，同一批次使用第一条消息的函数
+
+        Returns:
+            APIResponse: 发送结果，合并发送时 data 中附带 coalesced（本批消息数）和 coalesced_index
+        """
+        config = self.config
+        if key is None or not config.enabled or config.window_ms <= 0:
+            return await send(msg)
+
+        separator = config.separator
+        batch = self._batches.get(key)
+        if batch is not None and batch.length + len(separator) + len(msg) > config.max_length:
+            # 超出最大长度，先发送已合并的消息
+            self._flush(key)
+            batch = None
+        if len(msg) >= config.max_length:
+            # 排在该键已合并的消息之后发送，保证同一接收者的消息顺序
+            self._count(messages=1, sends=1)
+            return await asyncio.shield(self._chain(key, lambda: send(msg)))
+
+        loop = asyncio.get_running_loop()
+        if batch is None:
+            batch = self._batches[key] = _Batch(send)
+            batch.handle = loop.call_later(config.window_ms / 1000, self._flush, key)
+        else:
+            batch.length += len(separator)
+        batch.msgs.append(msg)
+        batch.length += len(msg)
+        future = loop.create_future()
+        batch.futures.append(future)
+        # 调用方取消等待时不影响同批次的其他消息
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        with self._lock:
+            data = dict(self._stats)
+        data["pending"] = sum(len(batch.msgs) for batch in self._batches.values())
+        data["enabled"] = self.config.enabled
+        return data
+
+    def _flush(self, key: Hashable) -> None:
+        """结束合并窗口，发送该键已合并的消息"""
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        if batch.handle is not None:
+            batch.handle.cancel()
+        self._chain(key, lambda: self._send(batch))
+
+    def _chain(self, key: Hashable, send: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """在该键上一个发送任务结束后再发送"""
+        previous = self._tails.get(key)
+
+        async def run() -> Any:
+            if previous is not None:
+                # 只等待结束，上一个发送的异常由它自己的调用方处理
+                await asyncio.wait([previous])
+            return await send()
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tails[key] = task
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task) -> None:
+            self._tasks.discard(task)
+            if not task.cancelled():
+                # 调用方已取消等待时避免 "Task exception was never retrieved" 警告
+                task.exception()
+            if self._tails.get(key) is task:
+                del self._tails[key]
+
+        task.add_done_callback(done)
+        return task
+
+    async def _send(self, batch: _Batch) -> None:
+        """发送一个批次，并把结果分发给每个调用方"""
+        count = len(batch.msgs)
+        self._count(messages=count, sends=1, merged=count - 1)
+        try:
+            response = await batch.send(self.config.separator.join(batch.msgs))
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+                    # 调用方已取消时避免 "Future exception was never retrieved" 警告
+                    future.exception()
+            return
+
+        for index, future in enumerate(batch.futures):
+            if future.done():
+                continue
+            result = response.model_copy(deep=True)
+            if count > 1:
+                if result.data is None:
+                    result.data = {}
+                if isinstance(result.data, dict):
+                    result.data["coalesced"] = count
+                    result.data["coalesced_index"] = index
+            future.set_result(result)
+
+    def _count(self, **values: int) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+
+send_coalescer = SendCoalescer()
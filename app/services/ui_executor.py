@@ -0,0 +1,188 @@
+"""
+微信UI操作执行器
+所有对微信界面的自动化操作都在专用的COM线程中串行执行，
+路由通过await future获取结果，避免同步UI操作阻塞事件循环
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from pythoncom import CoInitialize, CoUninitialize
+from app.utils.config import settings
+from .chat_scheduler import ChatScheduler
+
+# 操作优先级（数值越小越优先）
+PRIORITY_INTERACTIVE = 0    # 交互式操作，如发送消息
+PRIORITY_NORMAL = 10        # 普通操作，如获取消息、切换窗口
+PRIORITY_BULK = 20          # 批量操作，如批量发送、后台任务
+
+_STOP = object()
+
+
+class UIExecutor:
+    """单线程UI操作执行器
+
+    内部维护一个优先级队列，工作线程启动时初始化COM，
+    之后按优先级（同优先级按提交顺序，相同聊天的操作优先连续执行）依次执行提交的操作
+    """
+
+    def __init__(
+        self,
+        name: str = "wechat-ui",
+        initializer: Optional[Callable[[], Any]] = None
+    ) -> None:
+        """初始化执行器
+
+        Args:
+            name: 工作线程名称
+            initializer: 工作线程启动并初始化COM后执行的初始化函数
+        """
+        self.name = name
+        self.initializer = initializer
+        self._queue = ChatScheduler(max_streak=settings.performance.max_chat_streak)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "busy_seconds": 0.0,
+        }
+        # 已提交未执行完的操作数，以及最近一次队列清空的时间（用于判断通道是否空闲）
+        self._outstanding = 0
+        self._idle_since = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        """工作线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """启动工作线程（重复调用无副作用）"""
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止工作线程，已入队的操作执行完后退出（在工作线程中调用时不等待）
+
+        Args:
+            timeout: 等待线程退出的超时时间(秒)
+        """
+        if not self.running:
+            return
+        # 停止标记使用最低优先级，保证已入队的操作先执行完
+        self._queue.put(float("inf"), None, _STOP)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_NORMAL,
+        chat_key: Optional[str] = None,
+        **kwargs: Any
+    ) -> Future:
+        """提交一个操作到工作线程
+
+        Args:
+            func: 要执行的函数
+            priority: 操作优先级
+            chat_key: 操作的目标聊天，用于把同一聊天的操作排在一起执行
+            *args, **kwargs: 函数参数
+
+        Returns:
+            Future: 操作结果
+        """
+        if not self.running:
+            self.start()
+        future: Future = Future()
+        self._queue.put(priority, chat_key, (func, args, kwargs, future))
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._outstanding += 1
+        return future
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_NORMAL,
+        chat_key: Optional[str] = None,
+        **kwargs: Any
+    ) -> Any:
+        """在工作线程中执行操作并等待结果（供异步路由使用）
+
+        Args:
+            func: 要执行的函数
+            priority: 操作优先级
+            chat_key: 操作的目标聊天
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        future = self.submit(func, *args, priority=priority, chat_key=chat_key, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    def idle_seconds(self) -> float:
+        """获取通道已空闲的时间（秒），有操作排队或正在执行时返回0"""
+        with self._lock:
+            if self._outstanding > 0:
+                return 0.0
+            return time.monotonic() - self._idle_since
+
+    def stats(self) -> Dict[str, Any]:
+        """获取执行器统计信息"""
+        with self._lock:
+            data = dict(self._stats)
+        data["pending"] = self._queue.qsize()
+        data.update(self._queue.stats())
+        data["running"] = self.running
+        return data
+
+    def _run(self) -> None:
+        """工作线程主循环"""
+        CoInitialize()
+        try:
+            if self.initializer is not None:
+                try:
+                    self.initializer()
+                except Exception as e:
+                    print(f"UI执行器初始化失败 [{self.name}]: {e}")
+
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                func, args, kwargs, future = item
+                if not future.set_running_or_notify_cancel():
+                    self._finish()
+                    continue
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                    failed = True
+                else:
+                    future.set_result(result)
+                    failed = False
+                with self._lock:
+                    self._stats["busy_seconds"] += time.perf_counter() - start
+                    self._stats["failed" if failed else "completed"] += 1
+                self._finish()
+        finally:
+            CoUninitialize()
+
+    def _finish(self) -> None:
+        """一个操作结束（执行完或已取消），队列清空时记录开始空闲的时间"""
+        with self._lock:
+            self._outstanding -= 1
+            if self._outstanding <= 0:
+                self._idle_since = time.monotonic()
@@ -0,0 +1,498 @@
+"""
+分块续传上传
+先创建上传会话，再按偏移量上传分块（可以并行、乱序），随时查询尚未接收的范围，全部接收后完成上传。
+每个分块可携带 SHA256 校验，整个文件的哈希在分块到达时按顺序增量计算，
+超过有效期未完成的会话定期清理
+"""
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.database.factory import DatabaseFactory
+from app.models.file import FileUploadResponse, UploadSessionInfo
+from app.models.request.files import CreateUploadSessionRequest
+from app.utils.config import settings
+from .file_service import FileService
+
+# 会话状态
+STATUS_OPEN = "open"
+STATUS_FINALIZED = "finalized"
+
+
+class _HashState:
+    """会话的增量哈希状态（只保存在内存中，重启后从磁盘重新计算）"""
+
+    def __init__(self) -> None:
+        self.hasher = hashlib.sha256()
+        # 已计入哈希的字节数
+        self.position = 0
+        # 计算期间有新的分块到达，持有锁的线程需要再检查一次
+        self.pending = False
+        self.lock = threading.Lock()
+
+
+class UploadSessionService:
+    """分块续传上传服务"""
+
+    def __init__(self) -> None:
+        """初始化分块续传上传服务"""
+        self.db = DatabaseFactory.get_database()
+        self.config = settings.upload.resumable
+        self.file_service = FileService()
+        # 会话ID -> 增量哈希状态
+        self._hashers: Dict[str, _HashState] = {}
+        self._session_locks: Dict[str, threading.RLock] = {}
+        # 增量哈希在后台计算，不占用分块写入的会话锁，也不拖慢上传分块的请求
+        self._hash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-hash")
+        self._lock = threading.Lock()
+        self._gc_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "created": 0,
+            "chunks": 0,
+            "bytes": 0,
+            "chunk_hash_mismatches": 0,
+            "rejected": 0,
+            "finalized": 0,
+            "expired": 0,
+        }
+
+        # 创建上传会话表
+        self.db.create_table("upload_sessions", {
+            "id": "TEXT PRIMARY KEY",
+            "filename": "TEXT NOT NULL",
+            "file_type": "TEXT NOT NULL",
+            "file_size": "INTEGER NOT NULL",
+            "chunk_size": "INTEGER NOT NULL",
+            "description": "TEXT",
+            "uploader": "TEXT",
+            "sha256": "TEXT",
+            "status": "TEXT NOT NULL",
+            "received_bytes": "INTEGER DEFAULT 0",
+            "part_path": "TEXT NOT NULL",
+            "file_id": "TEXT",
+            "created_at": "TIMESTAMP NOT NULL",
+            "expires_at": "REAL NOT NULL"
+        })
+        # 创建已接收分块表
+        self.db.create_table("upload_chunks", {
+            "session_id": "TEXT NOT NULL",
+            "offset": "INTEGER NOT NULL",
+            "size": "INTEGER NOT NULL",
+            "sha256": "TEXT NOT NULL"
+        })
+        self.db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_upload_chunks_session ON upload_chunks (session_id, offset)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires ON upload_sessions (expires_at)")
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """启动过期会话清理任务
+
+        Args:
+            loop: 清理任务所在的事件循环
+        """
+        if self._gc_task is None:
+            self._gc_task = loop.create_task(self._gc_loop())
+
+    async def stop(self) -> None:
+        """停止过期会话清理任务"""
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+        self._hash_pool.shutdown(wait=False, cancel_futures=True)
+
+    def create(self, request: CreateUploadSessionRequest) -> UploadSessionInfo:
+        """创建上传会话
+
+        Args:
+            request: 创建会话请求
+
+        Returns:
+            UploadSessionInfo: 会话信息
+
+        Raises:
+            HTTPException: 文件过大、分块大小无效、文件类型不允许，或未完成的会话数量、预留空间超过上限
+        """
+        if request.file_size > self.config.max_size:
+            raise HTTPException(status_code=413, detail=f"文件大小超过限制: {request.file_size} > {self.config.max_size}")
+        chunk_size = request.chunk_size or self.config.chunk_size
+        if chunk_size <= 0 or chunk_size > self.config.max_chunk_size:
+            raise HTTPException(status_code=422, detail=f"分块大小必须在 1 到 {self.config.max_chunk_size} 之间")
+        file_type = request.file_type or mimetypes.guess_type(request.filename)[0] or "application/octet-stream"
+        if self.file_service.allowed_types and file_type not in self.file_service.allowed_types:
+            raise HTTPException(status_code=400, detail="不支持的文件类型")
+
+        session_id = uuid.uuid4().hex
+        part_path = os.path.join(self.file_service.temp_dir, f"{session_id}.part")
+        session = self._new_session(session_id, request, file_type, chunk_size, part_path)
+        # 检查和登记在同一把锁内，避免并发创建同时通过上限检查
+        with self._lock:
+            self._check_capacity(request.file_size)
+            # 预先分配文件大小，分块直接写入各自的偏移位置
+            with open(part_path, "wb") as f:
+                f.truncate(request.file_size)
+            self.db.insert("upload_sessions", session)
+            self._stats["created"] += 1
+        return self._format(session, [])
+
+    def _new_session(
+        self,
+        session_id: str,
+        request: CreateUploadSessionRequest,
+        file_type: str,
+        chunk_size: int,
+        part_path: str
+    ) -> Dict[str, Any]:
+        """新会话的数据库记录"""
+        return {
+            "id": session_id,
+            "filename": os.path.basename(request.filename),
+            "file_type": file_type,
+            "file_size": request.file_size,
+            "chunk_size": chunk_size,
+            "description": request.description,
+            "uploader": request.uploader,
+            "sha256": request.sha256.lower() if request.sha256 else None,
+            "status": STATUS_OPEN,
+            "received_bytes": 0,
+            "part_path": part_path,
+            "created_at": datetime.now().isoformat(),
+            "expires_at": time.time() + self.config.session_ttl
+        }
+
+    def _check_capacity(self, file_size: int) -> None:
+        """检查未完成的会话数量和预留空间（调用方持有 self._lock）"""
+        rows = self.db.execute(
+            "SELECT COUNT(*) AS count, COALESCE(SUM(file_size), 0) AS reserved FROM upload_sessions "
+            "WHERE status=? AND expires_at>?",
+            [STATUS_OPEN, time.time()]
+        )
+        count, reserved = rows[0]["count"], rows[0]["reserved"]
+        if count >= self.config.max_open_sessions:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=429, detail=f"未完成的上传会话过多（上限 {self.config.max_open_sessions}），请稍后重试")
+        if reserved + file_size > self.config.max_reserved_size:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=429, detail="未完成的上传会话占用空间超过上限，请稍后重试")
+
+    def write_chunk(
+        self,
+        session_id: str,
+        offset: int,
+        data: bytes,
+        chunk_sha256: Optional[str] = None
+    ) -> UploadSessionInfo:
+        """写入一个分块（分块内容的接收可以并行，写入和登记按会话串行，整个文件的哈希在后台计算）
+
+        Args:
+            session_id: 会话ID
+            offset: 分块偏移量（必须按分块大小对齐）
+            data: 分块内容
+            chunk_sha256: 分块的SHA256，提供时校验
+
+        Returns:
+            UploadSessionInfo: 会话信息
+
+        Raises:
+            HTTPException: 会话不存在、分块位置或大小无效、校验失败
+        """
+        session = self._get_open(session_id)
+        file_size, chunk_size = session["file_size"], session["chunk_size"]
+        if offset % chunk_size != 0 or offset >= max(file_size, 1):
+            raise HTTPException(status_code=422, detail=f"偏移量必须是分块大小 {chunk_size} 的整数倍且小于文件大小")
+        expected = min(chunk_size, file_size - offset)
+        if len(data) != expected:
+            raise HTTPException(status_code=422, detail=f"分块大小应为 {expected} 字节，实际为 {len(data)} 字节")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if chunk_sha256 and chunk_sha256.lower() != digest:
+            with self._lock:
+                self._stats["chunk_hash_mismatches"] += 1
+            raise HTTPException(status_code=422, detail="分块SHA256校验失败")
+
+        with self._session_lock(session_id):
+            # 加锁后重新检查，会话可能已完成或被取消
+            session = self._get_open(session_id)
+            rows = self.db.execute(
+                "SELECT sha256 FROM upload_chunks WHERE session_id=? AND offset=?", [session_id, offset]
+            )
+            if rows:
+                # 重复上传的分块（如客户端重试），内容一致时直接返回
+                if rows[0]["sha256"] != digest:
+                    raise HTTPException(status_code=409, detail="该偏移量的分块已上传且内容不同")
+                return self.get(session_id)
+
+            with open(session["part_path"], "r+b") as f:
+                f.seek(offset)
+                f.write(data)
+            self.db.execute(
+                "INSERT INTO upload_chunks (session_id, offset, size, sha256) VALUES (?, ?, ?, ?)",
+                [session_id, offset, len(data), digest]
+            )
+            self.db.execute(
+                "UPDATE upload_sessions SET received_bytes=received_bytes+?, expires_at=? WHERE id=?",
+                [len(data), time.time() + self.config.session_ttl, session_id]
+            )
+            with self._lock:
+                self._stats["chunks"] += 1
+                self._stats["bytes"] += len(data)
+                state = self._hashers.setdefault(session_id, _HashState())
+        # 只有刚好接上已计算位置的分块才把内容带给后台任务，其余的分块届时从磁盘读取
+        self._hash_pool.submit(self._advance_hash, session, offset, data if offset == state.position else None)
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> UploadSessionInfo:
+        """获取会话信息和尚未接收的范围
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            UploadSessionInfo: 会话信息
+
+        Raises:
+            HTTPException: 会话不存在或已过期
+        """
+        session = self.db.get_by_id("upload_sessions", session_id)
+        if session is None or (session["status"] == STATUS_OPEN and session["expires_at"] <= time.time()):
+            raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+        return self._format(session, self._received(session_id))
+
+    def finalize(self, session_id: str) -> FileUploadResponse:
+        """完成上传：校验全部分块已接收和整个文件的哈希，然后登记文件
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            FileUploadResponse: 文件上传响应（重复完成时返回同一结果）
+
+        Raises:
+            HTTPException: 会话不存在、分块不完整或哈希校验失败
+        """
+        with self._session_lock(session_id):
+            session = self.db.get_by_id("upload_sessions", session_id)
+            if session is not None and session["status"] == STATUS_FINALIZED:
+                return self._finalized_response(session)
+            session = self._get_open(session_id)
+
+            info = self._format(session, self._received(session_id))
+            if info.missing:
+                raise HTTPException(status_code=409, detail=f"还有 {len(info.missing)} 个范围未上传，请先上传 missing 中的范围")
+
+            file_hash = self._finish_hash(session)
+            if session["sha256"] and session["sha256"] != file_hash:
+                raise HTTPException(status_code=422, detail="文件SHA256校验失败")
+
+            result = self.file_service.register_file(
+                file_hash,
+                session["file_size"],
+                session["part_path"],
+                True,
+                session["filename"],
+                session["file_type"],
+                session["description"],
+                session["uploader"]
+            )
+            self.db.update("upload_sessions", session_id, {
+                "status": STATUS_FINALIZED,
+                "file_id": result["file_id"],
+                "expires_at": time.time() + self.config.session_ttl
+            })
+            self.db.execute("DELETE FROM upload_chunks WHERE session_id=?", [session_id])
+            with self._lock:
+                self._hashers.pop(session_id, None)
+                self._stats["finalized"] += 1
+        return FileUploadResponse(**result)
+
+    def abort(self, session_id: str) -> bool:
+        """取消上传会话并删除已上传的内容
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            bool: 会话是否存在
+        """
+        session = self.db.get_by_id("upload_sessions", session_id)
+        if session is None:
+            return False
+        self._remove(session)
+        return True
+
+    def gc(self) -> int:
+        """清理过期的会话
+
+        Returns:
+            int: 清理的会话数量
+        """
+        sessions = self.db.execute("SELECT * FROM upload_sessions WHERE expires_at<=?", [time.time()])
+        for session in sessions:
+            self._remove(session)
+        if sessions:
+            with self._lock:
+                self._stats["expired"] += len(sessions)
+        return len(sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取上传统计"""
+        rows = self.db.execute(
+            "SELECT COUNT(*) AS count FROM upload_sessions WHERE status=?", [STATUS_OPEN]
+        )
+        with self._lock:
+            data = dict(self._stats)
+        data["open_sessions"] = rows[0]["count"] if rows else 0
+        return data
+
+    async def _gc_loop(self) -> None:
+        """定期清理过期会话"""
+        while True:
+            try:
+                count = await self.file_service.run_io(self.gc)
+                if count:
+                    print(f"已清理 {count} 个过期的上传会话")
+            except Exception as e:
+                print(f"清理上传会话失败: {e}")
+            await asyncio.sleep(self.config.gc_interval)
+
+    def _get_open(self, session_id: str) -> Dict[str, Any]:
+        """获取未完成的会话"""
+        session = self.db.get_by_id("upload_sessions", session_id)
+        if session is None or session["expires_at"] <= time.time():
+            raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+        if session["status"] != STATUS_OPEN:
+            raise HTTPException(status_code=409, detail="上传会话已完成")
+        return session
+
+    def _received(self, session_id: str) -> List[Tuple[int, int]]:
+        """已接收的分块 [(offset, size)]，按偏移量排序"""
+        rows = self.db.execute(
+            "SELECT offset, size FROM upload_chunks WHERE session_id=? ORDER BY offset", [session_id]
+        )
+        return [(row["offset"], row["size"]) for row in rows]
+
+    def _format(self, session: Dict[str, Any], received: List[Tuple[int, int]]) -> UploadSessionInfo:
+        """转换为接口返回的会话信息，计算尚未接收的范围"""
+        missing: List[List[int]] = []
+        position = 0
+        if session["status"] == STATUS_OPEN:
+            for offset, size in received + [(session["file_size"], 0)]:
+                if offset > position:
+                    missing.append([position, offset])
+                position = max(position, offset + size)
+        return UploadSessionInfo(
+            session_id=session["id"],
+            filename=session["filename"],
+            file_size=session["file_size"],
+            chunk_size=session["chunk_size"],
+            received_bytes=session["received_bytes"],
+            missing=missing,
+            status=session["status"],
+            expires_at=datetime.fromtimestamp(session["expires_at"]),
+            file_id=session.get("file_id")
+        )
+
+    def _session_lock(self, session_id: str) -> threading.RLock:
+        """获取会话的锁（分块登记、增量哈希和完成上传按会话串行）"""
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.RLock()
+            return lock
+
+    def _advance_hash(self, session: Dict[str, Any], offset: int = -1, data: Optional[bytes] = None) -> None:
+        """按顺序把已连续接收的分块计入增量哈希（在后台线程中执行）
+
+        同一会话同时只有一个线程计算；计算期间到达的分块只做标记，由正在计算的线程接着处理
+
+        Args:
+            session: 会话
+            offset: 刚接收的分块偏移量（其内容为 data，可避免再从磁盘读取）
+            data: 刚接收的分块内容
+        """
+        with self._lock:
+            state = self._hashers.get(session["id"])
+        if state is None:
+            # 会话已完成或已取消
+            return
+        state.pending = True
+        while state.pending:
+            if not state.lock.acquire(blocking=False):
+                return
+            try:
+                state.pending = False
+                self._hash_contiguous(session, state, offset, data)
+            except OSError:
+                # 会话在计算期间被取消或清理
+                return
+            finally:
+                state.lock.release()
+
+    def _hash_contiguous(
+        self,
+        session: Dict[str, Any],
+        state: _HashState,
+        offset: int = -1,
+        data: Optional[bytes] = None
+    ) -> None:
+        """把从 state.position 开始连续接收的分块计入哈希（调用方持有 state.lock）"""
+        chunks = [(o, size) for o, size in self._received(session["id"]) if o >= state.position]
+        with open(session["part_path"], "rb") as f:
+            for chunk_offset, size in chunks:
+                if chunk_offset != state.position:
+                    break
+                if chunk_offset == offset and data is not None:
+                    state.hasher.update(data)
+                else:
+                    f.seek(chunk_offset)
+                    state.hasher.update(f.read(size))
+                state.position += size
+
+    def _finish_hash(self, session: Dict[str, Any]) -> str:
+        """计算整个文件的哈希（已增量计算的部分不再读取，调用方持有会话锁）"""
+        with self._lock:
+            state = self._hashers.setdefault(session["id"], _HashState())
+        with state.lock:
+            self._hash_contiguous(session, state)
+            if state.position != session["file_size"]:
+                raise HTTPException(status_code=409, detail="分块不完整，无法计算文件哈希")
+            return state.hasher.hexdigest()
+
+    def _finalized_response(self, session: Dict[str, Any]) -> FileUploadResponse:
+        """已完成会话的上传结果"""
+        file_info = self.file_service.get_file(session["file_id"])
+        if file_info is None:
+            raise HTTPException(status_code=404, detail="文件已被删除")
+        return FileUploadResponse(
+            file_id=file_info.id,
+            filename=file_info.filename,
+            file_type=file_info.file_type,
+            file_size=file_info.file_size,
+            file_hash=file_info.file_hash,
+            file_path=file_info.file_path,
+            upload_time=file_info.upload_time,
+            is_new=False
+        )
+
+    def _remove(self, session: Dict[str, Any]) -> None:
+        """删除会话记录和临时文件"""
+        with self._session_lock(session["id"]):
+            if os.path.exists(session["part_path"]):
+                os.remove(session["part_path"])
+            self.db.execute("DELETE FROM upload_chunks WHERE session_id=?", [session["id"]])
+            self.db.delete("upload_sessions", session["id"])
+        with self._lock:
+            self._hashers.pop(session["id"], None)
+            self._session_locks.pop(session["id"], None)
+
+
+upload_sessions = UploadSessionService()
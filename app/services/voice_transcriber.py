@@ -0,0 +1,158 @@
+"""
+语音转文字
+新消息接口不再同步调用 msg.to_text()，语音消息只登记并返回语音ID，
+转换在账号执行通道中排队进行，结果按消息缓存到 SQLite，同一条语音不会重复转换；
+转换完成后作为原消息的更新写回消息存储，并推送给 SSE 订阅者和 Webhook
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict
+from app.utils.config import settings
+from .account_router import account_router
+from .held_message import HeldMessageService, message_key
+from .ui_executor import PRIORITY_NORMAL
+
+# 转换状态
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class VoiceTranscriber(HeldMessageService):
+    """语音转文字服务"""
+
+    table = "voice_texts"
+    active_statuses = (STATUS_PENDING,)
+
+    def __init__(self) -> None:
+        """初始化语音转文字服务"""
+        super().__init__(settings.media.max_held_messages)
+        self._stats = {
+            "registered": 0,
+            "cache_hits": 0,
+            "transcribed": 0,
+            "failed": 0,
+            "transcribe_seconds": 0.0,
+            "max_transcribe_seconds": 0.0,
+        }
+
+        # 创建语音转文字缓存表
+        self.db.create_table("voice_texts", {
+            "id": "TEXT PRIMARY KEY",
+            "account": "TEXT NOT NULL",
+            "chat_name": "TEXT",
+            "msg_id": "TEXT",
+            "status": "TEXT NOT NULL",
+            "text": "TEXT",
+            "error": "TEXT",
+            "duration": "REAL",
+            "created_at": "TIMESTAMP NOT NULL",
+            "updated_at": "TIMESTAMP NOT NULL"
+        })
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环，上次未完成的转换标记为失败（消息对象已失效）
+
+        Args:
+            loop: 等待转换结果的请求所在的事件循环
+        """
+        self.bind(loop)
+        self.db.execute(
+            "UPDATE voice_texts SET status=?, error=?, updated_at=? WHERE status=?",
+            [STATUS_FAILED, "服务重启，转换未完成", datetime.now().isoformat(), STATUS_PENDING]
+        )
+
+    def register(self, account: str, msg: Any, msg_info: Dict[str, Any]) -> Dict[str, Any]:
+        """登记一条语音消息，已缓存时直接返回文字，否则安排转换（在账号执行通道中调用）
+
+        Args:
+            account: 账号名称
+            msg: 消息对象
+            msg_info: 消息信息
+
+        Returns:
+            Dict[str, Any]: 语音信息 {id, status, text}
+        """
+        voice_id, msg_id, chat_name = message_key(account, msg, msg_info)
+
+        existing = self.db.get_by_id("voice_texts", voice_id)
+        if existing is not None and existing["status"] != STATUS_FAILED:
+            if existing["status"] == STATUS_DONE:
+                with self._lock:
+                    self._stats["cache_hits"] += 1
+            return {"id": voice_id, "status": existing["status"], "text": existing["text"]}
+
+        now = datetime.now().isoformat()
+        if existing is None:
+            self.db.insert("voice_texts", {
+                "id": voice_id,
+                "account": account,
+                "chat_name": chat_name,
+                "msg_id": msg_id,
+                "status": STATUS_PENDING,
+                "created_at": now,
+                "updated_at": now
+            })
+        else:
+            self.db.update("voice_texts", voice_id, {"status": STATUS_PENDING, "error": None, "updated_at": now})
+        with self._lock:
+            self._stats["registered"] += 1
+        self._remember(voice_id, msg)
+
+        account_router.submit(account, self._transcribe, voice_id, priority=PRIORITY_NORMAL, chat_key=chat_name)
+        return {"id": voice_id, "status": STATUS_PENDING, "text": None}
+
+    def stats(self) -> Dict[str, Any]:
+        """获取转换统计"""
+        with self._lock:
+            data = dict(self._stats)
+            data["held_messages"] = len(self._messages)
+        data["avg_transcribe_seconds"] = (
+            round(data["transcribe_seconds"] / data["transcribed"], 3) if data["transcribed"] else 0.0
+        )
+        data["transcribe_seconds"] = round(data["transcribe_seconds"], 3)
+        data["max_transcribe_seconds"] = round(data["max_transcribe_seconds"], 3)
+        return data
+
+    def _finish(self, voice_id: str, row: Dict[str, Any], **fields: Any) -> None:
+        """保存转换结果，通知等待中的请求，并把结果作为原消息的更新发出"""
+        fields["updated_at"] = datetime.now().isoformat()
+        self.db.update("voice_texts", voice_id, fields)
+        self._forget(voice_id)
+        self._notify()
+        text = fields.get("text")
+        self._publish_update(row, {
+            "type": "voice",
+            "voice": {"id": voice_id, "status": fields["status"], "text": text},
+            "voice_to_text": text,
+            "voice_convert_success": fields["status"] == STATUS_DONE
+        })
+
+    def _transcribe(self, voice_id: str) -> None:
+        """在账号执行通道中转换语音"""
+        row = self.db.get_by_id("voice_texts", voice_id)
+        if row is None or row["status"] != STATUS_PENDING:
+            return
+
+        def transcribe(msg: Any) -> Any:
+            start = time.perf_counter()
+            return msg.to_text(), time.perf_counter() - start
+
+        try:
+            text, duration = self._with_message(voice_id, row, transcribe, "消息已失效，无法转换")
+        except Exception as e:
+            self._finish(voice_id, row, status=STATUS_FAILED, error=str(e))
+            with self._lock:
+                self._stats["failed"] += 1
+            return
+
+        self._finish(voice_id, row, status=STATUS_DONE, text=text, error=None, duration=round(duration, 3))
+        with self._lock:
+            self._stats["transcribed"] += 1
+            self._stats["transcribe_seconds"] += duration
+            self._stats["max_transcribe_seconds"] = max(self._stats["max_transcribe_seconds"], duration)
+
+
+voice_transcriber = VoiceTranscriber()
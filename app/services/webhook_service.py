@@ -0,0 +1,280 @@
+"""
+Webhook 投递服务
+将获取到的新消息持久化到 SQLite 投递队列，由后台任务批量 POST 到配置的 Webhook 地址，
+失败时按指数退避重试，超过最大重试次数后进入死信队列
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import httpx
+from app.database.factory import DatabaseFactory
+from app.utils.config import settings, WebhookTargetConfig
+from .message_broker import flatten_messages
+
+STATUS_PENDING = "pending"
+STATUS_INFLIGHT = "inflight"
+STATUS_DEAD = "dead"
+
+
+class WebhookService:
+    """Webhook 投递服务"""
+
+    def __init__(self) -> None:
+        """初始化投递服务"""
+        self.db = DatabaseFactory.get_database()
+        self.config = settings.webhook
+        self.targets: Dict[str, WebhookTargetConfig] = {target.url: target for target in self.config.targets}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "delivered": 0,
+            "failed_attempts": 0,
+            "dead": 0,
+        }
+
+        # 创建投递队列表
+        self.db.create_table("webhook_deliveries", {
+            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "target": "TEXT NOT NULL",
+            "payload": "TEXT NOT NULL",
+            "status": "TEXT NOT NULL",
+            "attempts": "INTEGER DEFAULT 0",
+            "next_attempt_at": "REAL NOT NULL",
+            "last_error": "TEXT",
+            "created_at": "TIMESTAMP NOT NULL",
+            "updated_at": "TIMESTAMP NOT NULL"
+        })
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due "
+            "ON webhook_deliveries (target, status, next_attempt_at)"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用了 Webhook 投递"""
+        return self.config.enabled and bool(self.targets)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """启动投递任务，上次未完成的投递恢复为待投递
+
+        Args:
+            loop: 投递任务所在的事件循环
+        """
+        if not self.enabled or self._tasks:
+            return
+        self._loop = loop
+        self.db.execute(
+            "UPDATE webhook_deliveries SET status=? WHERE status=?",
+            [STATUS_PENDING, STATUS_INFLIGHT]
+        )
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=sum(t.max_concurrency for t in self.targets.values()))
+        )
+        for url, target in self.targets.items():
+            self._wakeups[url] = asyncio.Event()
+            for _ in range(target.max_concurrency):
+                self._tasks.append(loop.create_task(self._deliver_loop(target)))
+
+    async def stop(self) -> None:
+        """停止投递任务（未投递的消息保留在队列中）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def enqueue(self, account: str, result: Dict[str, Any]) -> None:
+        """将一批新消息写入投递队列（可在任意线程中调用）
+
+        Args:
+            account: 账号名称
+            result: 新消息，格式与 get_next_new_message 返回的 data 相同
+        """
+        if not self.enabled:
+            return
+        items = flatten_messages(account, result)
+        if not items:
+            return
+        now = datetime.now().isoformat()
+        rows = [
+            (url, json.dumps(item, ensure_ascii=False, default=str), STATUS_PENDING, time.time(), now, now)
+            for url in self.targets
+            for item in items
+        ]
+        self.db.executemany(
+            "INSERT INTO webhook_deliveries (target, payload, status, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        with self._lock:
+            self._stats["enqueued"] += len(rows)
+        if self._loop is not None:
+            for url in self.targets:
+                self._loop.call_soon_threadsafe(self._wakeups[url].set)
+
+    def list_dead_letters(self, target: Optional[str] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """获取死信列表
+
+        Args:
+            target: Webhook 地址，为空表示全部
+            skip: 跳过数量
+            limit: 限制数量
+
+        Returns:
+            List[Dict[str, Any]]: 死信记录
+        """
+        sql = "SELECT * FROM webhook_deliveries WHERE status=?"
+        params: List[Any] = [STATUS_DEAD]
+        if target:
+            sql += " AND target=?"
+            params.append(target)
+        sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params += [limit, skip]
+        rows = self.db.execute(sql, params)
+        for row in rows:
+            row["payload"] = json.loads(row["payload"])
+        return rows
+
+    def retry_dead_letter(self, delivery_id: int) -> bool:
+        """将死信重新放回投递队列
+
+        Args:
+            delivery_id: 投递记录ID
+
+        Returns:
+            bool: 是否成功
+        """
+        rows = self.db.execute(
+            "UPDATE webhook_deliveries SET status=?, attempts=0, next_attempt_at=?, updated_at=? "
+            "WHERE id=? AND status=? RETURNING target",
+            [STATUS_PENDING, time.time(), datetime.now().isoformat(), delivery_id, STATUS_DEAD]
+        )
+        if rows and self._loop is not None and rows[0]["target"] in self._wakeups:
+            self._loop.call_soon_threadsafe(self._wakeups[rows[0]["target"]].set)
+        return bool(rows)
+
+    def delete_dead_letter(self, delivery_id: int) -> bool:
+        """删除死信
+
+        Args:
+            delivery_id: 投递记录ID
+
+        Returns:
+            bool: 是否成功
+        """
+        rows = self.db.execute(
+            "DELETE FROM webhook_deliveries WHERE id=? AND status=? RETURNING id",
+            [delivery_id, STATUS_DEAD]
+        )
+        return bool(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取投递统计"""
+        rows = self.db.execute(
+            "SELECT target, status, COUNT(*) AS count FROM webhook_deliveries GROUP BY target, status"
+        )
+        queues: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            queues.setdefault(row["target"], {})[row["status"]] = row["count"]
+        with self._lock:
+            data = dict(self._stats)
+        data["enabled"] = self.enabled
+        data["queues"] = queues
+        return data
+
+    def _claim(self, target: WebhookTargetConfig, limit: int) -> List[Dict[str, Any]]:
+        """领取一批到期的待投递消息（标记为投递中）"""
+        return self.db.execute(
+            "UPDATE webhook_deliveries SET status=? WHERE id IN ("
+            "SELECT id FROM webhook_deliveries WHERE target=? AND status=? AND next_attempt_at<=? "
+            "ORDER BY id LIMIT ?) RETURNING id, payload, attempts",
+            [STATUS_INFLIGHT, target.url, STATUS_PENDING, time.time(), limit]
+        )
+
+    def _next_due(self, target: WebhookTargetConfig) -> Optional[float]:
+        """下一条待投递消息的到期时间"""
+        rows = self.db.execute(
+            "SELECT MIN(next_attempt_at) AS due FROM webhook_deliveries WHERE target=? AND status=?",
+            [target.url, STATUS_PENDING]
+        )
+        return rows[0]["due"] if rows else None
+
+    def _complete(self, ids: List[int]) -> None:
+        """投递成功，删除记录"""
+        self.db.executemany("DELETE FROM webhook_deliveries WHERE id=?", [(i,) for i in ids])
+        with self._lock:
+            self._stats["delivered"] += len(ids)
+
+    def _fail(self, rows: List[Dict[str, Any]], error: str) -> None:
+        """投递失败，按指数退避安排重试，超过最大次数进入死信"""
+        now = time.time()
+        updates = []
+        dead = 0
+        for row in rows:
+            attempts = row["attempts"] + 1
+            if attempts >= self.config.max_attempts:
+                status = STATUS_DEAD
+                dead += 1
+            else:
+                status = STATUS_PENDING
+            delay = min(self.config.backoff_base * (2 ** (attempts - 1)), self.config.backoff_max)
+            delay *= random.uniform(0.8, 1.2)
+            updates.append((status, attempts, now + delay, error[:500], datetime.now().isoformat(), row["id"]))
+        self.db.executemany(
+            "UPDATE webhook_deliveries SET status=?, attempts=?, next_attempt_at=?, last_error=?, updated_at=? "
+            "WHERE id=?",
+            updates
+        )
+        with self._lock:
+            self._stats["failed_attempts"] += len(rows)
+            self._stats["dead"] += dead
+
+    async def _deliver_loop(self, target: WebhookTargetConfig) -> None:
+        """单个投递任务：领取一批消息 -> POST -> 更新状态"""
+        wakeup = self._wakeups[target.url]
+        while True:
+            # 先清除唤醒标记再查询，查询期间到达的消息会让下面的等待立即返回
+            wakeup.clear()
+            rows = await asyncio.to_thread(self._claim, target, target.batch_size)
+            if not rows:
+                due = await asyncio.to_thread(self._next_due, target)
+                timeout = self.config.poll_interval if due is None else max(due - time.time(), 0.05)
+                try:
+                    await asyncio.wait_for(wakeup.wait(), min(timeout, self.config.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # 等待更多消息凑成一批
+            if len(rows) < target.batch_size and target.batch_wait > 0:
+                await asyncio.sleep(target.batch_wait)
+                more = await asyncio.to_thread(self._claim, target, target.batch_size - len(rows))
+                rows.extend(more)
+
+            payload = {"messages": [json.loads(row["payload"]) for row in rows]}
+            try:
+                response = await self._client.post(
+                    target.url,
+                    json=payload,
+                    headers=target.headers,
+                    timeout=target.timeout
+                )
+                response.raise_for_status()
+            except Exception as e:
+                await asyncio.to_thread(self._fail, rows, str(e) or e.__class__.__name__)
+            else:
+                await asyncio.to_thread(self._complete, [row["id"] for row in rows])
+
+
+webhook_service = WebhookService()
@@ -1,83 +1,22 @@
 from app.utils.wx_package_manager import has_feature
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Dict, Tuple
 from fastapi.responses import FileResponse, Response
 from app.models.response import APIResponse
 from app.services.file_service import FileService
 from .init import WeChat, WxClient, WeChatLogin, Chat, HumanMessage
+from .account_router import account_router
+from .window_manager import window_manager
+from .chat_index import subwin_index
+from .active_chat import active_chat
+from .contact_index import contact_index, ChatNotFoundError
+from .media_pipeline import media_pipeline
+from .voice_transcriber import voice_transcriber
+from .message_store import message_store
+from .message_cursor import message_cursors
+from app.utils.config import settings
 from PIL import Image
 import tempfile
-import shutil
 import os
-import win32gui
-import ctypes
-from ctypes import wintypes
-
-# 初始化
-kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
-
-# 函数声明
-kernel32.OpenEventW.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.LPCWSTR]
-kernel32.OpenEventW.restype = wintypes.HANDLE
-kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
-kernel32.WaitForSingleObject.restype = wintypes.DWORD
-kernel32.ResetEvent.argtypes = [wintypes.HANDLE]
-kernel32.ResetEvent.restype = wintypes.BOOL
-kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
-kernel32.CloseHandle.restype = wintypes.BOOL
-
-# Windows API
-user32 = ctypes.WinDLL('user32', use_last_error=True)
-
-# 常量
-SW_SHOWMINIMIZED = 2   # 最小化
-SW_RESTORE = 9         # 还原
-
-def minimize_window(hwnd):
-    """最小化窗口"""
-    if not hwnd:
-        return False
-    
-    # 参数1: HWND, 参数2: 显示命令
-    result = user32.ShowWindow(hwnd, SW_SHOWMINIMIZED)
-    return bool(result)
-
-def restore_window(hwnd):
-    """还原窗口（从最小化/最大化恢复）"""
-    if not hwnd:
-        return False
-    
-    result = user32.ShowWindow(hwnd, SW_RESTORE)
-    return bool(result)
-
-def check_and_reset_wechat_event():
-    """检查微信消息Event是否被触发，如果是则Reset"""
-    event_name = "Global\\TrayMonitor_RecvMessageEvent"
-    
-    # 1. 打开Event
-    h_event = kernel32.OpenEventW(
-        0x1F0003,       # EVENT_ALL_ACCESS
-        False,          # 不继承
-        event_name
-    )
-    
-    if not h_event:
-        print(f"无法打开Event: {event_name}")
-        return False
-    
-    # 2. 立即检查（不等待）
-    result = kernel32.WaitForSingleObject(h_event, 0)
-    
-    if result == 0:  # WAIT_OBJECT_0
-        # 3. Event被触发，Reset它
-        kernel32.ResetEvent(h_event)
-        print("检测到微信新消息，Event已Reset")
-        return True
-    else:
-        print("未检测到新消息")
-        return False
-
-    # 4. 关闭句柄
-    kernel32.CloseHandle(h_event)
 
 def get_wechat(wxname: str) -> WeChat:
     """获取微信实例
@@ -88,31 +27,7 @@ def get_wechat(wxname: str) -> WeChat:
     Returns:
         WeChat实例
     """
-    # 检查字典是否为空或者实例无效
-    if WxClient:  # 字典不为空
-        # 获取第一个实例
-        cached_key = list(WxClient.keys())[0]
-        cached_wx = WxClient[cached_key]
-        # 检查窗口是否可用
-        if not win32gui.IsWindow(cached_wx.core.HWND):
-            print(f"微信窗口实例已不存在，清空缓存准备重建实例")
-            WxClient.clear()  # 清空字典
-
-    if not WxClient:  # 字典为空（要么本来空，要么刚被清空）
-        print(f"重建微信窗口实例")
-        try:
-            wx = WeChat() # 这里失败也会抛出异常
-        except Exception as e:
-            print(f"创建微信窗口实例失败，窗口不存在，需要登录: {e}")
-            raise  # 直接重新抛出相同的异常
-
-        if win32gui.IsWindow(wx.core.HWND):
-            WxClient["default"] = wx  # 添加键值对
-        else:
-            print(f"微信窗口异常，窗口不存在")
-            raise Exception("微信窗口异常，微信窗口不存在")
-
-    return list(WxClient.values())[0]  # 返回第一个（也是唯一一个）值
+    return account_router.get_wechat(wxname)
 
 def get_wechat_login() -> WeChatLogin:
     """获取微信实例
@@ -134,11 +49,7 @@ def get_wechat_subwin(wxname: str, who: str) -> Optional[Chat]:
         Chat实例或None
     """
     wx = get_wechat(wxname)
-    subwins = wx.GetAllSubWindow()
-    if targets := [i for i in subwins if i.who == who]:
-        return targets[0]
-    else:
-        return None
+    return subwin_index.get(wx, account_router.resolve_name(wxname), who)
 
 class WeChatService:
     _instance = None
@@ -160,13 +71,98 @@ class WeChatService:
         """发送消息"""
         try:
             wx = get_wechat(wxname)
-            restore_window(wx.core.HWND)
-            result = wx.SendMsg(msg=msg, who=who, clear=clear, at=at, exact=exact)
-            minimize_window(wx.core.HWND)
+            account = account_router.resolve_name(wxname)
+            # 目标聊天有已打开的子窗口时直接在子窗口发送，不占用主窗口
+            subwin = self._find_subwin(wx, account, who, exact) if who else None
+            if subwin is not None:
+                result = subwin.SendMsg(msg=msg, clear=clear, at=at)
+                return APIResponse(success=bool(result), message=result['message'], data=result['data'])
+            with window_manager.session(wx.core.HWND):
+                # 目标聊天已打开时跳过搜索切换，直接发送到当前聊天
+                if who and not self._switch_chat(wx, account, who, exact):
+                    return APIResponse(success=False, message=f'找不到聊天窗口：{who}')
+                result = wx.SendMsg(msg=msg, clear=clear, at=at)
             return APIResponse(success=bool(result), message=result['message'], data=result['data'])
+        except ChatNotFoundError:
+            raise
         except Exception as e:
             return APIResponse(success=False, message=str(e))
 
+    def send_batch(
+            self,
+            items: List[dict],
+            clear: bool = True,
+            wxname: Optional[str] = None
+        ) -> APIResponse:
+        """批量发送消息
+
+        按聊天对象分组（保持同一对象内的发送顺序），每个对象只切换一次聊天窗口，
+        整个批次只还原、最小化一次主窗口。限速由 rate_limiter.run_batch 在提交到执行通道前预约，
+        需要等待的消息在等待结束后单独提交，不在通道中等待
+
+        Args:
+            items: 消息列表，每项包含 who、msg、at、exact
+            clear: 发送前是否清空输入框
+            wxname: 微信客户端名称
+
+        Returns:
+            APIResponse: 每条消息的发送结果（与items顺序一致）
+        """
+        groups: Dict[Tuple[str, bool], List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault((item['who'], item.get('exact', False)), []).append(index)
+
+        results: List[Optional[dict]] = [None] * len(items)
+        try:
+            wx = get_wechat(wxname)
+        except Exception as e:
+            return APIResponse(success=False, message=str(e))
+
+        account = account_router.resolve_name(wxname)
+        with window_manager.session(wx.core.HWND):
+            for (who, exact), indexes in groups.items():
+                data = None
+                try:
+                    chatname = self._switch_chat(wx, account, who, exact)
+                    error = '找不到聊天窗口'
+                except ChatNotFoundError as e:
+                    chatname = None
+                    error, data = e.detail, {'suggestions': e.suggestions}
+                except Exception as e:
+                    chatname = None
+                    error = str(e)
+                if not chatname:
+                    for index in indexes:
+                        results[index] = {'index': index, 'who': who, 'success': False, 'message': error, 'data': data}
+                    continue
+
+                # 已切换到目标聊天，逐条发送到当前窗口
+                for index in indexes:
+                    item = items[index]
+                    try:
+                        result = wx.SendMsg(msg=item['msg'], clear=clear, at=item.get('at'))
+                        results[index] = {
+                            'index': index,
+                            'who': who,
+                            'success': bool(result),
+                            'message': result['message'],
+                            'data': result['data']
+                        }
+                    except Exception as e:
+                        results[index] = {'index': index, 'who': who, 'success': False, 'message': str(e), 'data': None}
+
+        success_count = sum(1 for i in results if i['success'])
+        return APIResponse(
+            success=success_count == len(items),
+            message=f'批量发送完成：成功{success_count}条，失败{len(items) - success_count}条',
+            data={
+                'total': len(items),
+                'success_count': success_count,
+                'chat_switches': len(groups),
+                'results': results
+            }
+        )
+
     def send_file(
             self,
             file_id: str,
@@ -182,18 +178,23 @@ class WeChatService:
             if not file_info:
                 return APIResponse(success=False, message="文件不存在")
             
-            # 检查文件是否存在
-            if not file_info.file_path or not os.path.exists(file_info.file_path):
+            # 以别名的文件名发送（硬链接到存储文件，不复制数据）
+            send_path = file_service.get_send_path(file_id)
+            if not send_path:
                 return APIResponse(success=False, message="文件路径不存在")
             
             # 发送文件
             wx = get_wechat(wxname)
 
-            restore_window(wx.core.HWND)
-
-            result = wx.SendFiles(filepath=file_info.file_path, who=who, exact=exact)
-
-            minimize_window(wx.core.HWND)
+            account = account_router.resolve_name(wxname)
+            subwin = self._find_subwin(wx, account, who, exact) if who else None
+            if subwin is not None:
+                result = subwin.SendFiles(filepath=send_path)
+            else:
+                with window_manager.session(wx.core.HWND):
+                    if who and not self._switch_chat(wx, account, who, exact):
+                        return APIResponse(success=False, message=f'找不到聊天窗口：{who}')
+                    result = wx.SendFiles(filepath=send_path)
             
             if result:
                 return APIResponse(
@@ -209,6 +210,8 @@ class WeChatService:
             else:
                 return APIResponse(success=False, message="文件发送失败")
                 
+        except ChatNotFoundError:
+            raise
         except Exception as e:
             return APIResponse(success=False, message=f"发送文件时发生错误: {str(e)}")
 
@@ -221,11 +224,13 @@ class WeChatService:
         """切换聊天窗口"""
         try:
             wx = get_wechat(wxname)
-            result = wx.ChatWith(who=who, exact=exact)
+            result = self._switch_chat(wx, account_router.resolve_name(wxname), who, exact)
             if result:
                 return APIResponse(success=True, message='主窗口聊天切换成功', data={'chatname': result})
             else:
                 return APIResponse(success=False, message='主窗口聊天切换失败')
+        except ChatNotFoundError:
+            raise
         except Exception as e:
             return APIResponse(success=False, message=str(e))
 
@@ -236,7 +241,7 @@ class WeChatService:
         """获取所有子窗口"""
         try:
             wx = get_wechat(wxname)
-            result = wx.GetAllSubWindow()
+            result = subwin_index.all(wx, account_router.resolve_name(wxname))
             data = [{'name': i.who, 'type': i.chat_type} for i in result]
             return APIResponse(success=True, message='', data=data)
         except Exception as e:
@@ -245,17 +250,24 @@ class WeChatService:
     def get_all_message(
             self,
             who: str,
+            since: Optional[str] = None,
             wxname: Optional[str] = None
         ) -> APIResponse:
-        """获取所有消息"""
+        """获取所有消息，传入上次返回的游标时只返回之后的新消息"""
         try:
             wx = get_wechat(wxname)
+            account = account_router.resolve_name(wxname)
             if who:
-                if not wx.ChatWith(who):
+                if not self._switch_chat(wx, account, who):
                     return APIResponse(success=False, message='找不到聊天窗口')
             result = wx.ChatInfo()
-            msgs = wx.GetAllMessage()
+            msgs, cursor, reset = message_cursors.slice(
+                account, result.get('chat_name') or who, wx.GetAllMessage(), since
+            )
             result['msg'] = [msg.info for msg in msgs]
+            result['cursor'] = cursor
+            result['cursor_reset'] = reset
+            message_store.add(account, result)
             return APIResponse(success=True, message='', data=result)
         except Exception as e:
             return APIResponse(success=False, message=str(e))
@@ -274,6 +286,7 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
+            active_chat.invalidate(account_router.resolve_name(wxname))
             result = wx.SendUrlCard(url=url, friends=friends, timeout=timeout)
             return APIResponse(success=bool(result), message=result['message'], data=result['data'])
         except Exception as e:
@@ -288,155 +301,150 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
-            if who in [i.who for i in wx.GetAllSubWindow()]:
+            account = account_router.resolve_name(wxname)
+            if subwin_index.get(wx, account, who) is not None:
                 return APIResponse(success=False, message='该聊天已监听中')
             wxapi = wx._api if hasattr(wx, '_api') else wx.core
+            active_chat.invalidate(account)
             subwin = wxapi.open_separate_window(who)
+            # 新打开了子窗口，下次访问时重新枚举
+            subwin_index.invalidate(account)
             if subwin is None:
                 return APIResponse(success=False, message='找不到聊天窗口')
             return APIResponse(success=True, message=f'{who} 聊天窗口已添加监听')
         except Exception as e:
             return APIResponse(success=False, message=str(e))
         
+    def _find_subwin(self, wx: WeChat, account: str, who: str, exact: bool = False) -> Optional[Chat]:
+        """查找聊天对象已打开的子窗口
+
+        子窗口按准确名称索引，非精确匹配且未命中时通过本地名称索引解析后再查找一次
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+            exact: 是否精确匹配
+
+        Returns:
+            Optional[Chat]: 子窗口，没有已打开的子窗口返回None
+        """
+        subwin = subwin_index.find(wx, account, who)
+        if subwin is None and not exact:
+            name, _ = contact_index.resolve(wx, account, who)
+            if name is not None and name != who:
+                subwin = subwin_index.find(wx, account, name)
+        return subwin
+
+    def _switch_chat(self, wx: WeChat, account: str, who: str, exact: bool = False) -> Optional[str]:
+        """解析聊天对象名称并将主窗口切换到该聊天
+
+        非精确匹配时先通过本地名称索引解析出准确名称，再进行切换
+
+        Args:
+            wx: 微信实例
+            account: 账号名称
+            who: 聊天对象
+            exact: 是否精确匹配
+
+        Returns:
+            Optional[str]: 当前聊天名称，切换失败返回None
+
+        Raises:
+            ChatNotFoundError: 无法从本地索引解析聊天对象（严格模式）
+        """
+        if not exact:
+            name, suggestions = contact_index.resolve(wx, account, who)
+            if name is not None:
+                who, exact = name, True
+            elif settings.wechat.strict_chat_resolution:
+                raise ChatNotFoundError(who, suggestions)
+        chatname = active_chat.ensure(wx, account, who, exact)
+        if chatname:
+            contact_index.add(account, chatname)
+        return chatname
+
     def get_next_new_message(
         self,
         filter_mute: bool = False,
         wxname: Optional[str] = None
     ) -> APIResponse:
-        """获取下一个新消息，并自动下载媒体文件和转换语音"""
-
-        recved_event = check_and_reset_wechat_event()
-        if not recved_event:
-            return APIResponse(success=True, message='', data={})
-    
+        """获取下一个新消息，登记媒体文件和语音（后台下载、转换）
+        
+        由新消息监听器在收到新消息事件后调用
+        """
         try:
             wx = get_wechat(wxname)
-            restore_window(wx.core.HWND)
-            result = wx.GetNextNewMessage(filter_mute=filter_mute)
-            
-            if result and 'msg' in result:
-                processed_messages = []
-                
-                for msg in result['msg']:
-                    msg_info = msg.info
-                    msg_class_name = msg.__class__.__name__
-
-                    if hasattr(msg, 'sender_remark'):
-                        msg_info.update({
-                            "sender_remark": msg.sender_remark
-                        })
-                    
-                    # 处理图片、视频（有 download 方法两个参数）
-                    is_media_message = any(media_type in msg_class_name for media_type in ['Image', 'Video'])
-                    
-                    if is_media_message and hasattr(msg, 'download'):
-                        # 创建临时目录
-                        temp_dir = tempfile.mkdtemp()
-
-                        try:
-                            # 下载文件到临时目录
-                            file_path = msg.download(dir_path=temp_dir, timeout=30)
-                            
-                            # 调用上传接口
-                            file_service = FileService()
-                            upload_result = file_service.upload_file_by_path(
-                                file_path=str(file_path),
-                                description=f"WeChat file from {msg_info.get('chat_name', 'unknown')}",
-                                uploader="wechat_bot"
-                            )
-                            
-                            # 更新消息信息，使用file_id作为文件名
-                            msg_info.update({
-                                "file_id": upload_result["file_id"],  # 使用file_id作为标识
-                                "file_info": upload_result,  # 保存完整的文件信息
-                                "download_success": True
-                            })
-                                
-                        except Exception as download_error:
-                            msg_info.update({
-                                "download_error": str(download_error),
-                                "download_success": False
-                            })
-                        finally:
-                            # 确保删除临时目录和文件
-                            shutil.rmtree(temp_dir, ignore_errors=True)
-
-                    # 文件下载处理方法（有 download 方法三个参数）
-                    elif 'File' in msg_class_name and hasattr(msg, 'download'):
-                        # 创建临时目录
-                        temp_dir = tempfile.mkdtemp()
-
-                        try:
-                            # 下载文件到临时目录
-                            file_path = msg.download(dir_path=temp_dir, force_click=False, timeout=30)
-                            
-                            # 调用上传接口
-                            file_service = FileService()
-                            upload_result = file_service.upload_file_by_path(
-                                file_path=str(file_path),
-                                description=f"WeChat file from {msg_info.get('chat_name', 'unknown')}",
-                                uploader="wechat_bot"
-                            )
-                            
-                            # 更新消息信息，使用file_id作为文件名
-                            msg_info.update({
-                                "file_id": upload_result["file_id"],  # 使用file_id作为标识
-                                "file_info": upload_result,  # 保存完整的文件信息
-                                "download_success": True
-                            })
-                        except Exception as download_error:
-                            msg_info.update({
-                                "download_error": str(download_error),
-                                "download_success": False
-                            })
-                        finally:
-                            # 确保删除临时目录和文件
-                            shutil.rmtree(temp_dir, ignore_errors=True)
-                        
-                    # 单独处理语音消息（有 to_text 方法）
-                    elif 'Voice' in msg_class_name and hasattr(msg, 'to_text'):
-                        try:
-                            # 转换语音为文本
-                            text_content = msg.to_text()
-                            
-                            # 添加语音转文本结果
-                            msg_info.update({
-                                "voice_to_text": text_content,
-                                "voice_convert_success": True
-                            })
-                            
-                        except Exception as voice_error:
-                            msg_info.update({
-                                "voice_to_text": "",
-                                "voice_convert_error": str(voice_error),
-                                "voice_convert_success": False
-                            })
-                    elif 'Link' in msg_class_name and hasattr(msg, 'get_url'):
-                        try:
-                            url_content = msg.get_url()
-                            msg_info.update({
-                                "url": url_content,
-                                "get_url_success": True
-                            })
-
-                        except Exception as url_error:
-                            msg_info.update({
-                                "url": "",
-                                "get_url_error": str(url_error),
-                                "get_url_success": False
-                            })
-                    
-                    processed_messages.append(msg_info)
-                
-                result['msg'] = processed_messages
+            account = account_router.resolve_name(wxname)
+            with window_manager.session(wx.core.HWND):
+                active_chat.invalidate(account)
+                result = wx.GetNextNewMessage(filter_mute=filter_mute)
+                if result and result.get('chat_name'):
+                    # GetNextNewMessage 会切换到有新消息的聊天
+                    active_chat.mark(account, result['chat_name'])
+                if result and 'msg' in result:
+                    result['msg'] = [self._process_message(msg, account, result.get('chat_name')) for msg in result['msg']]
                 
             return APIResponse(success=True, message='', data=result)
             
         except Exception as e:
             return APIResponse(success=False, message=str(e))
 
-        finally:
-            minimize_window(wx.core.HWND)
+    def _process_message(self, msg, account: str, chat_name: Optional[str] = None) -> dict:
+        """处理单条新消息：登记媒体文件和语音、获取链接
+
+        Args:
+            msg: 消息对象
+            account: 账号名称
+            chat_name: 消息所在聊天，媒体下载和语音转换时切换到该聊天，转换结果按它更新原消息
+
+        Returns:
+            dict: 消息信息
+        """
+        msg_info = msg.info
+        if chat_name:
+            msg_info.setdefault('chat_name', chat_name)
+        msg_class_name = msg.__class__.__name__
+
+        if hasattr(msg, 'sender_remark'):
+            msg_info.update({
+                "sender_remark": msg.sender_remark
+            })
+        
+        # 图片、视频、文件只登记，由媒体下载流水线在后台下载
+        media = media_pipeline.register(account, msg, msg_info)
+        if media is not None:
+            msg_info.update({
+                "media": media
+            })
+
+        # 语音消息登记后在后台转换，已转换过的直接使用缓存结果
+        elif 'Voice' in msg_class_name and hasattr(msg, 'to_text'):
+            voice = voice_transcriber.register(account, msg, msg_info)
+            msg_info.update({
+                "voice": voice
+            })
+            if voice["text"] is not None:
+                msg_info.update({
+                    "voice_to_text": voice["text"],
+                    "voice_convert_success": True
+                })
+        elif 'Link' in msg_class_name and hasattr(msg, 'get_url'):
+            try:
+                url_content = msg.get_url()
+                msg_info.update({
+                    "url": url_content,
+                    "get_url_success": True
+                })
+
+            except Exception as url_error:
+                msg_info.update({
+                    "url": "",
+                    "get_url_error": str(url_error),
+                    "get_url_success": False
+                })
+        
+        return msg_info
 
     def send_quote_by_id(
             self,
@@ -469,6 +477,7 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
+            active_chat.invalidate(account_router.resolve_name(wxname))
             result = wx.GetNewFriends(acceptable=acceptable)
             return APIResponse(success=True, message='', data=result)
         except Exception as e:
@@ -487,6 +496,7 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
+            active_chat.invalidate(account_router.resolve_name(wxname))
             result = wx.AcceptNewFriend(new_friend_id=new_friend_id, remark=remark, tags=tags)
             return APIResponse(success=bool(result), message=result['message'], data=result['data'])
         except Exception as e:
@@ -502,6 +512,7 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
+            active_chat.invalidate(account_router.resolve_name(wxname))
             result = wx.SwitchToChat()
             return APIResponse(success=bool(result), message=result['message'], data=result['data'])
         except Exception as e:
@@ -517,6 +528,7 @@ class WeChatService:
         
         try:
             wx = get_wechat(wxname)
+            active_chat.invalidate(account_router.resolve_name(wxname))
             result = wx.SwitchToContactPage()
             return APIResponse(success=bool(result), message=result['message'], data=result['data'])
         except Exception as e:
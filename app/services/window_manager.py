@@ -0,0 +1,144 @@
+"""
+微信窗口状态管理
+对每个窗口句柄的UI操作进行引用计数，连续的操作之间保持窗口还原状态，
+空闲一段时间后才最小化，减少窗口重绘并避免并发请求互相最小化窗口
+"""
+
+import ctypes
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from app.utils.config import settings
+
+# Windows API
+user32 = ctypes.WinDLL('user32', use_last_error=True)
+
+# 常量
+SW_SHOWMINIMIZED = 2   # 最小化
+SW_RESTORE = 9         # 还原
+
+def minimize_window(hwnd):
+    """最小化窗口"""
+    if not hwnd:
+        return False
+
+    # 参数1: HWND, 参数2: 显示命令
+    result = user32.ShowWindow(hwnd, SW_SHOWMINIMIZED)
+    return bool(result)
+
+def restore_window(hwnd):
+    """还原窗口（从最小化/最大化恢复）"""
+    if not hwnd:
+        return False
+
+    result = user32.ShowWindow(hwnd, SW_RESTORE)
+    return bool(result)
+
+
+class _WindowState:
+    """单个窗口的状态"""
+
+    def __init__(self) -> None:
+        self.refcount = 0
+        self.restored = False
+        self.timer: Optional[threading.Timer] = None
+        self.generation = 0
+
+
+class WindowStateManager:
+    """窗口状态管理器"""
+
+    def __init__(self, idle_delay: Optional[float] = None) -> None:
+        """初始化窗口状态管理器
+
+        Args:
+            idle_delay: 最后一个操作结束后等待多久再最小化窗口(秒)
+        """
+        self.idle_delay = settings.performance.window_idle_delay if idle_delay is None else idle_delay
+        self._states: Dict[int, _WindowState] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "restores": 0,
+            "minimizes": 0,
+            "restores_saved": 0,
+            "minimizes_saved": 0,
+        }
+
+    def acquire(self, hwnd: int) -> None:
+        """开始一个UI操作，必要时还原窗口
+
+        Args:
+            hwnd: 窗口句柄
+        """
+        if not hwnd:
+            return
+        with self._lock:
+            state = self._states.setdefault(hwnd, _WindowState())
+            state.refcount += 1
+            if state.timer is not None:
+                # 取消待执行的最小化，窗口保持还原状态
+                state.timer.cancel()
+                state.timer = None
+                self._stats["minimizes_saved"] += 1
+            if state.restored:
+                self._stats["restores_saved"] += 1
+                return
+            state.restored = True
+            self._stats["restores"] += 1
+        restore_window(hwnd)
+
+    def release(self, hwnd: int) -> None:
+        """结束一个UI操作，没有进行中的操作时延迟最小化窗口
+
+        Args:
+            hwnd: 窗口句柄
+        """
+        if not hwnd:
+            return
+        with self._lock:
+            state = self._states.get(hwnd)
+            if state is None or state.refcount == 0:
+                return
+            state.refcount -= 1
+            if state.refcount > 0:
+                self._stats["minimizes_saved"] += 1
+                return
+            state.generation += 1
+            timer = threading.Timer(self.idle_delay, self._minimize_if_idle, args=(hwnd, state.generation))
+            timer.daemon = True
+            state.timer = timer
+        timer.start()
+
+    @contextmanager
+    def session(self, hwnd: int) -> Iterator[None]:
+        """在UI操作期间保持窗口还原
+
+        Args:
+            hwnd: 窗口句柄
+        """
+        self.acquire(hwnd)
+        try:
+            yield
+        finally:
+            self.release(hwnd)
+
+    def stats(self) -> Dict[str, int]:
+        """获取窗口状态切换统计"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _minimize_if_idle(self, hwnd: int, generation: int) -> None:
+        """空闲计时结束后最小化窗口"""
+        with self._lock:
+            state = self._states.get(hwnd)
+            # 计时期间有新的操作开始（计时器已被取消或替换）则不最小化
+            if state is None or state.refcount > 0 or state.timer is None or state.generation != generation:
+                return
+            state.timer = None
+            state.restored = False
+            self._stats["minimizes"] += 1
+            # 持锁最小化，避免检查之后开始的操作在还原窗口后又被最小化
+            minimize_window(hwnd)
+
+
+window_manager = WindowStateManager()
@@ -9,6 +9,16 @@ class ServerConfig(BaseModel):
     port: int = 8000
     reload: bool = True
 
+class ResumableUploadConfig(BaseModel):
+    """分块续传上传配置模型"""
+    max_size: int = 2147483648
+    chunk_size: int = 4194304
+    max_chunk_size: int = 16777216
+    session_ttl: int = 86400
+    gc_interval: int = 600
+    max_open_sessions: int = 16
+    max_reserved_size: int = 8589934592
+
 class UploadConfig(BaseModel):
     """文件上传配置模型"""
     base_dir: str = "./uploads"
@@ -22,7 +32,10 @@ class UploadConfig(BaseModel):
         "application/msword",
         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     ]
-    chunk_size: int = 8192
+    chunk_size: int = 1048576
+    io_workers: int = 4
+    max_concurrent_uploads: int = 2
+    resumable: ResumableUploadConfig = Field(default_factory=ResumableUploadConfig)
 
 class SQLiteConfig(BaseModel):
     """SQLite配置模型"""
@@ -64,6 +77,82 @@ class WeChatConfig(BaseModel):
     listener_executor_workers: int = 4
     search_chat_timeout: int = 5
     note_load_timeout: int = 30
+    contact_index_ttl: int = 300
+    contact_miss_refresh_interval: int = 30
+    subwindow_index_ttl: int = 60
+    strict_chat_resolution: bool = True
+
+class WatcherConfig(BaseModel):
+    """新消息监听配置模型"""
+    wait_timeout: float = 1
+    queue_size: int = 1000
+    filter_mute: bool = False
+    max_wait_seconds: float = 60
+    dedup_size: int = 2000
+
+class StreamConfig(BaseModel):
+    """新消息推送配置模型"""
+    buffer_size: int = 100
+    drop_policy: Literal["oldest", "newest"] = "oldest"
+    keepalive: float = 15
+    replay_size: int = 500
+
+class OutboxConfig(BaseModel):
+    """发送任务队列配置模型"""
+    workers: int = 4
+    max_attempts: int = 3
+    retry_delay: float = 5
+    poll_interval: float = 5
+    drain_timeout: float = 30
+
+class IdempotencyConfig(BaseModel):
+    """幂等键配置模型"""
+    ttl: int = 86400
+    max_entries: int = 10000
+
+class MessageStoreConfig(BaseModel):
+    """消息存储配置模型"""
+    enabled: bool = True
+    batch_size: int = 200
+    flush_interval: float = 1
+    queue_size: int = 10000
+
+class MediaPolicyConfig(BaseModel):
+    """媒体下载策略配置模型"""
+    mode: Literal["eager", "lazy", "on_demand"] = "eager"
+    max_size: Optional[int] = None
+
+class MediaConfig(BaseModel):
+    """新消息媒体下载配置模型"""
+    workers: int = 2
+    download_timeout: int = 30
+    max_held_messages: int = 500
+    max_wait_seconds: float = 60
+    lazy_idle_seconds: float = 5
+    lazy_check_interval: float = 1
+    policies: Dict[str, MediaPolicyConfig] = {
+        "image": MediaPolicyConfig(mode="eager"),
+        "video": MediaPolicyConfig(mode="lazy"),
+        "file": MediaPolicyConfig(mode="eager", max_size=10485760),
+    }
+
+class WebhookTargetConfig(BaseModel):
+    """Webhook 目标配置模型"""
+    url: str
+    headers: Dict[str, str] = {}
+    batch_size: int = 20
+    batch_wait: float = 0.2
+    max_concurrency: int = 2
+    timeout: float = 10
+
+class WebhookConfig(BaseModel):
+    """Webhook 投递配置模型"""
+    enabled: bool = False
+    targets: List[WebhookTargetConfig] = []
+    max_attempts: int = 8
+    backoff_base: float = 1
+    backoff_max: float = 300
+    poll_interval: float = 5
 
 class StorageConfig(BaseModel):
     """存储配置模型"""
@@ -87,12 +176,34 @@ class APIConfig(BaseModel):
     redoc_url: str = "/redoc"
     openapi_url: str = "/openapi.json"
 
+class RateLimitConfig(BaseModel):
+    """发送限速配置模型（速率为0表示该级别不限速）"""
+    enabled: bool = False
+    global_per_minute: float = 0
+    global_burst: int = 10
+    account_per_minute: float = 60
+    account_burst: int = 10
+    recipient_per_minute: float = 20
+    recipient_burst: int = 5
+    max_wait: float = 300
+
+class CoalesceConfig(BaseModel):
+    """发送合并配置模型"""
+    enabled: bool = False
+    window_ms: float = 200
+    separator: str = "\n"
+    max_length: int = 2000
+
 class PerformanceConfig(BaseModel):
     """性能配置模型"""
     max_workers: int = 4
     timeout: int = 30
     retry_attempts: int = 3
     retry_delay: int = 1
+    window_idle_delay: float = 3
+    max_chat_streak: int = 5
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    coalesce: CoalesceConfig = Field(default_factory=CoalesceConfig)
 
 class Settings(BaseModel):
     """总配置模型"""
@@ -101,6 +212,13 @@ class Settings(BaseModel):
     upload: UploadConfig = Field(default_factory=UploadConfig)
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     wechat: WeChatConfig = Field(default_factory=WeChatConfig)
+    watcher: WatcherConfig = Field(default_factory=WatcherConfig)
+    stream: StreamConfig = Field(default_factory=StreamConfig)
+    message_store: MessageStoreConfig = Field(default_factory=MessageStoreConfig)
+    idempotency: IdempotencyConfig = Field(default_factory=IdempotencyConfig)
+    outbox: OutboxConfig = Field(default_factory=OutboxConfig)
+    media: MediaConfig = Field(default_factory=MediaConfig)
+    webhook: WebhookConfig = Field(default_factory=WebhookConfig)
     storage: StorageConfig = Field(default_factory=StorageConfig)
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
     auth: AuthConfig = Field(default_factory=AuthConfig)
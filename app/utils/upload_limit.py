@@ -0,0 +1,62 @@
+"""
+上传大小限制中间件
+纯 ASGI 中间件，只处理上传接口的 POST 请求，其他请求（包括 SSE 推送）原样透传，不缓冲响应；
+Content-Length 已超过限制时不接收请求体直接返回 413，
+没有 Content-Length（分块传输）时按实际接收的字节数计算，超出后停止接收并返回 413
+"""
+
+from typing import Iterable
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.models.response import APIResponse
+from app.utils.config import settings
+
+# multipart 请求中除文件内容外的额外开销（分隔符、表单字段等）上限
+MULTIPART_OVERHEAD = 64 * 1024
+
+TOO_LARGE_MESSAGE = "文件大小超过限制"
+
+
+class UploadSizeLimitMiddleware:
+    """上传请求体大小限制（上限为 upload.max_size 加 multipart 额外开销）"""
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]) -> None:
+        """初始化中间件
+
+        Args:
+            app: 下一层 ASGI 应用
+            paths: 需要限制的上传接口路径
+        """
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = settings.upload.max_size + MULTIPART_OVERHEAD
+        length = Headers(scope=scope).get("content-length")
+        if length and length.isdigit() and int(length) > max_body_size:
+            response = JSONResponse(
+                status_code=413,
+                content=APIResponse(success=False, message=TOO_LARGE_MESSAGE, data=None).model_dump()
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    # 解析请求体时抛出的 HTTPException 由异常处理器转换为统一格式的 413 响应
+                    raise HTTPException(status_code=413, detail=TOO_LARGE_MESSAGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
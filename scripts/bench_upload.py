@@ -0,0 +1,123 @@
+"""
+上传吞吐量基准测试
+对比旧的上传流程（检查大小、计算哈希、写入各读一遍，8KB 块）与 FileService.upload_file 的单遍流式上传。
+数据库和上传目录使用临时目录，不影响正式数据
+
+用法: python scripts/bench_upload.py --sizes 1,10,100,1024
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.datastructures import Headers, UploadFile  # noqa: E402
+from app.utils.config import settings  # noqa: E402
+
+LEGACY_CHUNK_SIZE = 8192
+
+
+def make_source(path: str, size: int) -> None:
+    """生成指定大小的随机内容文件"""
+    block = 1024 * 1024
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(block, remaining)
+            f.write(os.urandom(n))
+            remaining -= n
+
+
+def open_upload(path: str) -> UploadFile:
+    return UploadFile(
+        file=open(path, "rb"),
+        filename=os.path.basename(path),
+        headers=Headers({"content-type": "application/octet-stream"})
+    )
+
+
+def legacy_upload(upload: UploadFile, target_dir: str) -> str:
+    """旧流程：检查大小、计算哈希、写入文件各读一遍"""
+    size = 0
+    while chunk := upload.file.read(LEGACY_CHUNK_SIZE):
+        size += len(chunk)
+    upload.file.seek(0)
+
+    sha256 = hashlib.sha256()
+    while chunk := upload.file.read(LEGACY_CHUNK_SIZE):
+        sha256.update(chunk)
+    upload.file.seek(0)
+    file_hash = sha256.hexdigest()
+
+    sub_dir = os.path.join(target_dir, file_hash)
+    os.makedirs(sub_dir, exist_ok=True)
+    with open(os.path.join(sub_dir, upload.filename), "wb") as f:
+        while chunk := upload.file.read(LEGACY_CHUNK_SIZE):
+            f.write(chunk)
+    return file_hash
+
+
+async def run(service, work_dir: str, sizes) -> None:
+    """在同一个事件循环中依次测试各个文件大小"""
+    # 预热（线程池、数据库连接等一次性开销不计入结果）
+    warmup = os.path.join(work_dir, "warmup.bin")
+    make_source(warmup, 1024)
+    upload = open_upload(warmup)
+    await service.upload_file(upload)
+    upload.file.close()
+
+    print(f"{'大小(MB)':>10} {'旧流程(MB/s)':>14} {'单遍流式(MB/s)':>16} {'提升':>8}")
+    for size_mb in sizes:
+        size = int(size_mb * 1024 * 1024)
+        source = os.path.join(work_dir, f"source_{size_mb:g}mb.bin")
+        make_source(source, size)
+
+        upload = open_upload(source)
+        start = time.perf_counter()
+        legacy_upload(upload, os.path.join(work_dir, "legacy"))
+        legacy = time.perf_counter() - start
+        upload.file.close()
+
+        # 单遍流式上传的时间包含写入数据库记录
+        upload = open_upload(source)
+        start = time.perf_counter()
+        await service.upload_file(upload)
+        streaming = time.perf_counter() - start
+        upload.file.close()
+
+        os.remove(source)
+        shutil.rmtree(os.path.join(work_dir, "legacy"), ignore_errors=True)
+        print(
+            f"{size_mb:>10g} {size_mb / legacy:>14.1f} {size_mb / streaming:>16.1f} "
+            f"{legacy / streaming:>7.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传吞吐量基准测试")
+    parser.add_argument("--sizes", default="1,10,100,1024", help="文件大小列表(MB)，逗号分隔")
+    parser.add_argument("--dir", default=None, help="测试目录（应与上传目录在同一磁盘），默认使用系统临时目录")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_upload_", dir=args.dir)
+    settings.upload.base_dir = os.path.join(work_dir, "uploads")
+    settings.upload.max_size = 1 << 62
+    settings.upload.allowed_types = []
+    settings.database.sqlite.path = os.path.join(work_dir, "bench.db")
+
+    from app.services.file_service import FileService
+    try:
+        sizes = [float(i) for i in args.sizes.split(",") if i.strip()]
+        asyncio.run(run(FileService(), work_dir, sizes))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
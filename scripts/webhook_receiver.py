@@ -0,0 +1,58 @@
+"""
+Webhook 桩接收端
+用于本地调试 Webhook 投递：打印收到的每一批消息，可按比例返回 500 以验证重试与死信
+"""
+
+import argparse
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if random.random() < fail_rate:
+                self.send_response(500)
+                self.end_headers()
+                print(f"[模拟失败] {len(body)} 字节")
+                return
+            try:
+                messages = json.loads(body).get("messages", [])
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            print(f"收到 {len(messages)} 条消息")
+            for msg in messages:
+                print(f"  [{msg.get('account')}] {msg.get('chat_name')}: {msg.get('content')}")
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook 桩接收端")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 500 的比例 (0~1)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.fail_rate))
+    print(f"Webhook 桩接收端已启动: http://{args.host}:{args.port}/webhook")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+测试环境
+微信自动化依赖（wxauto、pywin32）只能在 Windows 上使用，测试中用假的微信客户端代替，
+数据库、上传目录和日志写到临时目录
+"""
+
+import ctypes
+import os
+import sys
+import tempfile
+import threading
+import types
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 配置文件按当前目录读取
+os.chdir(ROOT)
+
+from app.utils.config import settings
+
+_TMP = tempfile.mkdtemp(prefix="wxauto-api-test-")
+settings.database.sqlite.path = os.path.join(_TMP, "wxauto.db")
+settings.upload.base_dir = os.path.join(_TMP, "uploads")
+settings.logging.file = os.path.join(_TMP, "wxauto_api.log")
+settings.message_store.enabled = False
+
+
+class FakeCore:
+    """假的窗口核心对象"""
+
+    def __init__(self, hwnd: int) -> None:
+        self.HWND = hwnd
+
+
+class FakeWeChat:
+    """假的微信客户端，记录收到的调用和执行调用的线程"""
+
+    def __init__(self, nickname: str = "tester", hwnd: int = 1) -> None:
+        self.nickname = nickname
+        self.core = FakeCore(hwnd)
+        self.current: Optional[str] = None
+        self.sent: List[Dict[str, Any]] = []
+        self.calls: List[str] = []
+        self.threads: List[str] = []
+
+    def _record(self, name: str) -> None:
+        self.calls.append(name)
+        self.threads.append(threading.current_thread().name)
+
+    def ChatWith(self, who: str, exact: bool = False) -> str:
+        self._record(f"ChatWith:{who}")
+        self.current = who
+        return who
+
+    def ChatInfo(self) -> Dict[str, Any]:
+        return {"chat_name": self.current}
+
+    def SendMsg(self, msg: str, clear: bool = True, at: Any = None) -> Dict[str, Any]:
+        self._record(f"SendMsg:{msg}")
+        self.sent.append({"who": self.current, "msg": msg})
+        return {"status": "成功", "message": "", "data": None}
+
+    def GetAllSubWindow(self) -> List[Any]:
+        return []
+
+    def GetSession(self) -> List[Any]:
+        return []
+
+    def StopListening(self) -> None:
+        pass
+
+
+class FakeDLLFunction:
+    """假的 Windows API 函数，可设置 argtypes/restype，调用时返回成功"""
+
+    def __call__(self, *args: Any) -> int:
+        return 1
+
+
+class FakeDLL:
+    """假的 Windows DLL"""
+
+    def __init__(self, name: str, use_last_error: bool = False) -> None:
+        self.name = name
+
+    def __getattr__(self, name: str) -> FakeDLLFunction:
+        function = FakeDLLFunction()
+        setattr(self, name, function)
+        return function
+
+
+class FakeWeChatLogin:
+    """假的微信登录窗口"""
+
+    def ClearHint(self) -> None:
+        pass
+
+    def Login(self) -> bool:
+        return True
+
+
+def _install_fakes() -> None:
+    """安装 Windows 专用模块的替身"""
+    pythoncom = types.ModuleType("pythoncom")
+    # 记录初始化过COM的线程
+    pythoncom.initialized = set()
+    pythoncom.CoInitialize = lambda: pythoncom.initialized.add(threading.get_ident())
+    pythoncom.CoUninitialize = lambda: pythoncom.initialized.discard(threading.get_ident())
+    sys.modules.setdefault("pythoncom", pythoncom)
+
+    win32gui = types.ModuleType("win32gui")
+    win32gui.IsWindow = lambda hwnd: bool(hwnd)
+    win32gui.EnumWindows = lambda callback, extra: None
+    win32gui.GetClassName = lambda hwnd: ""
+    sys.modules.setdefault("win32gui", win32gui)
+
+    wxauto = types.ModuleType("wxauto")
+    wxauto.WeChat = FakeWeChat
+    wxauto.Chat = type("Chat", (), {})
+    wxauto.WeChatLogin = FakeWeChatLogin
+    wxauto.get_wx_clients = lambda: []
+    wxauto.msgs = types.SimpleNamespace(base=types.SimpleNamespace(HumanMessage=type("HumanMessage", (), {})))
+    sys.modules.setdefault("wxauto", wxauto)
+
+    if not hasattr(ctypes, "WinDLL"):
+        ctypes.WinDLL = FakeDLL
+
+
+if sys.platform != "win32":
+    _install_fakes()
+
+
+@pytest.fixture
+def fake_wechat(monkeypatch):
+    """登录一个假的微信账号，测试结束后停止该账号的执行通道"""
+    from app.services import account_router as account_router_module
+    from app.services.account_router import account_router
+    from app.services.active_chat import active_chat
+    from app.services.init import WxClient
+
+    wx = FakeWeChat()
+    WxClient[wx.nickname] = wx
+    # 执行通道启动时重新获取账号实例，返回同一个假客户端
+    monkeypatch.setattr(account_router_module, "WeChat", lambda nickname=None: wx)
+    active_chat.invalidate(wx.nickname)
+    yield wx
+    WxClient.pop(wx.nickname, None)
+    active_chat.invalidate(wx.nickname)
+    account_router.stop(timeout=5)
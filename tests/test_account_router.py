@@ -0,0 +1,34 @@
+import asyncio
+
+from app.api.v1 import chat, wechat
+from app.models.request.chat import SendMessageRequest
+from app.models.request.wechat import LoginRequest, SendMessageRequest as WeChatSendRequest
+from app.services.chat_service import ChatService
+from app.services.wechat_service import WeChatService
+
+
+def test_chat_send_route_runs_on_account_lane(fake_wechat):
+    request = SendMessageRequest(who="张三", msg="你好", wxname=fake_wechat.nickname)
+
+    response = asyncio.run(chat.send_message(request, service=ChatService(), idempotency_key=None))
+
+    assert response.success, response.message
+    assert fake_wechat.sent == [{"who": "张三", "msg": "你好"}]
+    assert set(fake_wechat.threads) == {f"wechat-ui-{fake_wechat.nickname}"}
+
+
+def test_wechat_send_route_passes_wxname_to_service(fake_wechat):
+    request = WeChatSendRequest(who="张三", msg="你好", exact=True, wxname=fake_wechat.nickname)
+
+    response = asyncio.run(wechat.send_message(request, service=WeChatService(), idempotency_key=None))
+
+    assert response.success, response.message
+    assert fake_wechat.sent == [{"who": "张三", "msg": "你好"}]
+
+
+def test_login_route_does_not_need_a_known_account(fake_wechat):
+    request = LoginRequest(wxname="尚未登录的账号")
+
+    response = asyncio.run(wechat.login(request, service=WeChatService()))
+
+    assert response.success, response.message
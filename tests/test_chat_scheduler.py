@@ -0,0 +1,56 @@
+from app.services.chat_scheduler import ChatScheduler
+
+
+def drain(scheduler):
+    return [scheduler.get() for _ in range(scheduler.qsize())]
+
+
+def test_lower_priority_value_runs_first_and_ties_keep_submit_order():
+    scheduler = ChatScheduler()
+    scheduler.put(20, None, "bulk")
+    scheduler.put(10, None, "normal-1")
+    scheduler.put(0, None, "interactive")
+    scheduler.put(10, None, "normal-2")
+
+    assert drain(scheduler) == ["interactive", "normal-1", "normal-2", "bulk"]
+
+
+def test_operations_for_the_current_chat_run_together():
+    scheduler = ChatScheduler()
+    scheduler.put(10, "A", "A1")
+    scheduler.put(10, "B", "B1")
+    scheduler.put(10, "A", "A2")
+    scheduler.put(10, "B", "B2")
+    scheduler.put(10, "A", "A3")
+
+    assert drain(scheduler) == ["A1", "A2", "A3", "B1", "B2"]
+    assert scheduler.stats()["switches_saved"] == 2
+
+
+def test_grouping_never_jumps_a_higher_priority():
+    scheduler = ChatScheduler()
+    scheduler.put(10, "A", "A1")
+    scheduler.put(0, "B", "B1")
+    scheduler.put(10, "A", "A2")
+
+    assert drain(scheduler) == ["B1", "A1", "A2"]
+
+
+def test_max_streak_lets_other_chats_run():
+    scheduler = ChatScheduler(max_streak=1)
+    scheduler.put(10, "A", "A1")
+    scheduler.put(10, "B", "B1")
+    scheduler.put(10, "A", "A2")
+    scheduler.put(10, "A", "A3")
+
+    assert drain(scheduler) == ["A1", "A2", "B1", "A3"]
+
+
+def test_operations_without_a_chat_do_not_break_the_group():
+    scheduler = ChatScheduler()
+    scheduler.put(10, "A", "A1")
+    scheduler.put(10, None, "any")
+    scheduler.put(10, "B", "B1")
+    scheduler.put(10, "A", "A2")
+
+    assert drain(scheduler) == ["A1", "A2", "any", "B1"]
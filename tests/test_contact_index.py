@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app.api.v1 import wechat
+from app.models.request.wechat import SendMessageRequest
+from app.services.contact_index import ChatNotFoundError, ContactIndex, contact_index
+from app.services.wechat_service import WeChatService
+
+
+def make_index(*names):
+    index = ContactIndex(ttl=3600, miss_refresh_interval=3600)
+    for name in names:
+        index.add("tester", name)
+    return index
+
+
+def test_only_exact_names_resolve():
+    index = make_index("张伟", "李雷", "Zhang Wei")
+
+    assert index.lookup("tester", "张伟") == ("张伟", [])
+    assert index.lookup("tester", " zhang wei ") == ("Zhang Wei", [])
+
+
+def test_prefix_and_similar_names_are_only_suggestions():
+    index = make_index("Zhang Wei", "李雷")
+
+    assert index.lookup("tester", "Zhang") == (None, ["Zhang Wei"])
+    assert index.lookup("tester", "李雷雷") == (None, ["李雷"])
+
+
+def test_guessed_name_is_not_sent_to(fake_wechat):
+    contact_index.add(fake_wechat.nickname, "Zhang Wei")
+    request = SendMessageRequest(who="Zhang", msg="你好", wxname=fake_wechat.nickname)
+
+    with pytest.raises(ChatNotFoundError) as info:
+        asyncio.run(wechat.send_message(request, service=WeChatService(), idempotency_key=None))
+
+    assert info.value.status_code == 409
+    assert info.value.suggestions == ["Zhang Wei"]
+    assert fake_wechat.sent == []
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from app.services.file_service import FileService
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_each_upload_of_the_same_file_gets_its_own_reference(tmp_path):
+    service = FileService()
+    data = os.urandom(1024)
+    first = service.upload_file_by_path(write(tmp_path, "a.bin", data), uploader="alice")
+    second = service.upload_file_by_path(write(tmp_path, "a.bin", data), uploader="alice")
+
+    assert first["file_id"] != second["file_id"]
+    assert service.delete_file(first["file_id"])
+
+    remaining = service.get_file(second["file_id"])
+    assert remaining is not None
+    assert os.path.exists(remaining.file_path)
+
+    assert service.delete_file(second["file_id"])
+    assert not os.path.exists(remaining.file_path)
+
+
+def test_failed_registration_keeps_the_source_file(tmp_path, monkeypatch):
+    service = FileService()
+    source = write(tmp_path, "b.bin", os.urandom(1024))
+    insert = service.db.insert
+
+    def failing_insert(table, data):
+        if table == "file_aliases":
+            raise RuntimeError("disk full")
+        return insert(table, data)
+
+    monkeypatch.setattr(service.db, "insert", failing_insert)
+    with pytest.raises(RuntimeError):
+        service.upload_file_by_path(source, move=True)
+    monkeypatch.undo()
+
+    assert os.path.exists(source)
+    result = service.upload_file_by_path(source, move=True)
+    assert result["is_new"]
+    assert not os.path.exists(source)
+    assert os.path.exists(result["file_path"])
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+from app.services.account_router import account_router
+from app.services.file_service import FileService
+from app.services.media_pipeline import media_pipeline
+
+
+class VideoMessage:
+    def __init__(self, msg_id):
+        self.hash = msg_id
+        self.info = {"id": msg_id, "type": "video", "chat_name": "张三"}
+        self.downloads = 0
+
+    def download(self, dir_path, timeout=None):
+        self.downloads += 1
+        path = os.path.join(dir_path, f"{self.hash}.mp4")
+        with open(path, "wb") as f:
+            f.write(os.urandom(256))
+        return path
+
+
+class ImageMessage(VideoMessage):
+    pass
+
+
+def wait_status(media_id, *statuses):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        row = media_pipeline.get(media_id)
+        if row["status"] in statuses:
+            return row
+        time.sleep(0.02)
+    raise AssertionError(f"status is still {row['status']}")
+
+
+def test_lazy_media_waits_until_the_lane_is_idle(fake_wechat, monkeypatch):
+    account = fake_wechat.nickname
+    msg = VideoMessage("video-1")
+    media = media_pipeline.register(account, msg, dict(msg.info))
+    assert media["status"] == "deferred"
+
+    # 通道忙时不下载
+    release = threading.Event()
+    account_router.submit(account, release.wait)
+    monkeypatch.setattr(media_pipeline.config, "lazy_idle_seconds", 0.05)
+    media_pipeline._schedule_lazy()
+    assert media_pipeline.get(media["id"])["status"] == "deferred"
+    assert msg.downloads == 0
+
+    release.set()
+    time.sleep(0.1)
+    media_pipeline._schedule_lazy()
+    row = wait_status(media["id"], "done", "failed")
+    assert row["status"] == "done", row["error"]
+    assert msg.downloads == 1
+
+
+def test_requesting_deferred_media_downloads_it(fake_wechat):
+    msg = VideoMessage("video-2")
+    media = media_pipeline.register(fake_wechat.nickname, msg, dict(msg.info))
+    media_pipeline.request(media["id"], retry=False)
+    assert wait_status(media["id"], "done", "failed")["status"] == "done"
+
+
+def test_failed_upload_keeps_the_download_for_retry(fake_wechat, monkeypatch):
+    upload = FileService.upload_file_by_path
+
+    def failing_upload(self, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(FileService, "upload_file_by_path", failing_upload)
+    msg = ImageMessage("image-1")
+    media = media_pipeline.register(fake_wechat.nickname, msg, dict(msg.info))
+    assert wait_status(media["id"], "failed")["error"] == "disk full"
+
+    row = media_pipeline.db.get_by_id("media_downloads", media["id"])
+    assert os.path.exists(row["staged_path"])
+
+    monkeypatch.setattr(FileService, "upload_file_by_path", upload)
+    media_pipeline.request(media["id"])
+    done = wait_status(media["id"], "done", "failed")
+    assert done["status"] == "done", done["error"]
+    assert msg.downloads == 1
+    assert not os.path.exists(row["staged_dir"])
+    assert os.path.exists(done["file_info"]["file_path"])
@@ -0,0 +1,77 @@
+import asyncio
+
+from app.services.message_broker import DROP_NEWEST, DROP_OLDEST, MessageBroker, Subscription
+
+
+def batch(chat_name, *msgs):
+    return {"chat_name": chat_name, "msg": [{"id": content, "type": msg_type, "content": content} for msg_type, content in msgs]}
+
+
+def drain(subscription):
+    return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+
+
+def run(scenario):
+    async def main():
+        broker = MessageBroker()
+        broker.start(asyncio.get_running_loop())
+        return await scenario(broker)
+
+    return asyncio.run(main())
+
+
+def test_each_subscriber_gets_the_messages_matching_its_filters():
+    async def scenario(broker):
+        everything = broker.subscribe()
+        zhang = broker.subscribe(chat_names=["张三"])
+        images = broker.subscribe(msg_types=["image"])
+        other_account = broker.subscribe(accounts=["other"])
+
+        broker.publish("tester", batch("张三", ("text", "a"), ("image", "b")))
+        broker.publish("tester", batch("李四", ("image", "c")))
+        await asyncio.sleep(0)
+        return [[item["content"] for item in drain(s)] for s in (everything, zhang, images, other_account)]
+
+    assert run(scenario) == [["a", "b", "c"], ["a", "b"], ["b", "c"], []]
+
+
+def test_reconnect_with_last_event_id_replays_missed_messages():
+    async def scenario(broker):
+        first = broker.subscribe(chat_names=["张三"])
+        broker.publish("tester", batch("张三", ("text", "a")))
+        await asyncio.sleep(0)
+        [received] = drain(first)
+        broker.unsubscribe(first)
+
+        # 断线期间的消息
+        broker.publish("tester", batch("张三", ("text", "b")))
+        broker.publish("tester", batch("李四", ("text", "x")))
+        broker.publish("tester", batch("张三", ("text", "c")))
+        await asyncio.sleep(0)
+
+        resumed = broker.subscribe(chat_names=["张三"], last_event_id=received["seq"])
+        fresh = broker.subscribe(chat_names=["张三"])
+        broker.publish("tester", batch("张三", ("text", "d")))
+        await asyncio.sleep(0)
+        return drain(resumed), drain(fresh), broker.stats()
+
+    resumed, fresh, stats = run(scenario)
+    assert [item["content"] for item in resumed] == ["b", "c", "d"]
+    assert [item["seq"] for item in resumed] == sorted(item["seq"] for item in resumed)
+    assert [item["content"] for item in fresh] == ["d"]
+    assert stats["replayed"] == 2
+
+
+def test_full_buffer_drops_by_policy():
+    async def scenario():
+        oldest = Subscription(buffer_size=2, drop_policy=DROP_OLDEST)
+        newest = Subscription(buffer_size=2, drop_policy=DROP_NEWEST)
+        for content in ("a", "b", "c"):
+            oldest.offer({"content": content})
+            newest.offer({"content": content})
+        return drain(oldest), drain(newest), oldest.dropped, newest.dropped
+
+    oldest, newest, oldest_dropped, newest_dropped = asyncio.run(scenario())
+    assert [item["content"] for item in oldest] == ["b", "c"]
+    assert [item["content"] for item in newest] == ["a", "b"]
+    assert oldest_dropped == newest_dropped == 1
@@ -0,0 +1,33 @@
+from app.services.message_cursor import MessageCursors
+
+
+class Message:
+    def __init__(self, msg_id):
+        self.id = msg_id
+
+
+def messages(*ids):
+    return [Message(i) for i in ids]
+
+
+def test_cursor_resumes_after_the_last_returned_message():
+    cursors = MessageCursors()
+    msgs, cursor, reset = cursors.slice("tester", "张三", messages("1", "2"))
+    assert [m.id for m in msgs] == ["1", "2"]
+    assert cursor == "2" and not reset
+
+    msgs, cursor, reset = cursors.slice("tester", "张三", messages("1", "2", "3", "4"), since=cursor)
+    assert [m.id for m in msgs] == ["3", "4"]
+    assert cursor == "4" and not reset
+
+    msgs, cursor, reset = cursors.slice("tester", "张三", messages("1", "2", "3", "4"), since=cursor)
+    assert msgs == [] and cursor == "4"
+
+
+def test_unknown_cursor_returns_everything_and_reports_a_reset():
+    cursors = MessageCursors()
+    msgs, cursor, reset = cursors.slice("tester", "张三", messages("7", "8"), since="2")
+    assert [m.id for m in msgs] == ["7", "8"]
+    assert cursor == "8"
+    assert reset
+    assert cursors.stats()["resets"] == 1
@@ -0,0 +1,99 @@
+import asyncio
+import queue
+
+from app.services.message_broker import MessageBroker
+from app.services.message_watcher import EventSource, MessageWatcher
+
+
+class FakeEventSource(EventSource):
+    """测试中手动触发的新消息事件"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.closed = False
+
+    def fire(self):
+        self.events.put(True)
+
+    def wait(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFetch:
+    """按顺序返回预设的新消息，取完后返回空"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, wxname, filter_mute=False):
+        self.calls.append(wxname)
+        return self.results.pop(0) if self.results else {}
+
+
+def batch(chat_name, *msg_ids):
+    return {"chat_name": chat_name, "msg": [{"id": i, "type": "text", "content": i} for i in msg_ids]}
+
+
+def contents(result):
+    return [msg["content"] for msg in result.get("msg", [])]
+
+
+def test_repeated_messages_are_queued_once(fake_wechat):
+    source = FakeEventSource()
+    fetch = FakeFetch(batch("张三", "m1", "m2"), {}, batch("张三", "m2", "m3"), {}, batch("张三", "m1"))
+    watcher = MessageWatcher(source_factory=lambda: source, fetch=fetch, wait_timeout=0.05)
+
+    async def scenario():
+        watcher.start(asyncio.get_running_loop())
+        try:
+            source.fire()
+            first = await watcher.get(wait_seconds=5)
+            source.fire()
+            second = await watcher.get(wait_seconds=5)
+            source.fire()
+            third = await watcher.get(wait_seconds=0.3)
+        finally:
+            watcher.stop(timeout=5)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert contents(first) == ["m1", "m2"]
+    assert contents(second) == ["m3"]
+    assert third == {}
+    assert source.closed
+    assert set(fetch.calls) == {fake_wechat.nickname}
+    stats = watcher.stats()
+    assert stats["events"] == 3
+    assert stats["duplicates"] == 2
+
+
+def test_same_id_in_another_chat_is_not_a_duplicate():
+    watcher = MessageWatcher(source_factory=FakeEventSource, fetch=FakeFetch())
+    watcher.put("tester", batch("张三", "m1"))
+    watcher.put("tester", batch("李四", "m1"))
+    watcher.put("tester", batch("张三", "m1"))
+
+    assert watcher.stats()["queued"] == {"tester": 2}
+
+
+def test_listeners_receive_only_new_messages():
+    async def scenario():
+        broker = MessageBroker()
+        broker.start(asyncio.get_running_loop())
+        subscription = broker.subscribe()
+        watcher = MessageWatcher(source_factory=FakeEventSource, fetch=FakeFetch())
+        watcher.add_listener(broker.publish)
+        watcher.put("tester", batch("张三", "m1", "m2"))
+        watcher.put("tester", batch("张三", "m2", "m3"))
+        await asyncio.sleep(0)
+        return [subscription.queue.get_nowait()["content"] for _ in range(subscription.queue.qsize())]
+
+    assert asyncio.run(scenario()) == ["m1", "m2", "m3"]
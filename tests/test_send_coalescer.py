@@ -0,0 +1,47 @@
+import asyncio
+
+from app.models.response import APIResponse
+from app.services.send_coalescer import SendCoalescer
+from app.utils.config import CoalesceConfig
+
+
+def test_oversized_message_is_sent_after_pending_batch():
+    coalescer = SendCoalescer(CoalesceConfig(enabled=True, window_ms=50, separator="|", max_length=10))
+    sent = []
+
+    async def send(msg):
+        sent.append(msg)
+        await asyncio.sleep(0.01)
+        return APIResponse(success=True, message="", data=None)
+
+    async def main():
+        first = asyncio.create_task(coalescer.run("key", "a", send))
+        second = asyncio.create_task(coalescer.run("key", "b", send))
+        await asyncio.sleep(0)
+        oversized = asyncio.create_task(coalescer.run("key", "x" * 10, send))
+        third = asyncio.create_task(coalescer.run("key", "c", send))
+        return await asyncio.gather(first, second, oversized, third)
+
+    results = asyncio.run(main())
+
+    assert sent == ["a|b", "x" * 10, "c"]
+    assert [result.data and result.data.get("coalesced") for result in results] == [2, 2, None, None]
+
+
+def test_messages_for_other_keys_are_not_delayed():
+    coalescer = SendCoalescer(CoalesceConfig(enabled=True, window_ms=50, separator="|", max_length=10))
+    sent = []
+
+    async def send(msg):
+        sent.append(msg)
+        return APIResponse(success=True, message="", data=None)
+
+    async def main():
+        pending = asyncio.create_task(coalescer.run("a", "1", send))
+        await asyncio.sleep(0)
+        await coalescer.run("b", "y" * 10, send)
+        await pending
+
+    asyncio.run(main())
+
+    assert sent == ["y" * 10, "1"]
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pythoncom
+import pytest
+
+from app.services.ui_executor import PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, UIExecutor
+from conftest import FakeWeChat
+
+
+@pytest.fixture
+def executor():
+    executor = UIExecutor(name="wechat-ui-test")
+    yield executor
+    executor.stop(timeout=5)
+
+
+def block(executor):
+    """让工作线程停在一个操作上，之后提交的操作都在队列中排队"""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    executor.submit(blocker)
+    assert started.wait(5)
+    return release
+
+
+def test_queued_operations_run_by_priority(executor):
+    wx = FakeWeChat()
+    release = block(executor)
+    futures = [
+        executor.submit(wx.SendMsg, "bulk", priority=PRIORITY_BULK),
+        executor.submit(wx.SendMsg, "normal", priority=PRIORITY_NORMAL),
+        executor.submit(wx.SendMsg, "interactive", priority=PRIORITY_INTERACTIVE),
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+
+    assert [item["msg"] for item in wx.sent] == ["interactive", "normal", "bulk"]
+
+
+def test_operations_run_on_one_com_initialized_thread(executor):
+    wx = FakeWeChat()
+
+    def com_ready():
+        return threading.get_ident() in pythoncom.initialized
+
+    assert executor.submit(com_ready).result(5)
+    for who in ("A", "B", "C"):
+        executor.submit(wx.ChatWith, who).result(5)
+
+    assert set(wx.threads) == {"wechat-ui-test"}
+    ident = executor._thread.ident
+    executor.stop(timeout=5)
+    assert ident not in pythoncom.initialized
+
+
+def test_operations_for_the_same_chat_are_grouped(executor):
+    wx = FakeWeChat()
+    release = block(executor)
+    futures = [
+        executor.submit(wx.ChatWith, who, chat_key=who)
+        for who in ("A", "B", "A", "B")
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+
+    assert wx.calls == ["ChatWith:A", "ChatWith:A", "ChatWith:B", "ChatWith:B"]
+
+
+def test_errors_are_returned_to_the_caller(executor):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        executor.submit(fail).result(5)
+    assert executor.submit(lambda: "ok").result(5) == "ok"
+
+    stats = executor.stats()
+    assert stats["failed"] == 1
+    assert stats["completed"] == 1
+
+
+def test_idle_seconds_counts_from_the_last_finished_operation(executor):
+    release = block(executor)
+    executor.submit(lambda: None)
+    assert executor.idle_seconds() == 0
+
+    release.set()
+    deadline = time.time() + 5
+    while executor.idle_seconds() == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert executor.idle_seconds() > 0
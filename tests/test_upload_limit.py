@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.config import settings
+
+client = TestClient(app)
+headers = {"Authorization": f"Bearer {settings.auth.token}"}
+
+
+def multipart(size):
+    boundary = "boundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    return boundary, head + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+
+
+def chunked(body, size=8192):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_chunked_upload_without_content_length_is_limited(monkeypatch):
+    monkeypatch.setattr(settings.upload, "max_size", 1024)
+    boundary, body = multipart(200 * 1024)
+
+    response = client.post(
+        "/api/v1/files/upload",
+        content=chunked(body),
+        headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+
+    assert response.status_code == 413
+    assert response.json()["success"] is False
+
+
+def test_declared_oversized_upload_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings.upload, "max_size", 1024)
+    boundary, body = multipart(200 * 1024)
+
+    response = client.post(
+        "/api/v1/files/upload",
+        content=body,
+        headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+
+    assert response.status_code == 413
+
+
+def test_small_chunked_upload_passes():
+    boundary, body = multipart(1024)
+
+    response = client.post(
+        "/api/v1/files/upload",
+        content=chunked(body, 256),
+        headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["file_size"] == 1024
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from app.services.message_broker import flatten_messages
+from app.services.message_store import message_store
+from app.services.voice_transcriber import voice_transcriber
+
+
+class VoiceMessage:
+    def __init__(self, msg_id):
+        self.hash = msg_id
+        self.info = {"id": msg_id, "hash": msg_id, "type": "voice", "content": "[语音]3秒", "chat_name": "张三"}
+
+    def to_text(self):
+        return "晚上一起吃饭"
+
+
+def test_transcription_updates_stored_message_and_notifies_listeners(fake_wechat):
+    account = fake_wechat.nickname
+    msg = VoiceMessage("voice-1")
+    message_store._write([(time.time(), item) for item in flatten_messages(account, {"chat_name": "张三", "msg": [msg.info]})])
+
+    updates = []
+    received = threading.Event()
+
+    def listener(account, result):
+        updates.append((account, result))
+        received.set()
+
+    voice_transcriber.add_listener(listener)
+    try:
+        voice = voice_transcriber.register(account, msg, dict(msg.info))
+        assert voice["status"] == "pending"
+        assert received.wait(5)
+    finally:
+        voice_transcriber._listeners.remove(listener)
+
+    [(update_account, result)] = updates
+    [update] = result["msg"]
+    assert update_account == account
+    assert result["chat_name"] == "张三"
+    assert update["event"] == "update"
+    assert update["id"] == "voice-1"
+    assert update["voice_to_text"] == "晚上一起吃饭"
+
+    message_store._write([(time.time(), item) for item in flatten_messages(update_account, result)])
+    rows, _ = message_store.query(account=account, chat_name="张三")
+    assert rows[0]["raw"]["voice_to_text"] == "晚上一起吃饭"
+    assert rows[0]["raw"]["content"] == "[语音]3秒"
+
+
+def test_update_waits_for_the_original_message():
+    update = {"chat_name": "李四", "msg": [{"event": "update", "id": "voice-2", "voice_to_text": "好的"}]}
+    original = {"chat_name": "李四", "msg": [{"id": "voice-2", "type": "voice", "content": "[语音]1秒"}]}
+
+    message_store._write([(time.time(), item) for item in flatten_messages("tester", update)])
+    message_store._write([(time.time(), item) for item in flatten_messages("tester", original)])
+
+    rows, _ = message_store.query(account="tester", chat_name="李四")
+    assert rows[0]["raw"]["voice_to_text"] == "好的"